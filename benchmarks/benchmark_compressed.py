@@ -0,0 +1,82 @@
+"""
+    Compares reading a compressed input directly (decompressed in a background thread, see compressed_input module)
+    with decompressing it to disk first and then running the analyzer on the decompressed file with --mmap. It also
+    reports the time of the decompression alone, the lower bound of any run on the compressed input.
+
+    usage: python ./benchmarks/benchmark_compressed.py [number_of_lines]
+"""
+import bz2
+import filecmp
+import gzip
+import lzma
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import analyze_repeat_donations as analyzer
+import compressed_input
+import fec_generator
+
+COMPRESSIONS = [('gzip', 'itcont.txt.gz'), ('bz2', 'itcont.txt.bz2'), ('xz', 'itcont.txt.xz')]
+
+
+def compress(input_path, output_path, compression):
+    with open(input_path, 'rb') as input_handle:
+        with {'gzip': gzip, 'bz2': bz2, 'xz': lzma}[compression].open(output_path, 'wb') as output_handle:
+            shutil.copyfileobj(input_handle, output_handle, compressed_input.DEFAULT_BLOCK_SIZE)
+
+
+def decompress_to_disk(input_path, output_path, compression):
+    with compressed_input.open_decompressed(input_path, compression) as input_handle:
+        with open(output_path, 'wb') as output_handle:
+            shutil.copyfileobj(input_handle, output_handle, compressed_input.DEFAULT_BLOCK_SIZE)
+
+
+def decompress_only(input_path, compression):
+    for _ in compressed_input.iter_decompressed_blocks(input_path, compression):
+        pass
+
+
+def time_it(function, *args, **kwargs):
+    start_time = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start_time
+
+
+def main(number_of_lines):
+    with tempfile.TemporaryDirectory() as directory:
+        text_path = os.path.join(directory, 'itcont.txt')
+        percentile_path = os.path.join(directory, 'percentile.txt')
+        expected_path = os.path.join(directory, 'expected.txt')
+        output_path = os.path.join(directory, 'repeat_donors.txt')
+        fec_generator.write_itcont(text_path, number_of_lines)
+        with open(percentile_path, 'w') as handle:
+            handle.write('30\n')
+        uncompressed_seconds = time_it(analyzer.process_data_stream, text_path, percentile_path, expected_path,
+                                       use_mmap=True)
+        print('{} lines, {:,} bytes uncompressed, {:.2f} s on the uncompressed file with --mmap'.format(
+            number_of_lines, os.path.getsize(text_path), uncompressed_seconds))
+
+        for compression, name in COMPRESSIONS:
+            compressed_path = os.path.join(directory, name)
+            compress(text_path, compressed_path, compression)
+            decompressed_path = os.path.join(directory, 'decompressed.txt')
+            decompress_seconds = time_it(decompress_to_disk, compressed_path, decompressed_path, compression)
+            two_step_seconds = decompress_seconds + time_it(analyzer.process_data_stream, decompressed_path,
+                                                            percentile_path, output_path, use_mmap=True)
+            os.remove(decompressed_path)
+            direct_seconds = time_it(analyzer.process_data_stream, compressed_path, percentile_path, output_path)
+            if not filecmp.cmp(expected_path, output_path, shallow=False):
+                raise AssertionError('output of the {} input is different'.format(compression))
+            print('{:<5} {:>13,} bytes  decompress only {:>7.2f} s  to disk + --mmap {:>7.2f} s  direct {:>7.2f} s'
+                  .format(compression, os.path.getsize(compressed_path), time_it(decompress_only, compressed_path,
+                                                                                  compression),
+                          two_step_seconds, direct_seconds))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,48 @@
+"""
+    Compares memory and insert time of donor_dict as a dictionary of (name, zip_code) tuples and as a
+    CompactDonorIndex. Memory is the peak of python allocations measured by tracemalloc while the donors are inserted.
+
+    usage: python ./benchmarks/benchmark_donor_index.py [number_of_donors ...]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from donor_index import CompactDonorIndex
+
+
+def fill(donor_dict, number_of_donors):
+    """
+        Inserts number_of_donors distinct donors the way process_record does.
+    :return: a tuple (seconds, peak_bytes)
+    """
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    for i in range(number_of_donors):
+        donor = ('LASTNAME{}, FIRSTNAME M'.format(i), '{:05d}'.format(i % 100000))
+        if donor not in donor_dict:
+            donor_dict[donor] = 2015 + i % 4
+    seconds = time.perf_counter() - start_time
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak_bytes
+
+
+def main(sizes):
+    print('{:>12} {:>22} {:>14} {:>14} {:>14}'.format('donors', 'structure', 'peak MB', 'bytes/donor', 'time(s)'))
+    for number_of_donors in sizes:
+        for name, factory in [('dict', dict),
+                              ('CompactDonorIndex', CompactDonorIndex),
+                              ('CompactDonorIndex 128', lambda: CompactDonorIndex(hash_bits=128))]:
+            donor_dict = factory()
+            seconds, peak_bytes = fill(donor_dict, number_of_donors)
+            print('{:>12,} {:>22} {:>14.1f} {:>14.1f} {:>14.2f}'.format(
+                number_of_donors, name, peak_bytes / 2 ** 20, peak_bytes / number_of_donors, seconds))
+            del donor_dict
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000000, 10000000, 50000000])
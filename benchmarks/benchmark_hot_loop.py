@@ -0,0 +1,91 @@
+"""
+    Microbenchmark of the per-record loop of process_data_stream, the update of the state and the formatting of the
+    output records, on records validated beforehand so parsing is left out. It compares process_record called once per
+    record with process_records, which looks each key up once and caches the output prefix of each key. For each loop
+    it prints:
+        - records/sec, best of --repeat runs
+        - memory blocks and bytes held by the state at the end (tracemalloc)
+        - peak traced bytes during the loop above the final ones, the temporary allocations of the loop
+    It also checks that both loops write the same output.
+
+    usage: python ./benchmarks/benchmark_hot_loop.py [number_of_lines] [--repeat N] [generator options]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import analyze_repeat_donations as analyzer
+import fec_generator
+
+
+def process_record_loop(records, write, donor_dict, repeat_donation_dict, percentile):
+    for (cmte_id, name, zip_code, transaction_year, transaction_amt) in records:
+        output_record = analyzer.process_record(cmte_id, name, zip_code, transaction_year, transaction_amt,
+                                                donor_dict, repeat_donation_dict, percentile)
+        if output_record is not None:
+            write(output_record)
+
+
+def process_records_loop(records, write, donor_dict, repeat_donation_dict, percentile):
+    analyzer.process_records(records, write, donor_dict, repeat_donation_dict, percentile)
+
+
+LOOPS = [('process_record', process_record_loop), ('process_records', process_records_loop)]
+
+
+def run_loop(loop, records, percentile):
+    """
+        Runs loop on a new state and returns (seconds, output records).
+    """
+    output = []
+    start_time = time.perf_counter()
+    loop(records, output.append, {}, {}, percentile)
+    return time.perf_counter() - start_time, output
+
+
+def measure_memory(loop, lines, percentile):
+    """
+        Runs loop on a new state under tracemalloc and returns (blocks held by the state, bytes held by the state,
+        peak bytes above the final ones). The records are parsed while they are traced, so the strings the state keeps
+        are counted. The output is dropped as it is written so it is not counted.
+    """
+    donor_dict = {}
+    repeat_donation_dict = {}
+    tracemalloc.start()
+    loop(analyzer.iter_valid_records(lines), lambda output_record: None, donor_dict, repeat_donation_dict, percentile)
+    (current, peak) = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(statistic.count for statistic in snapshot.statistics('filename'))
+    return blocks, current, peak - current
+
+
+def main(arguments):
+    lines = list(fec_generator.generate_records(arguments.number_of_lines, **fec_generator.generator_options(arguments)))
+    records = list(analyzer.iter_valid_records(lines))
+    print('{} lines, {} valid records'.format(arguments.number_of_lines, len(records)))
+    print('{:<18} {:>14} {:>14} {:>14} {:>16}'.format('loop', 'records/sec', 'state blocks', 'state MB',
+                                                       'temporary MB'))
+    expected_output = None
+    for name, loop in LOOPS:
+        (seconds, output) = min(run_loop(loop, records, arguments.percentile) for _ in range(arguments.repeat))
+        if expected_output is None:
+            expected_output = output
+        elif output != expected_output:
+            raise AssertionError('output of {} is different'.format(name))
+        (blocks, state_bytes, temporary_bytes) = measure_memory(loop, lines, arguments.percentile)
+        print('{:<18} {:>14,.0f} {:>14,} {:>14.1f} {:>16.2f}'.format(name, len(records) / seconds, blocks,
+                                                                      state_bytes / 1e6, temporary_bytes / 1e6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Microbenchmark of the per-record loop.')
+    parser.add_argument('number_of_lines', type=int, nargs='?', default=1000000)
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs of each loop')
+    parser.add_argument('--percentile', type=analyzer.parse_percentiles, default=30)
+    fec_generator.add_generator_arguments(parser)
+    main(parser.parse_args())
@@ -0,0 +1,97 @@
+"""
+    Compares lines/sec of the text line path, the memory-mapped bytes path (--mmap) and the batched validation path
+    (--mmap --batch-size) of process_data_stream, both for parsing and validation only and for the whole run. It also
+    checks that all paths write the same output.
+
+    usage: python ./benchmarks/benchmark_ingestion.py [number_of_lines]
+"""
+import filecmp
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import analyze_repeat_donations as analyzer
+import batch_validation
+import bytes_ingest
+
+
+def write_synthetic_input(path, number_of_lines, seed=2018):
+    """
+        Writes number_of_lines FEC-format records with a few repeat donors and about 5% invalid records.
+    :param path: location of the file to be written
+    :param number_of_lines: number of records
+    :param seed: seed of the random generator
+    """
+    rng = random.Random(seed)
+    with open(path, 'w') as handle:
+        for i in range(number_of_lines):
+            other_id = 'H6CA34245' if rng.random() < 0.05 else ''
+            handle.write('C00{:06d}|N|M2|P|201702039042410894|15|IND|DONOR, NUMBER {}|CITY|GA|{:09d}|EMPLOYER|'
+                         'OCCUPATION|0131{}|{}.{:02d}|{}|PR2283873845050|1147350||MEMO|4020820171370029337\n'
+                         .format(rng.randrange(200), rng.randrange(number_of_lines // 3 + 1), rng.randrange(3000),
+                                 rng.choice((2015, 2016, 2017, 2018)), rng.randrange(1, 2000), rng.randrange(100),
+                                 other_id))
+
+
+def time_it(function, *args, **kwargs):
+    start_time = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start_time
+
+
+def consume_text(input_path):
+    with open(input_path, 'r') as input_handle:
+        for _ in analyzer.iter_valid_records(input_handle):
+            pass
+
+
+def consume_mmap(input_path):
+    with open(input_path, 'rb') as input_handle:
+        for _ in bytes_ingest.iter_valid_records_mmap(input_handle):
+            pass
+
+
+def consume_batched(input_path):
+    with open(input_path, 'rb') as input_handle:
+        for _ in batch_validation.iter_valid_records_batched(bytes_ingest.iter_mapped_lines(input_handle)):
+            pass
+
+
+def main(number_of_lines):
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, 'itcont.txt')
+        percentile_path = os.path.join(directory, 'percentile.txt')
+        text_output_path = os.path.join(directory, 'text_output.txt')
+        mmap_output_path = os.path.join(directory, 'mmap_output.txt')
+        batched_output_path = os.path.join(directory, 'batched_output.txt')
+        write_synthetic_input(input_path, number_of_lines)
+        with open(percentile_path, 'w') as handle:
+            handle.write('30\n')
+
+        results = [
+            ('parse + validate, text', time_it(consume_text, input_path)),
+            ('parse + validate, mmap', time_it(consume_mmap, input_path)),
+            ('parse + validate, batched', time_it(consume_batched, input_path)),
+            ('process_data_stream, text', time_it(analyzer.process_data_stream, input_path, percentile_path,
+                                                  text_output_path)),
+            ('process_data_stream, mmap', time_it(analyzer.process_data_stream, input_path, percentile_path,
+                                                  mmap_output_path, use_mmap=True)),
+            ('process_data_stream, batched', time_it(analyzer.process_data_stream, input_path, percentile_path,
+                                                     batched_output_path, use_mmap=True,
+                                                     batch_size=batch_validation.DEFAULT_BATCH_SIZE)),
+        ]
+        for output_path in [mmap_output_path, batched_output_path]:
+            if not filecmp.cmp(text_output_path, output_path, shallow=False):
+                raise AssertionError('{} is different from the output of the text path'.format(output_path))
+
+    print('{} lines'.format(number_of_lines))
+    for name, seconds in results:
+        print('{:<31} {:>8.3f} s {:>12,.0f} lines/sec'.format(name, seconds, number_of_lines / seconds))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,61 @@
+"""
+    Measures how --map-reduce scales with the number of workers on synthetic FEC data split into several files (see
+    fec_generator.py), and compares it to the sequential --summary run over the concatenated files. Map tasks are byte
+    ranges of the files and reducers are donor partitions, so both stages spread over all the workers. The remaining
+    serial part is the merge of the buckets of the partitions and the writing of the output in the main process.
+
+    usage: python ./benchmarks/benchmark_map_reduce.py [number_of_lines] [number_of_files] [max_workers]
+"""
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_PATH, '..', 'src'))
+
+import analyze_repeat_donations as analyzer
+import fec_generator
+import map_reduce
+
+
+def main(number_of_lines, number_of_files, max_workers):
+    with tempfile.TemporaryDirectory() as directory:
+        input_dir = os.path.join(directory, 'input')
+        os.mkdir(input_dir)
+        records = fec_generator.generate_records(number_of_lines)
+        lines_per_file = -(-number_of_lines // number_of_files)
+        file_paths = []
+        for file_number in range(number_of_files):
+            file_paths.append(os.path.join(input_dir, 'itcont_{:02d}.txt'.format(file_number)))
+            with open(file_paths[-1], 'w') as handle:
+                handle.writelines(next(records) for _ in range(min(lines_per_file, number_of_lines -
+                                                                   file_number * lines_per_file)))
+        concatenated_path = os.path.join(directory, 'itcont.txt')
+        with open(concatenated_path, 'wb') as output_handle:
+            for file_path in file_paths:
+                with open(file_path, 'rb') as input_handle:
+                    output_handle.write(input_handle.read())
+        output_path = os.path.join(directory, 'repeat_donors.txt')
+
+        start_time = time.perf_counter()
+        analyzer.process_data_stream(concatenated_path, None, output_path, use_mmap=True, percentiles=30,
+                                     summary=True)
+        baseline_time = time.perf_counter() - start_time
+
+        print('{} lines in {} files, {} cpus'.format(number_of_lines, number_of_files, os.cpu_count()))
+        print('{:<22} {:>9} {:>14} {:>8}'.format('mode', 'time(s)', 'lines/sec', 'speedup'))
+        print('{:<22} {:>9.3f} {:>14,.0f} {:>7.2f}x'.format('--mmap --summary', baseline_time,
+                                                             number_of_lines / baseline_time, 1.0))
+        for workers in range(1, max_workers + 1):
+            start_time = time.perf_counter()
+            map_reduce.run_map_reduce(input_dir, None, output_path, workers=workers, percentiles=30)
+            seconds = time.perf_counter() - start_time
+            print('{:<22} {:>9.3f} {:>14,.0f} {:>7.2f}x'.format('--map-reduce {}'.format(workers), seconds,
+                                                                 number_of_lines / seconds, baseline_time / seconds))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 4,
+         int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count())
@@ -0,0 +1,49 @@
+"""
+    Compares the bucket containers of order_statistics module on a skewed workload where all repeat donations fall into
+    a single (cmte_id, zip_code, year) bucket. Each insert is followed by a nearest-rank percentile lookup, which is
+    exactly what process_data_stream does for every repeat donation.
+
+    usage: python ./benchmarks/benchmark_order_statistics.py [bucket_size ...]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import analyze_repeat_donations as analyzer
+from order_statistics import BlockedSortedList, InsortList
+
+
+def run_bucket(bucket_factory, amounts, percentile):
+    """
+        Adds all amounts to one bucket computing the percentile after each insert.
+    :param bucket_factory: the container type to benchmark
+    :param amounts: list of donation amounts
+    :param percentile: the percentile computed after each insert
+    :return: running time in seconds
+    """
+    repeat_donation_dict = {}
+    start_time = time.perf_counter()
+    for amount in amounts:
+        analyzer.add_to_repeat_donation_dict('C00384516', '02895', 2018, amount, repeat_donation_dict,
+                                             bucket_factory)
+        analyzer.compute_percentile(repeat_donation_dict[('C00384516', '02895', 2018)][0], percentile)
+    return time.perf_counter() - start_time
+
+
+def main(bucket_sizes):
+    rng = random.Random(2018)
+    print('{:>10} {:>14} {:>20} {:>9}'.format('bucket', 'InsortList(s)', 'BlockedSortedList(s)', 'speedup'))
+    for size in bucket_sizes:
+        amounts = [rng.randint(1, 500000) for _ in range(size)]
+        insort_time = run_bucket(InsortList, amounts, 30)
+        blocked_time = run_bucket(BlockedSortedList, amounts, 30)
+        print('{:>10} {:>14.3f} {:>20.3f} {:>8.2f}x'.format(size, insort_time, blocked_time,
+                                                             insort_time / blocked_time))
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 500000]
+    main(sizes)
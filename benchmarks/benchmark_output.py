@@ -0,0 +1,65 @@
+"""
+    Compares the wall time and the number of bytes written of the streaming output written one record at a time, the
+    streaming output written by the batched writer, and the --summary mode at the end of the run and with periodic
+    summaries. It also checks that the last record of each key is the same in all outputs.
+
+    usage: python ./benchmarks/benchmark_output.py [number_of_lines]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import analyze_repeat_donations as analyzer
+from benchmark_ingestion import write_synthetic_input
+
+
+def final_states(output_path):
+    """
+        Returns the last output record of each (cmte_id, zip_code, year) key of an output file.
+    """
+    states = {}
+    with open(output_path) as handle:
+        for line in handle:
+            states[tuple(line.split('|')[:3])] = line
+    return states
+
+
+def main(number_of_lines):
+    modes = [
+        ('streaming, 1 record per write', dict(output_batch=1)),
+        ('streaming, batched writer', dict()),
+        ('summary every {} records'.format(number_of_lines // 10), dict(summary=True,
+                                                                         summary_every=number_of_lines // 10)),
+        ('summary at the end', dict(summary=True)),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, 'itcont.txt')
+        percentile_path = os.path.join(directory, 'percentile.txt')
+        write_synthetic_input(input_path, number_of_lines)
+        with open(percentile_path, 'w') as handle:
+            handle.write('30\n')
+
+        input_size = os.path.getsize(input_path)
+        results = []
+        expected_states = None
+        for name, options in modes:
+            output_path = os.path.join(directory, 'repeat_donors.txt')
+            start_time = time.perf_counter()
+            analyzer.process_data_stream(input_path, percentile_path, output_path, use_mmap=True, **options)
+            results.append((name, time.perf_counter() - start_time, os.path.getsize(output_path)))
+            states = final_states(output_path)
+            if expected_states is None:
+                expected_states = states
+            elif states != expected_states:
+                raise AssertionError('final states of "{}" are different from the streaming output'.format(name))
+
+    print('{} lines, {:,} bytes of input'.format(number_of_lines, input_size))
+    for name, seconds, size in results:
+        print('{:<34} {:>8.3f} s {:>14,} bytes written'.format(name, seconds, size))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
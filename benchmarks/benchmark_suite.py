@@ -0,0 +1,200 @@
+"""
+    Scale benchmark of process_data_stream. For each number of lines it generates a deterministic synthetic input (see
+    fec_generator.py), runs the analyzer in a fresh process and records the throughput, the peak resident memory and
+    the time of each stage to a JSON file:
+        - generate: writing the synthetic input (skipped when the file is already in --data-dir)
+        - parse_validate: reading, parsing and validating the records only
+        - process_data_stream: the whole run, parsing and validating, updating the state and writing the output
+    With --compare, the throughput of each size is compared to an earlier JSON file and the script exits with status 1
+    when any of them dropped by more than --tolerance.
+
+    usage: python ./benchmarks/benchmark_suite.py [--sizes 1000000,10000000,100000000] [--output results.json]
+                                                  [--data-dir DIR] [--compare previous.json] [analyzer options]
+                                                  [generator options]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+SRC_PATH = os.path.join(BENCHMARKS_PATH, '..', 'src')
+sys.path.insert(0, SRC_PATH)
+
+import fec_generator
+
+DEFAULT_SIZES = [1000000, 10000000, 100000000]
+DEFAULT_TOLERANCE = 0.1
+
+
+def peak_rss_bytes():
+    """
+        Returns the peak resident memory of this process in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_once(input_path, percentile_path, output_path, options):
+    """
+        Runs in a fresh process so the peak memory is the one of this run only.
+    :return: a dictionary with the stage timings, the peak memory and the output size
+    """
+    import analyze_repeat_donations as analyzer
+    import batch_validation
+    import bytes_ingest
+
+    stages = {}
+    start_time = time.perf_counter()
+    with open(input_path, 'rb' if options.get('use_mmap') else 'r') as input_handle:
+        if options.get('batch_size'):
+            records = batch_validation.iter_valid_records_batched(bytes_ingest.iter_mapped_lines(input_handle),
+                                                                  options['batch_size'])
+        elif options.get('use_mmap'):
+            records = bytes_ingest.iter_valid_records_mmap(input_handle)
+        else:
+            records = analyzer.iter_valid_records(input_handle)
+        valid_records = sum(1 for _ in records)
+    stages['parse_validate'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    analyzer.process_data_stream(input_path, percentile_path, output_path, **options)
+    stages['process_data_stream'] = time.perf_counter() - start_time
+
+    return dict(stages=stages, valid_records=valid_records, peak_rss_bytes=peak_rss_bytes(),
+                output_bytes=os.path.getsize(output_path))
+
+
+def input_path_for(data_dir, number_of_lines, generator_options):
+    """
+        Returns the location of the synthetic input of number_of_lines lines, named after the generator options so a
+        file is only reused with the same options.
+    """
+    name = '_'.join('{}{}'.format(key, value) for key, value in sorted(generator_options.items()))
+    return os.path.join(data_dir, 'itcont_{}_{}.txt'.format(number_of_lines, name))
+
+
+def benchmark_size(number_of_lines, data_dir, work_dir, generator_options, analyzer_options):
+    """
+        Generates the input of number_of_lines lines if needed and runs process_data_stream on it in a subprocess.
+    :return: the result of the run as a dictionary
+    """
+    input_path = input_path_for(data_dir, number_of_lines, generator_options)
+    generate_seconds = None
+    if not os.path.exists(input_path):
+        start_time = time.perf_counter()
+        fec_generator.write_itcont(input_path + '.tmp', number_of_lines, **generator_options)
+        os.replace(input_path + '.tmp', input_path)
+        generate_seconds = time.perf_counter() - start_time
+
+    percentile_path = os.path.join(work_dir, 'percentile.txt')
+    with open(percentile_path, 'w') as handle:
+        handle.write('30\n')
+    output_path = os.path.join(work_dir, 'repeat_donors.txt')
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-once',
+                                json.dumps([input_path, percentile_path, output_path, analyzer_options])],
+                               check=True, stdout=subprocess.PIPE, universal_newlines=True)
+    result = json.loads(completed.stdout)
+    os.remove(output_path)
+
+    if generate_seconds is not None:
+        result['stages']['generate'] = generate_seconds
+    total_seconds = result['stages']['process_data_stream']
+    result.update(lines=number_of_lines, input_bytes=os.path.getsize(input_path), seconds=total_seconds,
+                  lines_per_sec=number_of_lines / total_seconds,
+                  mb_per_sec=os.path.getsize(input_path) / total_seconds / 1e6)
+    return result
+
+
+def environment():
+    """
+        Returns a description of the machine and the code the benchmark ran on.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BENCHMARKS_PATH, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return dict(python=platform.python_version(), implementation=platform.python_implementation(),
+                platform=platform.platform(), processor=platform.processor(), cpu_count=os.cpu_count(),
+                commit=commit, time=time.strftime('%Y-%m-%dT%H:%M:%S'))
+
+
+def compare(results, previous_results, tolerance):
+    """
+        Prints the throughput change of every size also found in previous_results.
+    :return: True if none of them dropped by more than tolerance
+    """
+    previous_runs = {run['lines']: run for run in previous_results['runs']}
+    passed = True
+    for run in results['runs']:
+        previous_run = previous_runs.get(run['lines'])
+        if previous_run is None:
+            continue
+        change = run['lines_per_sec'] / previous_run['lines_per_sec'] - 1
+        regression = change < -tolerance
+        passed = passed and not regression
+        print('{:>12,} lines: {:+.1%} lines/sec, peak RSS {:+.1%}{}'.format(
+            run['lines'], change, run['peak_rss_bytes'] / previous_run['peak_rss_bytes'] - 1,
+            '  REGRESSION' if regression else ''))
+    return passed
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description='Scale benchmark of process_data_stream.')
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')], default=DEFAULT_SIZES,
+                        help='comma separated numbers of lines (default: 1M, 10M and 100M)')
+    parser.add_argument('--output', default='benchmark_results.json', help='location of the JSON results')
+    parser.add_argument('--data-dir', help='directory where the generated inputs are kept and reused between runs '
+                                           '(default: a temporary directory removed at the end)')
+    parser.add_argument('--compare', metavar='PREVIOUS_JSON', help='compare the throughput to an earlier run')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='largest accepted drop of throughput with --compare (default: 0.1)')
+    parser.add_argument('--mmap', action='store_true', help='run the analyzer with --mmap')
+    parser.add_argument('--batch-size', type=int, help='run the analyzer with --batch-size')
+    parser.add_argument('--compact-donors', action='store_true', help='run the analyzer with --compact-donors')
+    parser.add_argument('--summary', action='store_true', help='run the analyzer with --summary')
+    parser.add_argument('--run-once', help=argparse.SUPPRESS)
+    fec_generator.add_generator_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(arguments):
+    generator_options = fec_generator.generator_options(arguments)
+    analyzer_options = dict(use_mmap=arguments.mmap or arguments.batch_size is not None,
+                            batch_size=arguments.batch_size, compact_donors=arguments.compact_donors,
+                            summary=arguments.summary)
+    results = dict(environment=environment(), generator=generator_options, analyzer=analyzer_options, runs=[])
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = arguments.data_dir or work_dir
+        os.makedirs(data_dir, exist_ok=True)
+        for number_of_lines in arguments.sizes:
+            run = benchmark_size(number_of_lines, data_dir, work_dir, generator_options, analyzer_options)
+            results['runs'].append(run)
+            print('{:>12,} lines {:>9.2f} s {:>12,.0f} lines/sec {:>7.1f} MB/s peak RSS {:>8.1f} MB  stages: {}'.format(
+                number_of_lines, run['seconds'], run['lines_per_sec'], run['mb_per_sec'],
+                run['peak_rss_bytes'] / 1e6,
+                ', '.join('{} {:.2f} s'.format(stage, seconds) for stage, seconds in sorted(run['stages'].items()))))
+            # results are saved after every size, so the smaller sizes are kept if a larger one is interrupted
+            with open(arguments.output, 'w') as handle:
+                json.dump(results, handle, indent=2)
+
+    if arguments.compare is not None:
+        with open(arguments.compare) as handle:
+            previous_results = json.load(handle)
+        if not compare(results, previous_results, arguments.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parsed_arguments = parse_arguments(sys.argv[1:])
+    if parsed_arguments.run_once is not None:
+        print(json.dumps(run_once(*json.loads(parsed_arguments.run_once))))
+    else:
+        main(parsed_arguments)
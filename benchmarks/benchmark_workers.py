@@ -0,0 +1,51 @@
+"""
+    Measures how process_data_stream scales with --workers on a synthetic FEC file. Parsing and validation run in the
+    worker processes while donor_dict and repeat_donation_dict are updated in file order by the main process, so the
+    speedup is bounded by the share of the run spent in the ordered commit stage. It also checks that every run writes
+    the same output as the single process --mmap path.
+
+    usage: python ./benchmarks/benchmark_workers.py [number_of_lines] [max_workers]
+"""
+import filecmp
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import analyze_repeat_donations as analyzer
+from benchmark_ingestion import write_synthetic_input
+
+
+def main(number_of_lines, max_workers):
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, 'itcont.txt')
+        percentile_path = os.path.join(directory, 'percentile.txt')
+        baseline_output_path = os.path.join(directory, 'baseline_output.txt')
+        write_synthetic_input(input_path, number_of_lines)
+        with open(percentile_path, 'w') as handle:
+            handle.write('30\n')
+
+        start_time = time.perf_counter()
+        analyzer.process_data_stream(input_path, percentile_path, baseline_output_path, use_mmap=True)
+        baseline_time = time.perf_counter() - start_time
+
+        print('{} lines, {} cpus'.format(number_of_lines, os.cpu_count()))
+        print('{:<12} {:>9} {:>14} {:>8}'.format('workers', 'time(s)', 'lines/sec', 'speedup'))
+        print('{:<12} {:>9.3f} {:>14,.0f} {:>7.2f}x'.format('--mmap', baseline_time, number_of_lines / baseline_time,
+                                                             1.0))
+        for workers in range(1, max_workers + 1):
+            output_path = os.path.join(directory, 'output_{}.txt'.format(workers))
+            start_time = time.perf_counter()
+            analyzer.process_data_stream(input_path, percentile_path, output_path, workers=workers)
+            seconds = time.perf_counter() - start_time
+            if not filecmp.cmp(baseline_output_path, output_path, shallow=False):
+                raise AssertionError('output with {} workers is different'.format(workers))
+            print('{:<12} {:>9.3f} {:>14,.0f} {:>7.2f}x'.format(workers, seconds, number_of_lines / seconds,
+                                                                 baseline_time / seconds))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count())
@@ -0,0 +1,151 @@
+"""
+    Deterministic generator of synthetic FEC individual contributions records (itcont.txt format) for benchmarks.
+
+    The same parameters and seed always give the same file. The shape of the data can be tuned:
+        - donors: number of distinct (name, zip_code) donors
+        - repeat_rate: fraction of the donors that give in more than one year
+        - committees / zip_codes: number of distinct recipients and zip codes, picked with a Zipf distribution of
+          exponent skew (0 is uniform, around 1 is close to the real data where a few committees get most donations)
+        - invalid_fraction: fraction of the records made invalid in one of the ways the analyzer rejects
+
+    usage: python ./benchmarks/fec_generator.py output_file number_of_lines [--donors N] [--repeat-rate R] ...
+"""
+import argparse
+import bisect
+import itertools
+import random
+
+FIRST_YEAR = 2015
+LAST_YEAR = 2018
+# ways a record is made invalid, the first one (a non empty OTHER_ID) is by far the most common in the real data
+INVALID_KINDS = ['other_id', 'other_id', 'other_id', 'transaction_dt', 'zip_code', 'name', 'transaction_amt',
+                 'cmte_id']
+STATES = ['CA', 'NY', 'TX', 'FL', 'IL', 'PA', 'OH', 'GA', 'NC', 'MI', 'NJ', 'VA', 'WA', 'AZ', 'MA']
+OCCUPATIONS = [('RETIRED', 'RETIRED'), ('SELF-EMPLOYED', 'ATTORNEY'), ('NOT EMPLOYED', 'NOT EMPLOYED'),
+               ('ACME CORP', 'ENGINEER'), ('STATE UNIVERSITY', 'PROFESSOR'), ('CITY HOSPITAL', 'PHYSICIAN')]
+
+
+def zipf_cumulative_weights(n, skew):
+    """
+        Returns the cumulative weights of ranks 1..n of a Zipf distribution with the given exponent.
+    """
+    return list(itertools.accumulate(1 / rank ** skew for rank in range(1, n + 1)))
+
+
+def _mix(value, seed):
+    """
+        A cheap deterministic 32 bit hash, used to give every donor fixed attributes without storing them.
+    """
+    value = (value * 0x9E3779B1 + seed * 0x85EBCA77) & 0xFFFFFFFF
+    value ^= value >> 15
+    value = (value * 0x2C1B3C6D) & 0xFFFFFFFF
+    value ^= value >> 12
+    return value
+
+
+def generate_records(number_of_lines, donors=None, repeat_rate=0.1, committees=2000, zip_codes=20000, skew=1.0,
+                     invalid_fraction=0.05, seed=2018):
+    """
+        Yields number_of_lines FEC-format records, each a string ending with a new line.
+    :param number_of_lines: number of records
+    :param donors: number of distinct donors, defaults to a third of number_of_lines
+    :param repeat_rate: fraction of donors that donate in more than one year
+    :param committees: number of distinct recipients (CMTE_ID)
+    :param zip_codes: number of distinct 5 digit zip codes
+    :param skew: exponent of the Zipf distribution of committees and zip codes
+    :param invalid_fraction: fraction of invalid records
+    :param seed: seed of the random generator
+    :return: a generator of strings
+    """
+    if donors is None:
+        donors = max(number_of_lines // 3, 1)
+    rng = random.Random(seed)
+    random_value = rng.random
+    committee_weights = zipf_cumulative_weights(committees, skew)
+    zip_weights = zipf_cumulative_weights(zip_codes, skew)
+    committee_total = committee_weights[-1]
+    zip_total = zip_weights[-1]
+    repeat_threshold = int(repeat_rate * 0xFFFFFFFF)
+    years = LAST_YEAR - FIRST_YEAR + 1
+
+    for i in range(number_of_lines):
+        donor = rng.randrange(donors)
+        donor_hash = _mix(donor, seed)
+        # fixed attributes of the donor
+        zip_rank = bisect.bisect_left(zip_weights, (donor_hash / 0xFFFFFFFF) * zip_total)
+        zip_code = '{:05d}{:04d}'.format((zip_rank * 7919) % 100000, donor_hash % 10000)
+        first_year = FIRST_YEAR + donor_hash % (years - 1)
+        if _mix(donor, seed + 1) < repeat_threshold:
+            year = rng.randint(first_year, LAST_YEAR)
+        else:
+            year = first_year
+        (employer, occupation) = OCCUPATIONS[donor_hash % len(OCCUPATIONS)]
+
+        committee = bisect.bisect_left(committee_weights, random_value() * committee_total)
+        cmte_id = 'C{:08d}'.format(committee)
+        name = 'DONOR{:X}, FIRST{}'.format(donor, donor_hash % 97)
+        transaction_dt = '{:02d}{:02d}{}'.format(rng.randint(1, 12), rng.randint(1, 28), year)
+        amount = min(rng.lognormvariate(4.0, 1.2), 99999999.0)
+        transaction_amt = '{:.2f}'.format(amount) if random_value() < 0.3 else str(int(amount) + 1)
+        other_id = ''
+
+        if random_value() < invalid_fraction:
+            kind = INVALID_KINDS[rng.randrange(len(INVALID_KINDS))]
+            if kind == 'other_id':
+                other_id = 'H6CA34245'
+            elif kind == 'transaction_dt':
+                transaction_dt = '13' + transaction_dt[2:]
+            elif kind == 'zip_code':
+                zip_code = zip_code[:3]
+            elif kind == 'name':
+                name = ''
+            elif kind == 'transaction_amt':
+                transaction_amt = transaction_amt + '.5.0'
+            else:
+                cmte_id = cmte_id[:6]
+
+        yield ('{}|N|M3|P|2018031391{:08d}|15|IND|{}|CITY|{}|{}|{}|{}|{}|{}|{}|SA11AI.{}|1224{:05d}|||4{:018d}\n'
+               .format(cmte_id, i % 100000000, name, STATES[donor_hash % len(STATES)], zip_code, employer,
+                       occupation, transaction_dt, transaction_amt, other_id, i, i % 100000, i))
+
+
+def write_itcont(path, number_of_lines, **kwargs):
+    """
+        Writes the records of generate_records to path.
+    :param path: location of the file to be written
+    :param number_of_lines: number of records
+    see generate_records for the other parameters
+    """
+    with open(path, 'w') as handle:
+        handle.writelines(generate_records(number_of_lines, **kwargs))
+
+
+def add_generator_arguments(parser):
+    """
+        Adds the options of generate_records to an argparse parser.
+    """
+    parser.add_argument('--donors', type=int, help='number of distinct donors (default: a third of the lines)')
+    parser.add_argument('--repeat-rate', type=float, default=0.1, help='fraction of donors giving in several years')
+    parser.add_argument('--committees', type=int, default=2000, help='number of distinct recipients')
+    parser.add_argument('--zip-codes', type=int, default=20000, help='number of distinct zip codes')
+    parser.add_argument('--skew', type=float, default=1.0, help='Zipf exponent of committees and zip codes')
+    parser.add_argument('--invalid-fraction', type=float, default=0.05, help='fraction of invalid records')
+    parser.add_argument('--seed', type=int, default=2018, help='seed of the random generator')
+
+
+def generator_options(arguments):
+    """
+        Returns the options of generate_records from arguments parsed by a parser set up by add_generator_arguments.
+    """
+    return dict(donors=arguments.donors, repeat_rate=arguments.repeat_rate, committees=arguments.committees,
+                zip_codes=arguments.zip_codes, skew=arguments.skew, invalid_fraction=arguments.invalid_fraction,
+                seed=arguments.seed)
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description='Writes synthetic FEC itcont records.')
+    argument_parser.add_argument('output_file')
+    argument_parser.add_argument('number_of_lines', type=int)
+    add_generator_arguments(argument_parser)
+    parsed_arguments = argument_parser.parse_args()
+    write_itcont(parsed_arguments.output_file, parsed_arguments.number_of_lines, **generator_options(parsed_arguments))
@@ -1,7 +1,42 @@
+import os
 import sys
 import math
-import bisect
 import time
+import argparse
+import functools
+
+import bytes_ingest
+import checkpoint
+import compressed_input
+import follow_stream
+import batch_validation
+import metrics
+import parallel_ingest
+import quantile_sketch
+import output_writer
+from donor_index import CompactDonorIndex
+from order_statistics import BlockedSortedList
+
+
+def parse_dollar_amount_cents(string_dollar_amount):
+    """
+        Validates string_dollar_amount and converts it to an integer number of cents in a single pass.
+        Acceptable examples 1232.10, 1232.1, and 1232. It should have a maximum precision 14 and maximum scale 2.
+        Assumes string_dollar_amount is already stripped from beginning and ending white space characters.
+    :param string_dollar_amount: a string that if correct should represent a dollar amount
+    :return: the amount as an integer number of cents, or None if string_dollar_amount is not a valid dollar amount
+             with scale 2 and precision 14.
+    """
+    integer_part, dot, fraction_part = string_dollar_amount.partition('.')
+    # there should be 1 or 2 string of digits on the sides of '.', so '' and '.' are not valid
+    if not (integer_part or fraction_part):
+        return None
+    # both side of decimal point has only digits or at most one side can be empty
+    if (integer_part and not integer_part.isdigit()) or (fraction_part and not fraction_part.isdigit()):
+        return None
+    if len(fraction_part) > 2 or len(integer_part) + len(fraction_part) > 14:
+        return None
+    return int(integer_part + fraction_part.ljust(2, '0'))
 
 
 def is_valid_dollar_amount(string_dollar_amount):
@@ -12,34 +47,28 @@ def is_valid_dollar_amount(string_dollar_amount):
     :param string_dollar_amount: a string that if correct should represent a dollar amount
     :return: True if string_dollar_amount is representing a valid dollar amount with scale 2 and precision 14.
     """
-    if string_dollar_amount in ['', '.']:
-        return False
+    return parse_dollar_amount_cents(string_dollar_amount) is not None
 
-    amt_list = string_dollar_amount.split('.')
-    # there should be 1 or 2 string of digits on the sides of '.' for a valid dollar amount
-    if len(amt_list) not in [1, 2]:
-        return False
 
-    # both side of decimal point has only digits or at most one side can be empty
-    if all((c.isdigit() or c == '') for c in amt_list):
-        if len(amt_list) == 2:
-            if len(amt_list[1]) <= 2 and len(amt_list[0]) + len(amt_list[1]) <= 14:
-                return True
-        else:   # len(amt_list) equals 1
-            if len(amt_list[0]) <= 14:
-                return True
-    return False
+def round_cents_to_dollars(cents):
+    """
+        Rounds an integer number of cents to whole dollars, exactly and half up: anything below $.50 is dropped and
+        anything from $.50 and up goes to the next dollar.
+    :param cents: a non-negative integer number of cents
+    :return: an integer, rounded value of the amount in dollars
+    """
+    return (cents + 50) // 100
 
 
-def round_dollar_amount(amount):
+def round_percentile_to_dollars(nth_percentile):
     """
-        Given a dollar amount with two decimal digits drop anything below $.50 and round anything from $.50 and up
-        to the next dollar and returns the rounded value.
-
-    :param amount: a float containing dollar amount
-    :return: an integer, rounded value of the dollar amount
+        Rounds a percentile in cents, or a list of them, to whole dollars (see round_cents_to_dollars).
+    :param nth_percentile: an integer number of cents or a list of them
+    :return: an integer or a list of integers
     """
-    return int((amount // 1) + (0 if (amount % 1.0) < 0.50 else 1))
+    if isinstance(nth_percentile, list):
+        return [round_cents_to_dollars(value) for value in nth_percentile]
+    return round_cents_to_dollars(nth_percentile)
 
 
 def open_files(file_list):
@@ -79,123 +108,183 @@ def create_record_for_output(cmte_id, zip_code, transaction_year, nth_percentile
     """
         Given all the information required returns the record as a string with the format of output is:
             cmte_id|zip_code|transaction_year|nth_percentile|total_amount_contributions|total_number_of_contributions
+        When several percentiles are requested nth_percentile is a list and the record gets one column per percentile,
+        in the requested order, in place of the nth_percentile column.
 
     :param cmte_id: donation recipient id
     :param zip_code: a string containing zip code of donor
     :param transaction_year: an integer containing year of donation
     :param nth_percentile: nth percentile of donation from repeat donors to the recipient cmte_id in transaction_year
-                           that has been read till now
+                           that has been read till now, already rounded to whole dollars, or a list of them
     :param total_amount_contributions: total amount of contribution from repeat donor to the recipient cmte_id in
-                                          transaction_year
+                                          transaction_year, already rounded to whole dollars
     :param total_number_of_contributions: total number of contributions from repeat donor to the recipient cmte_id in
                                           transaction_year
     :return: a | delimited string including the record for writing to output file
     """
 
-    output_record = [cmte_id, zip_code, str(transaction_year), str(round_dollar_amount(nth_percentile)),
-                     str(total_amount_contributions), str(total_number_of_contributions)]
+    return (create_output_prefix(cmte_id, zip_code, transaction_year) +
+            create_output_numbers(nth_percentile, total_amount_contributions, total_number_of_contributions))
 
-    return '|'.join(output_record) + '\n'
+
+def create_output_prefix(cmte_id, zip_code, transaction_year):
+    """
+        Returns the 'cmte_id|zip_code|transaction_year|' start of the output records of a key, which does not change
+        between the records of the key (see create_record_for_output).
+    """
+    return '|'.join([cmte_id, zip_code, str(transaction_year)]) + '|'
+
+
+def create_output_numbers(nth_percentile, total_amount_contributions, total_number_of_contributions):
+    """
+        Returns the 'nth_percentile|total_amount_contributions|total_number_of_contributions' end of an output record
+        with its newline (see create_record_for_output).
+    """
+    if isinstance(nth_percentile, list):
+        nth_percentile = '|'.join(str(value) for value in nth_percentile)
+    return '|'.join([str(nth_percentile), str(total_amount_contributions), str(total_number_of_contributions)]) + '\n'
 
 
 def compute_percentile(ordered_list, p):
     """
         Given a list of numbers sorted in ascending order and a percentile value greater than 0 and less than equal 100,
         returns pth_percentile of the list using the nearest-rank method.
-    :param ordered_list: a list of numbers sorted in ascending order
-    :param p: a value between 0 and 100 which we want to find the pth percentile of the list given
-    :return: pth_percentile of the list
+        The list is only queried by its length and by rank, so an order-statistic container like BlockedSortedList
+        answers it in O(log n) without being copied.
+        p can also be a tuple of percentiles, then all of them are answered from the same list and returned as a list.
+    :param ordered_list: a list of numbers sorted in ascending order, or an ordered container supporting len() and
+                         indexing by rank
+    :param p: a value between 0 and 100 which we want to find the pth percentile of the list given, or a tuple of them
+    :return: pth_percentile of the list, an element of the list so in the same unit (cents in repeat_donation_dict),
+             or a list with the percentiles in the order of p if p is a tuple
+    """
+    if isinstance(p, tuple):
+        length = len(ordered_list)
+        return [ordered_list[percentile_rank(percentile, length)] for percentile in p]
+    return ordered_list[percentile_rank(p, len(ordered_list))]
+
+
+def percentile_rank(p, length):
+    """
+        Returns the zero-based index of the pth percentile in a sorted list of the given length using the nearest-rank
+        method.
+    :param p: a value between 0 and 100
+    :param length: length of the list
+    :return: an integer index
     """
     if p <= 0 or p > 100:
         raise ValueError('Percentage value should be between 0 and 100.')
 
     # index of pth_percentile value in the list, adjusting for the fact that python uses zero-based indexing
-    n = math.ceil(p/100 * len(ordered_list)) - 1
-
-    return round_dollar_amount(ordered_list[n])
+    return math.ceil(p/100 * length) - 1
 
 
-def add_to_repeat_donation_dict(cmte_id, zip_code, transaction_year, transaction_amt, repeat_donation_dict):
+def add_to_repeat_donation_dict(cmte_id, zip_code, transaction_year, transaction_amt, repeat_donation_dict,
+                                bucket_factory=BlockedSortedList):
     """
         Adds the specified donation to the repeat_donation_dict and keeps the list of donations, sorted in an ascending
         order. It also updates the total_amount_of_contributions.
-        This function needs bisect module.
     :param cmte_id: donation recipient id
     :param zip_code: a string containing zip code of donor
     :param transaction_year: an integer containing year of donation
-    :param transaction_amt: a float containing amount of transaction in dollar
+    :param transaction_amt: an integer containing amount of transaction in cents
     :param repeat_donation_dict: dictionary of repeat donations with the key (cmte_id, zip_code, year) and the value
-                                 which is a list with the first element being a list of all donations from repeat
-                                 donors to the recipient cmte_id at the zip_code during the transaction_year that has
-                                 been processed till now. The second element of that list is the sum of all donations
-                                 which are mentioned in previous list.
+                                 which is a list with the first element being an ordered container of all donations
+                                 from repeat donors to the recipient cmte_id at the zip_code during the
+                                 transaction_year that has been processed till now. The second element of that list is
+                                 the sum of all donations which are mentioned in previous container. All amounts are
+                                 integer numbers of cents so sums are exact.
                                  example:
                                  An item of dictionary can be:
-                                 {('C00384516', '02895', 2017): [[50, 110, 125, 300], 585]}
+                                 {('C00384516', '02895', 2017): [[5000, 11000, 12550, 30000], 58550]}
+    :param bucket_factory: a callable returning an empty ordered container for a new key. The container should have
+                           an add(value) method, len() and indexing by rank, e.g. BlockedSortedList (O(log n) insert)
+                           or InsortList (O(n) insert) from order_statistics module.
     :return: the updated repeat_donation_dict
     """
-    # add a blank initial value if there is still no donation to this recipient
-    # in transaction_year with the specified zip_code
-    if (cmte_id, zip_code, transaction_year) not in repeat_donation_dict:
-        repeat_donation_dict[(cmte_id, zip_code, transaction_year)] = [[], 0]
+    state = get_repeat_donation_state((cmte_id, zip_code, transaction_year), repeat_donation_dict, bucket_factory)
+    add_donation(state, transaction_amt)
+    return repeat_donation_dict
+
 
-    # insert the new transaction amount
-    bisect.insort(repeat_donation_dict[(cmte_id, zip_code, transaction_year)][0], transaction_amt)
+def get_repeat_donation_state(key, repeat_donation_dict, bucket_factory=BlockedSortedList):
+    """
+        Returns the [ordered container of donations, total] list of a key of repeat_donation_dict, adding a blank one
+        if there is still no donation to this recipient in transaction_year with the specified zip_code. The strings
+        of a new key are interned so the keys share them with the other keys and the donors.
+    :param key: a tuple (cmte_id, zip_code, transaction_year)
+    :param repeat_donation_dict: dictionary of repeat donations (see add_to_repeat_donation_dict)
+    :param bucket_factory: a callable returning an empty ordered container for a new key
+    :return: the list stored for the key
+    """
+    state = repeat_donation_dict.get(key)
+    if state is None:
+        (cmte_id, zip_code, transaction_year) = key
+        state = repeat_donation_dict[(sys.intern(cmte_id), sys.intern(zip_code), transaction_year)] = \
+            [bucket_factory(), 0]
+    return state
 
-    # update the total amount of contributions
-    repeat_donation_dict[(cmte_id, zip_code, transaction_year)][1] += transaction_amt
 
-    return repeat_donation_dict
+def add_donation(state, transaction_amt):
+    """
+        Inserts a donation in the ordered container of a key and updates its total amount of contributions.
+    :param state: a [ordered container of donations, total] list of repeat_donation_dict
+    :param transaction_amt: an integer containing amount of transaction in cents
+    """
+    state[0].add(transaction_amt)
+    state[1] += transaction_amt
 
 
 def check_field_validity_cleanup(cmte_id, name, zip_code, transaction_dt, transaction_amt, other_id):
     """
         Returns a tuple (validity, fields). If any of the provided fields are malformed or incorrect or other_id is not
-        empty, it returns False for validity and an empty list for fields. If all fields are valid it cleans up the
-        fields and returns them.
+        empty, it returns False for validity and, instead of the fields, the reason of the rejection: the name of the
+        first field failing its check ('other_id', 'cmte_id', 'name', 'zip_code', 'transaction_dt' or
+        'transaction_amt'). If all fields are valid it cleans up the fields and returns them.
         Cleanups include: striping white spaces from beginning and end of fields, returning only first five digits of
         zip_code, returning transaction_year as an integer instead of transaction_dt and changing the type of
-        transaction_amt to float before returning.
+        transaction_amt to an integer number of cents before returning.
     :param cmte_id: donation recipient id
     :param name: a string containing name of donor
     :param zip_code: a string containing zip code of donor
     :param transaction_dt: an string containing date of donation
     :param transaction_amt: a string containing amount of transaction in dollar
     :param other_id: a string which is empty when the donation is from an individual
-    :return: a tuple in this form (validity, (cmte_id, name, zip_code, transaction_year, transaction_amt))
+    :return: a tuple in this form (validity, (cmte_id, name, zip_code, transaction_year, transaction_amt)), or
+             (False, reason) for an invalid record
     """
 
     # white space stripping and checks
     other_id = other_id.strip()
     if other_id != '':
-        return False, ()
+        return False, 'other_id'
 
     cmte_id = cmte_id.strip()
     if len(cmte_id) != 9 or (not cmte_id.isalnum()):
-        return False, ()
+        return False, 'cmte_id'
 
     name = name.strip()
     if len(name) > 200 or name == '':
-        return False, ()
+        return False, 'name'
 
     zip_code = zip_code.strip()
     # assumption is that zip_code should be either 5 or 9 digits.
     if not (len(zip_code) == 5 or len(zip_code) == 9) or not zip_code.isdigit():
-        return False, ()
+        return False, 'zip_code'
 
     transaction_dt = transaction_dt.strip()
     # transaction_dt should have the form MMDDYYYY
     if (len(transaction_dt) != 8 or (not transaction_dt.isdigit()) or
             (int(transaction_dt[0:2]) < 1 or int(transaction_dt[0:2]) > 12) or
             (int(transaction_dt[2:4]) < 1 or int(transaction_dt[2:4]) > 31)):
-        return False, ()
+        return False, 'transaction_dt'
 
-    transaction_amt = transaction_amt.strip()
-    if not is_valid_dollar_amount(transaction_amt):
-        return False, ()
+    transaction_amt = parse_dollar_amount_cents(transaction_amt.strip())
+    if transaction_amt is None:
+        return False, 'transaction_amt'
 
     validity = True      # no field-check failed
-    return validity, (cmte_id, name, zip_code[0:5], int(transaction_dt[-4:]), float(transaction_amt))
+    return validity, (cmte_id, name, zip_code[0:5], int(transaction_dt[-4:]), transaction_amt)
 
 
 def extract_required_fields(record_string):
@@ -219,78 +308,478 @@ def extract_required_fields(record_string):
     return (all_fields[i] for i in required_fields_indexes)
 
 
-def process_data_stream(input_file, percentile_file, output_file):
+def update_donor(name, zip_code, transaction_year, donor_dict):
     """
-        This function process a data_stream of donation records by opening input_file that is formatted based on FEC
-        description. It uses the percentile value that is supposed to be in the first line of percentile_file and write
-        the output_file which will only contain records from repeat donors.
-    :param input_file: a string containing the location of input file.
-    :param percentile_file: a string containing the location of percentile file.
-    :param output_file: a string containing the location of output_file
+        Looks up the donor of a record in donor_dict, adds it if it is new and keeps the earliest year it has donated.
+    :param name: a string containing name of donor
+    :param zip_code: a string containing the first five digits of zip code of donor
+    :param transaction_year: an integer containing year of donation
+    :param donor_dict: dictionary with the key (name, zip_code) and the earliest year the donor has donated as value,
+                       or a CompactDonorIndex
+    :return: True if the donor has donated in an earlier year, i.e. the record is from a repeat donor
     """
+    donor = (name, zip_code)
+    earliest_year = donor_dict.get(donor)
+    if earliest_year is not None:
+        if earliest_year > transaction_year:
+            # keep record of earliest year a donor has donated
+            donor_dict[donor] = transaction_year
+        elif earliest_year < transaction_year:   # this is a repeat donor
+            return True
+    else:
+        # add this donor to donor list, its zip code is interned to be shared with the other donors and the keys
+        donor_dict[(name, sys.intern(zip_code))] = transaction_year
+    return False
 
-    file_handles = open_files([(input_file, 'r'), (percentile_file, 'r'), (output_file, 'w')])
-    input_handle, percentile_handle, output_handle = file_handles
 
-    # read the percentile
-    first_line = percentile_handle.readline()  # assume the percentile is at the first line
-    percentile = int(first_line.strip())
-    if percentile < 1 or percentile > 100:
-        raise ValueError('The provided percentage should be between 1 and 100.')
+def update_state(cmte_id, name, zip_code, transaction_year, transaction_amt, donor_dict, repeat_donation_dict,
+                 bucket_factory=BlockedSortedList):
+    """
+        Updates donor_dict and repeat_donation_dict with one valid and cleaned up record. Records have to be given to
+        this function in the order of the input file since the result depends on the earliest year seen till now.
+    :param cmte_id: donation recipient id
+    :param name: a string containing name of donor
+    :param zip_code: a string containing the first five digits of zip code of donor
+    :param transaction_year: an integer containing year of donation
+    :param transaction_amt: an integer containing amount of transaction in cents
+    :param donor_dict: dictionary with the key (name, zip_code) and the earliest year the donor has donated as value,
+                       or a CompactDonorIndex
+    :param repeat_donation_dict: dictionary of repeat donations (see add_to_repeat_donation_dict)
+    :param bucket_factory: a callable returning an empty ordered container for a new key of repeat_donation_dict
+    :return: the key (cmte_id, zip_code, transaction_year) of repeat_donation_dict the record was added to if it is
+             from a repeat donor, otherwise None
+    """
+    if update_donor(name, zip_code, transaction_year, donor_dict):
+        add_to_repeat_donation_dict(cmte_id, zip_code, transaction_year, transaction_amt, repeat_donation_dict,
+                                    bucket_factory)
+        return cmte_id, zip_code, transaction_year
+    return None
+
+
+def format_state(key, repeat_donation_dict, percentile):
+    """
+        Returns the output record of the current state of a key of repeat_donation_dict.
+    :param key: a tuple (cmte_id, zip_code, transaction_year)
+    :param repeat_donation_dict: dictionary of repeat donations (see add_to_repeat_donation_dict)
+    :param percentile: the percentile value between 1 and 100, or a tuple of them to output several percentiles
+    :return: the output record as a string
+    """
+    (donations, total) = repeat_donation_dict[key]
+    return format_output(key, compute_percentile(donations, percentile), total, len(donations))
+
+
+def format_output(key, nth_percentile, total, total_number_of_contributions):
+    """
+        Rounds the amounts of a state to whole dollars and returns its output record.
+    :param key: a tuple (cmte_id, zip_code, transaction_year)
+    :param nth_percentile: the percentile in cents, or a list of them
+    :param total: the total amount of contributions in cents
+    :param total_number_of_contributions: the number of contributions
+    :return: the output record as a string
+    """
+    (cmte_id, zip_code, transaction_year) = key
+    return create_record_for_output(cmte_id, zip_code, transaction_year, round_percentile_to_dollars(nth_percentile),
+                                    round_cents_to_dollars(total), total_number_of_contributions)
+
+
+def process_record(cmte_id, name, zip_code, transaction_year, transaction_amt, donor_dict, repeat_donation_dict,
+                   percentile, bucket_factory=BlockedSortedList):
+    """
+        Updates the state with one valid and cleaned up record (see update_state) and returns the output record of
+        the updated key.
+    :param percentile: the percentile value between 1 and 100, or a tuple of them to output several percentiles
+    see update_state for the other parameters
+    :return: the output record as a string if the record is from a repeat donor, otherwise None
+    """
+    key = update_state(cmte_id, name, zip_code, transaction_year, transaction_amt, donor_dict, repeat_donation_dict,
+                       bucket_factory)
+    if key is None:
+        return None
+    return format_state(key, repeat_donation_dict, percentile)
+
+
+def process_records(records, write, donor_dict, repeat_donation_dict, percentile, bucket_factory=BlockedSortedList,
+                    output_prefixes=None):
+    """
+        Does what process_record does for every record of records, the output is the same. It is the loop of
+        process_data_stream and follow_stream. output_prefixes maps each key to its [donations, total] list and to its
+        output prefix (see create_output_prefix), so a repeat donation looks up its key once and an output record is
+        the cached prefix plus its numbers.
+    :param records: an iterable of valid records (cmte_id, name, zip_code, transaction_year, transaction_amt)
+    :param write: a callable taking an output record, e.g. the write method of a BatchedWriter
+    :param output_prefixes: a dictionary kept by the caller between calls on the same state, e.g. one per batch of
+                            follow_stream, a new one is used if it is None
+    see process_record for the other parameters
+    :return: output_prefixes
+    """
+    if output_prefixes is None:
+        output_prefixes = {}
+    for (cmte_id, name, zip_code, transaction_year, transaction_amt) in records:
+        if not update_donor(name, zip_code, transaction_year, donor_dict):
+            continue
+        key = (cmte_id, zip_code, transaction_year)
+        entry = output_prefixes.get(key)
+        if entry is None:
+            entry = output_prefixes[key] = (get_repeat_donation_state(key, repeat_donation_dict, bucket_factory),
+                                            create_output_prefix(cmte_id, zip_code, transaction_year))
+        (state, prefix) = entry
+        add_donation(state, transaction_amt)
+        donations = state[0]
+        write(prefix + create_output_numbers(round_percentile_to_dollars(compute_percentile(donations, percentile)),
+                                             round_cents_to_dollars(state[1]), len(donations)))
+    return output_prefixes
+
+
+def write_summary(writer, keys, repeat_donation_dict, percentile):
+    """
+        Writes the output record of the current state of each key in keys.
+    :param writer: a BatchedWriter or a handle of the output file opened in text mode
+    :param keys: an iterable of keys of repeat_donation_dict
+    :param repeat_donation_dict: dictionary of repeat donations (see add_to_repeat_donation_dict)
+    :param percentile: the percentile value between 1 and 100, or a tuple of them
+    """
+    for key in keys:
+        writer.write(format_state(key, repeat_donation_dict, percentile))
 
-    donor_dict = {}
-    repeat_donation_dict = {}
 
+def iter_valid_records(input_handle):
+    """
+        Reads the records of a text input file line by line and yields the cleaned up fields of the valid ones.
+    :param input_handle: handle of the input file opened in text mode
+    :return: a generator of tuples (cmte_id, name, zip_code, transaction_year, transaction_amt)
+    """
     for line in input_handle:
         (cmte_id, name, zip_code, transaction_dt, transaction_amt, other_id) = extract_required_fields(line)
 
         (validity, fields) = check_field_validity_cleanup(cmte_id, name, zip_code, transaction_dt, transaction_amt,
                                                           other_id)
-        if not validity:  # skip this record if any of the required fields are not valid
-            continue
+        if validity:  # skip this record if any of the required fields are not valid
+            yield fields
 
-        (cmte_id, name, zip_code, transaction_year, transaction_amt) = fields
-
-        donor = (name, zip_code)
-        if donor in donor_dict:
-            if donor_dict[donor] > transaction_year:
-                # keep record of earliest year a donor has donated
-                donor_dict[donor] = transaction_year
-            elif donor_dict[donor] < transaction_year:   # this is a repeat donor
-                repeat_donation_dict = add_to_repeat_donation_dict(cmte_id, zip_code, transaction_year, transaction_amt,
-                                                                   repeat_donation_dict)
-                nth_percentile = compute_percentile(repeat_donation_dict[(cmte_id, zip_code, transaction_year)][0],
-                                                    percentile)
-                total_amount_contributions = round_dollar_amount(repeat_donation_dict[(cmte_id, zip_code,
-                                                                                       transaction_year)][1])
-                total_number_of_contributions = len(repeat_donation_dict[(cmte_id, zip_code, transaction_year)][0])
-                output_record = create_record_for_output(cmte_id, zip_code, transaction_year, nth_percentile,
-                                                         total_amount_contributions, total_number_of_contributions)
-
-                output_handle.write(output_record)
-        else:
-            # add this donor to donor list
-            donor_dict[donor] = transaction_year
 
-    close_files([input_handle, percentile_handle, output_handle])
+def parse_percentiles(string_percentiles):
+    """
+        Parses one percentile or a list of percentiles separated by commas and/or white space, e.g. '30' or '50,90,99'.
+    :param string_percentiles: a string containing the percentiles
+    :return: the percentile as an integer between 1 and 100 if there is only one, otherwise a tuple of them in the
+             given order
+    """
+    percentiles = tuple(int(value) for value in string_percentiles.replace(',', ' ').split())
+    if not percentiles:
+        raise ValueError('At least one percentage should be provided.')
+    if any(percentile < 1 or percentile > 100 for percentile in percentiles):
+        raise ValueError('The provided percentage should be between 1 and 100.')
+    return percentiles[0] if len(percentiles) == 1 else percentiles
+
+
+def read_percentile(percentile_handle):
+    """
+        Reads the percentile value, or the list of percentile values (see parse_percentiles), from the first line of
+        the percentile file.
+    :param percentile_handle: handle of the percentile file opened in text mode
+    :return: the percentile, an integer between 1 and 100, or a tuple of them
+    """
+    first_line = percentile_handle.readline()  # assume the percentile is at the first line
+    return parse_percentiles(first_line)
+
+
+def read_percentile_file(percentile_file):
+    """
+        Opens the percentile file and reads the percentile value or values from it (see read_percentile).
+    :param percentile_file: a string containing the location of percentile file
+    :return: the percentile, an integer between 1 and 100, or a tuple of them
+    """
+    (percentile_handle,) = open_files([(percentile_file, 'r')])
+    percentile = read_percentile(percentile_handle)
+    close_files([percentile_handle])
+    return percentile
+
+
+def create_state(compact_donors=False, verify_donors=False, resume_from=None, bucket_factory=BlockedSortedList):
+    """
+        Creates the donor dictionary and the repeat donation dictionary a run starts from.
+    :param compact_donors: if True, donors are kept in a CompactDonorIndex instead of a dictionary
+    :param verify_donors: if True with compact_donors, the index also keeps the donor keys
+    :param resume_from: if given, the location of a checkpoint file the state is loaded from
+    :param bucket_factory: the type of the buckets of repeat_donation_dict, used for the buckets loaded from resume_from
+    :return: a tuple (donor_dict, repeat_donation_dict)
+    """
+    if resume_from is not None:
+        return checkpoint.load_checkpoint(resume_from, bucket_factory)
+    donor_dict = CompactDonorIndex(verify=verify_donors) if compact_donors else {}
+    return donor_dict, {}
+
+
+def make_bucket_factory(sketch_threshold=None, sketch_k=quantile_sketch.DEFAULT_K):
+    """
+        Returns the bucket type of repeat_donation_dict: exact BlockedSortedList buckets, or, if sketch_threshold is
+        given, ApproximateBucket buckets that switch to a quantile sketch past sketch_threshold donations.
+    """
+    if sketch_threshold is None:
+        return BlockedSortedList
+    return functools.partial(quantile_sketch.ApproximateBucket, threshold=sketch_threshold, k=sketch_k)
+
+
+def process_data_stream(input_file, percentile_file, output_file, use_mmap=False, batch_size=None, workers=None,
+                        compact_donors=False, verify_donors=False, resume_from=None, checkpoint_to=None,
+                        percentiles=None, summary=False, summary_every=None,
+                        output_batch=output_writer.DEFAULT_BATCH_RECORDS, instrumentation=None, stats_file=None,
+                        compression='auto', sketch_threshold=None, sketch_k=quantile_sketch.DEFAULT_K):
+    """
+        This function process a data_stream of donation records by opening input_file that is formatted based on FEC
+        description. It uses the percentile value that is supposed to be in the first line of percentile_file and write
+        the output_file which will only contain records from repeat donors.
+    :param input_file: a string containing the location of input file.
+    :param percentile_file: a string containing the location of percentile file.
+    :param output_file: a string containing the location of output_file
+    :param use_mmap: if True, the input file is memory-mapped and parsed as bytes (see bytes_ingest module). The
+                     output is the same as reading the file as text but it is considerably faster for large files.
+    :param batch_size: if given, records are read as bytes and validated in blocks of batch_size records (see
+                       batch_validation module). The output is the same.
+    :param workers: if given, the input file is split into byte ranges which are parsed and validated by a pool of
+                    worker processes (see parallel_ingest module). donor_dict and repeat_donation_dict are still
+                    updated in the order of the input file, so the output is the same.
+    :param compact_donors: if True, donors are kept in a CompactDonorIndex keyed by a hash of (name, zip_code)
+                           instead of a dictionary, which needs a small fraction of the memory (see donor_index module)
+    :param verify_donors: if True with compact_donors, the index also keeps the donor keys so donors with the same
+                          hash are never merged
+    :param resume_from: if given, the location of a checkpoint file written by an earlier run. The donors and repeat
+                        donations saved in it are loaded instead of starting empty, and the output is appended to
+                        output_file, as if input_file was concatenated to the input of the earlier runs. The kind of
+                        donor dictionary is the one saved in the checkpoint.
+    :param checkpoint_to: if given, the location where the donors and repeat donations are saved at the end of the
+                          run so a later run can resume from them (see checkpoint module)
+    :param percentiles: if given, the percentile or tuple of percentiles to use instead of reading percentile_file.
+                        With several percentiles each output record has one percentile column per percentile.
+    :param summary: if True, instead of a record for every repeat donation only the final state of each
+                    (cmte_id, zip_code, transaction_year) key is written, at the end of the run, in the order the keys
+                    first got a repeat donation
+    :param summary_every: if given with summary, the state of the keys updated since the last summary is also
+                          written after every summary_every valid records, so the last record of each key in the
+                          output is its final state
+    :param output_batch: number of output records joined and written together (see output_writer module)
+    :param instrumentation: if given, a metrics.Instrumentation collecting counters, gauges and sampled stage timings
+                            of the run. It measures the reference text path, so it can not be used with use_mmap,
+                            batch_size or workers.
+    :param stats_file: if given with instrumentation, the location where the metrics are saved as JSON at the end
+    :param compression: 'gzip', 'bz2', 'xz' or 'zip' to read a compressed input file without decompressing it to
+                        disk, None for an uncompressed file or 'auto' to detect it from the first bytes of the file.
+                        A compressed input is decompressed in a background thread and parsed as bytes (see
+                        compressed_input module), batch_size still applies, use_mmap is not needed. It can not be used
+                        with workers or instrumentation.
+    :param sketch_threshold: if given, percentiles of a (cmte_id, zip_code, transaction_year) key stay exact up to
+                             sketch_threshold donations, then its donations are summarized by a KLL quantile sketch
+                             and its percentile becomes approximate (see quantile_sketch module). Memory per key
+                             stays bounded however long the input is. Totals and counts stay exact.
+    :param sketch_k: accuracy parameter of the sketches, the rank error is about 1.65% of the number of donations for
+                     the default 200 and shrinks as 1/sketch_k
+    """
+
+    if compression == 'auto':
+        compression = compressed_input.detect_compression(input_file) if os.path.isfile(input_file) else None
+    if compression is not None and (workers is not None or instrumentation is not None):
+        raise ValueError('A compressed input can not be split between workers or instrumented.')
+    binary_input = use_mmap or batch_size is not None or workers is not None or compression is not None
+    if instrumentation is not None and binary_input:
+        raise ValueError('Instrumentation measures the text path, it can not be used with mmap, batches or workers.')
+    input_handle, output_handle = open_files([(input_file, 'rb' if binary_input else 'r'),
+                                              (output_file, 'w' if resume_from is None else 'a')])
+
+    percentile = percentiles if percentiles is not None else read_percentile_file(percentile_file)
+    bucket_factory = make_bucket_factory(sketch_threshold, sketch_k)
+    (donor_dict, repeat_donation_dict) = create_state(compact_donors, verify_donors, resume_from, bucket_factory)
+
+    if compression is not None:
+        lines = compressed_input.iter_decompressed_lines(input_file, compression)
+        if batch_size is not None:
+            records = batch_validation.iter_valid_records_batched(lines, batch_size)
+        else:
+            records = bytes_ingest.iter_valid_records_from_lines(lines)
+    elif workers is not None:
+        records = parallel_ingest.iter_valid_records_parallel(input_file, input_handle, workers)
+    elif batch_size is not None:
+        lines = bytes_ingest.iter_mapped_lines(input_handle) if use_mmap else input_handle
+        records = batch_validation.iter_valid_records_batched(lines, batch_size)
+    elif use_mmap:
+        records = bytes_ingest.iter_valid_records_mmap(input_handle)
+    else:
+        records = iter_valid_records(input_handle)
+
+    writer = output_writer.BatchedWriter(output_handle, output_batch)
+    if instrumentation is not None:
+        metrics.process_lines_instrumented(input_handle, writer, donor_dict, repeat_donation_dict, percentile,
+                                           instrumentation, summary, summary_every, bucket_factory)
+    elif summary:
+        # keys updated since the last summary, a dictionary is used as a set that keeps the order of the keys
+        updated_keys = {}
+        for record_number, (cmte_id, name, zip_code, transaction_year, transaction_amt) in enumerate(records, 1):
+            key = update_state(cmte_id, name, zip_code, transaction_year, transaction_amt, donor_dict,
+                               repeat_donation_dict, bucket_factory)
+            if key is not None:
+                updated_keys[key] = None
+            if summary_every is not None and record_number % summary_every == 0:
+                write_summary(writer, updated_keys, repeat_donation_dict, percentile)
+                updated_keys.clear()
+        write_summary(writer, updated_keys if summary_every is not None else repeat_donation_dict,
+                      repeat_donation_dict, percentile)
+    else:
+        process_records(records, writer.write, donor_dict, repeat_donation_dict, percentile, bucket_factory)
+    writer.flush()
+
+    close_files([input_handle, output_handle])
+
+    if checkpoint_to is not None:
+        checkpoint.save_checkpoint(checkpoint_to, donor_dict, repeat_donation_dict)
+    if instrumentation is not None and stats_file is not None:
+        instrumentation.save_report(stats_file, donor_dict, repeat_donation_dict)
+
+
+def parse_arguments(argv):
+    """
+        Parses the command line arguments.
+    :param argv: list of command line arguments without the program name
+    :return: an argparse.Namespace with the parsed arguments
+    """
+    parser = argparse.ArgumentParser(description='Finds repeat donors in FEC individual contributions data and '
+                                                 'writes running percentile, total and number of their contributions.')
+    parser.add_argument('input_file', help='input data in the FEC individual contributions format')
+    parser.add_argument('percentile_file',
+                        help='file with the percentile value, or several separated by commas, in its first line')
+    parser.add_argument('output_file', help='location of the output file')
+    parser.add_argument('-time', action='store_true', help='print the running time at the end of the run')
+    parser.add_argument('--percentiles', type=parse_percentiles, metavar='P[,P...]',
+                        help='percentiles to output, one column each, instead of the ones in percentile_file')
+    parser.add_argument('--compression', choices=('auto', 'none') + compressed_input.COMPRESSIONS, default='auto',
+                        help='compression of the input file, detected from its first bytes by default')
+    parser.add_argument('--mmap', action='store_true',
+                        help='memory-map the input file and parse it as bytes, output is unchanged')
+    parser.add_argument('--batch-size', type=int, metavar='N',
+                        help='validate records in blocks of N records at a time, output is unchanged')
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help='parse and validate the input in N worker processes, output is unchanged')
+    parser.add_argument('--compact-donors', action='store_true',
+                        help='keep donors in a compact hash table instead of a dictionary to save memory')
+    parser.add_argument('--verify-donors', action='store_true',
+                        help='with --compact-donors, also keep donor keys so hash collisions can not merge donors')
+    parser.add_argument('--resume', metavar='CHECKPOINT',
+                        help='start from the state saved in CHECKPOINT and append to the output file')
+    parser.add_argument('--checkpoint', metavar='CHECKPOINT',
+                        help='save the state to CHECKPOINT at the end of the run')
+    parser.add_argument('--summary', action='store_true',
+                        help='write only the final state of each recipient, zip code and year at the end of the run')
+    parser.add_argument('--summary-every', type=int, metavar='N',
+                        help='with --summary, also write the state of the updated keys after every N valid records')
+    parser.add_argument('--sketch-threshold', type=int, metavar='N',
+                        help='keep percentiles exact up to N donations per key, then approximate them with a bounded '
+                             'memory quantile sketch')
+    parser.add_argument('--sketch-k', type=int, default=quantile_sketch.DEFAULT_K, metavar='K',
+                        help='with --sketch-threshold, accuracy of the sketches, rank error about 1.65%% for 200')
+    parser.add_argument('--stats-json', metavar='FILE',
+                        help='save counters, rejections by reason, state sizes and stage timings to FILE as JSON')
+    parser.add_argument('--progress', type=float, metavar='SECONDS',
+                        help='print a progress line to stderr about every SECONDS seconds')
+    parser.add_argument('--sample-every', type=int, default=metrics.DEFAULT_SAMPLE_EVERY, metavar='N',
+                        help='with --stats-json, --progress or --profile-stage, time the stages of one record in N')
+    parser.add_argument('--profile-stage', choices=metrics.STAGES,
+                        help='profile a stage of the sampled records with cProfile and print the result to stderr')
+    parser.add_argument('--follow', choices=['file', 'directory', 'socket'],
+                        help='keep running and process records as they arrive: follow input_file as it grows, read the '
+                             'files arriving in the input_file directory, or listen on the input_file Unix socket')
+    parser.add_argument('--max-batch', type=int, default=follow_stream.DEFAULT_MAX_BATCH, metavar='N',
+                        help='with --follow, largest number of lines processed together')
+    parser.add_argument('--max-latency', type=float, default=follow_stream.DEFAULT_MAX_LATENCY, metavar='SECONDS',
+                        help='with --follow, longest time a line waits for its batch before the output is flushed')
+    parser.add_argument('--latency-report', type=float, metavar='SECONDS',
+                        help='with --follow, print the end-to-end latency of records every SECONDS seconds')
+    parser.add_argument('--idle-timeout', type=float, metavar='SECONDS',
+                        help='with --follow, stop when no record arrived for SECONDS seconds')
+    parser.add_argument('--query-port', type=int, metavar='PORT',
+                        help='with --follow, answer HTTP queries on the live state on PORT of localhost')
+    parser.add_argument('--map-reduce', action='store_true',
+                        help='order independent mode: input_file may be a directory or a glob pattern of several '
+                             'files, donors are repeat donors if they donated in an earlier year anywhere in the '
+                             'input, and the final state of every key is written in the order of the keys')
+    parser.add_argument('--partitions', type=int, metavar='N',
+                        help='with --map-reduce, number of donor partitions (default: 4 per worker)')
+    arguments = parser.parse_args(argv)
+    if arguments.summary and arguments.follow is not None:
+        parser.error('--summary can not be used with --follow')
+    if arguments.follow is not None and (arguments.mmap or arguments.batch_size is not None or
+                                         arguments.workers is not None or arguments.compression != 'auto'):
+        parser.error('--follow reads the input as it arrives, it can not be used with --mmap, --batch-size, '
+                     '--workers or --compression')
+    if arguments.query_port is not None and arguments.follow is None:
+        parser.error('--query-port needs --follow')
+    if arguments.map_reduce and (arguments.follow is not None or arguments.summary or arguments.mmap or
+                                 arguments.batch_size is not None or arguments.compact_donors or
+                                 arguments.resume is not None or arguments.checkpoint is not None or
+                                 arguments.sketch_threshold is not None or arguments.compression != 'auto'):
+        parser.error('--map-reduce reads the input with its own workers and keeps no running state, it can only be '
+                     'used with --workers, --partitions and --percentiles')
+    if arguments.partitions is not None and (not arguments.map_reduce or arguments.partitions < 1):
+        parser.error('--partitions needs --map-reduce and a positive number of partitions')
+    if arguments.summary_every is not None and (not arguments.summary or arguments.summary_every < 1):
+        parser.error('--summary-every needs --summary and a positive number of records')
+    if arguments.verify_donors and not arguments.compact_donors:
+        parser.error('--verify-donors needs --compact-donors')
+    arguments.instrument = (arguments.stats_json is not None or arguments.progress is not None or
+                            arguments.profile_stage is not None)
+    if arguments.instrument and (arguments.mmap or arguments.batch_size is not None or arguments.workers is not None or
+                                 arguments.follow is not None or arguments.map_reduce):
+        parser.error('--stats-json, --progress and --profile-stage measure the text path, they can not be used with '
+                     '--mmap, --batch-size, --workers, --follow or --map-reduce')
+    if arguments.compression == 'none':
+        arguments.compression = None
+    if arguments.sketch_threshold is not None and arguments.sketch_threshold < 1:
+        parser.error('--sketch-threshold needs a positive number of donations')
+    if arguments.sketch_threshold is not None and arguments.checkpoint is not None:
+        parser.error('--sketch-threshold can not be used with --checkpoint, sketches are not saved to checkpoints')
+    if arguments.sample_every < 1:
+        parser.error('--sample-every needs a positive number of records')
+    return arguments
 
 
 if __name__ == "__main__":
+    arguments = parse_arguments(sys.argv[1:])
+
     # if optional -time argument is entered, time the code
-    if len(sys.argv) >= 5 and sys.argv[4] == '-time':
+    if arguments.time:
         start_time = time.time()
 
-    # get the location of input and output file from command line
-    try:
-        input_path = sys.argv[1]
-        percentile_path = sys.argv[2]
-        output_path = sys.argv[3]
-    except:
-        raise Exception(('You need to enter the following paths as command arguments: input_file, percentile_file, ',
-                        'and output_file!'))
-
-    process_data_stream(input_path, percentile_path, output_path)
+    if arguments.map_reduce:
+        # imported here so map_reduce stays out of the imports of this module, which every worker process loads
+        import map_reduce
+        map_reduce.run_map_reduce(arguments.input_file, arguments.percentile_file, arguments.output_file,
+                                  workers=arguments.workers, partitions=arguments.partitions,
+                                  percentiles=arguments.percentiles)
+    elif arguments.follow is not None:
+        follow_stream.run_follow(arguments.follow, arguments.input_file, arguments.percentile_file,
+                                 arguments.output_file, max_batch=arguments.max_batch,
+                                 max_latency=arguments.max_latency, report_latency_every=arguments.latency_report,
+                                 idle_timeout=arguments.idle_timeout, compact_donors=arguments.compact_donors,
+                                 verify_donors=arguments.verify_donors, resume_from=arguments.resume,
+                                 checkpoint_to=arguments.checkpoint, percentiles=arguments.percentiles,
+                                 sketch_threshold=arguments.sketch_threshold, sketch_k=arguments.sketch_k,
+                                 query_port=arguments.query_port)
+    else:
+        instrumentation = None
+        profile_hook = None
+        if arguments.instrument:
+            instrumentation = metrics.Instrumentation(arguments.sample_every, arguments.progress)
+            if arguments.profile_stage is not None:
+                profile_hook = metrics.ProfileHook()
+                instrumentation.add_hook(arguments.profile_stage, profile_hook)
+        process_data_stream(arguments.input_file, arguments.percentile_file, arguments.output_file,
+                            use_mmap=arguments.mmap, batch_size=arguments.batch_size, workers=arguments.workers,
+                            compact_donors=arguments.compact_donors, verify_donors=arguments.verify_donors,
+                            resume_from=arguments.resume, checkpoint_to=arguments.checkpoint,
+                            percentiles=arguments.percentiles, summary=arguments.summary,
+                            summary_every=arguments.summary_every, instrumentation=instrumentation,
+                            stats_file=arguments.stats_json, compression=arguments.compression,
+                            sketch_threshold=arguments.sketch_threshold, sketch_k=arguments.sketch_k)
+        if profile_hook is not None:
+            sys.stderr.write(profile_hook.summary())
 
     # if optional -time argument is entered, print the run time
-    if len(sys.argv) >= 5 and sys.argv[4] == '-time':
+    if arguments.time:
         print("--- running time: %s seconds ---" % (time.time() - start_time))
@@ -0,0 +1,98 @@
+import itertools
+import locale
+import re
+
+import bytes_ingest
+
+
+DEFAULT_BATCH_SIZE = 4096
+
+# one bytes pattern doing the checks of check_field_validity_cleanup for a whole ASCII record in a single C call.
+# white space accepted around a field is the same that str.strip() removes in the ASCII range.
+_WS_CHARACTERS = rb' \t\n\r\x0b\x0c\x1c-\x1f'
+_WS = rb'[' + _WS_CHARACTERS + rb']*'
+_SKIP = rb'[^|]*\|'
+RECORD_PATTERN = re.compile(
+    _WS + rb'([A-Za-z0-9]{9})' + _WS + rb'\|' +                             # 0 CMTE_ID
+    _SKIP * 6 +
+    # 7 NAME, at most 200 characters with at least one that is not white space. A name with more than 200 characters
+    # only because of surrounding white space is rejected here and accepted by the exact check of check_line.
+    rb'(?=[^|]{1,200}\|)(?=' + _WS + rb'[^|' + _WS_CHARACTERS + rb'])([^|]*)\|' +
+    _SKIP * 2 +
+    _WS + rb'([0-9]{5})(?:[0-9]{4})?' + _WS + rb'\|' +                      # 10 ZIP_CODE, 5 or 9 digits
+    _SKIP * 2 +
+    _WS + rb'(?:0[1-9]|1[0-2])(?:0[1-9]|[12][0-9]|3[01])([0-9]{4})' + _WS + rb'\|' +   # 13 TRANSACTION_DT
+    # 14 TRANSACTION_AMT, at most 14 digits and 2 decimal digits
+    _WS + rb'([0-9]{1,14}|(?=[0-9.]{2,15}[^0-9.])[0-9]*\.[0-9]{0,2})' + _WS + rb'\|' +
+    _WS + rb'(?:\||\Z)'                                                     # 15 OTHER_ID should be empty
+)
+
+
+def validate_cleanup_batch(lines, encoding=None):
+    """
+        Validates and cleans up a block of raw records at once. Each record is checked by RECORD_PATTERN with one C
+        level regular expression match and the matched fields are then converted column by column. A record the
+        pattern rejects, or any record of a block that is not pure ASCII, is checked again by bytes_ingest.check_line,
+        so such records are handled exactly as in the text path.
+    :param lines: a list of raw bytes records without carriage returns (see bytes_ingest.iter_lines)
+    :param encoding: encoding of the input, defaults to the one open() uses for text files
+    :return: a tuple (mask, columns). mask is a list of booleans, True for each valid record in lines. columns is a
+             tuple (cmte_ids, names, zip_codes, transaction_years, transaction_amts) of lists holding the cleaned fields
+             of the valid records in their original order.
+    """
+    if encoding is None:
+        encoding = locale.getpreferredencoding(False)
+
+    matches = list(map(RECORD_PATTERN.match, lines))
+    if not b''.join(lines).isascii():
+        # only pure ASCII records can be trusted to the pattern
+        matches = [match if line.isascii() else None for line, match in zip(lines, matches)]
+
+    if None not in matches:
+        # the common case, every record of the block is valid
+        mask = [True] * len(lines)
+        rows = [match.groups() for match in matches]
+    else:
+        mask = [match is not None for match in matches]
+        rows = [match.groups() if match is not None else None for match in matches]
+        for i in [i for i, match in enumerate(matches) if match is None]:
+            (mask[i], fields) = bytes_ingest.check_line(lines[i], encoding)
+            if mask[i]:
+                rows[i] = fields
+        rows = [row for row in rows if row is not None]
+
+    if not rows:
+        return mask, ([], [], [], [], [])
+
+    (cmte_ids, names, zip_codes, years, amounts) = zip(*rows)
+    strip_characters = bytes_ingest.ASCII_WHITESPACE
+
+    # records that went through check_line are already cleaned up, they hold str instead of bytes
+    cmte_ids = [value.decode('ascii') if type(value) is bytes else value for value in cmte_ids]
+    names = [value.strip(strip_characters).decode('ascii') if type(value) is bytes else value for value in names]
+    zip_codes = [value.decode('ascii') if type(value) is bytes else value for value in zip_codes]
+    transaction_years = list(map(int, years))
+    parse_cents = bytes_ingest.parse_dollar_amount_cents_bytes
+    transaction_amts = [parse_cents(value) if type(value) is bytes else value for value in amounts]
+
+    return mask, (cmte_ids, names, zip_codes, transaction_years, transaction_amts)
+
+
+def iter_valid_records_batched(raw_lines, batch_size=DEFAULT_BATCH_SIZE, encoding=None):
+    """
+        Reads raw_lines in blocks of batch_size records, validates each block with validate_cleanup_batch and yields the
+        valid records in their original order.
+    :param raw_lines: an iterable of bytes lines split on b'\\n' only, e.g. a binary file handle
+    :param batch_size: number of records validated together
+    :param encoding: encoding of the input, defaults to the one open() uses for text files
+    :return: a generator of tuples (cmte_id, name, zip_code, transaction_year, transaction_amt)
+    """
+    if batch_size < 1:
+        raise ValueError('Batch size should be a positive integer.')
+    lines = bytes_ingest.iter_lines(raw_lines)
+    while True:
+        batch = list(itertools.islice(lines, batch_size))
+        if not batch:
+            return
+        (mask, columns) = validate_cleanup_batch(batch, encoding)
+        yield from zip(*columns)
@@ -0,0 +1,169 @@
+import locale
+import mmap
+
+import analyze_repeat_donations as analyzer
+
+
+# white space characters removed by str.strip() that are in the ASCII range
+ASCII_WHITESPACE = b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
+
+
+def parse_dollar_amount_cents_bytes(amount):
+    """
+        Same as analyze_repeat_donations.parse_dollar_amount_cents for an ASCII bytes string.
+    :param amount: a bytes string already stripped from white space characters
+    :return: the amount as an integer number of cents, or None if amount is not a valid dollar amount with scale 2
+             and precision 14.
+    """
+    integer_part, dot, fraction_part = amount.partition(b'.')
+    if not (integer_part or fraction_part):
+        return None
+    if (integer_part and not integer_part.isdigit()) or (fraction_part and not fraction_part.isdigit()):
+        return None
+    if len(fraction_part) > 2 or len(integer_part) + len(fraction_part) > 14:
+        return None
+    return int(integer_part + fraction_part.ljust(2, b'0'))
+
+
+def check_field_validity_cleanup_bytes(cmte_id, name, zip_code, transaction_dt, transaction_amt, other_id):
+    """
+        Same checks and cleanups as analyze_repeat_donations.check_field_validity_cleanup for ASCII bytes fields.
+        Only the fields of a valid record get decoded to strings.
+    :param cmte_id: donation recipient id
+    :param name: a bytes string containing name of donor
+    :param zip_code: a bytes string containing zip code of donor
+    :param transaction_dt: a bytes string containing date of donation
+    :param transaction_amt: a bytes string containing amount of transaction in dollar
+    :param other_id: a bytes string which is empty when the donation is from an individual
+    :return: a tuple in this form (validity, (cmte_id, name, zip_code, transaction_year, transaction_amt)), or
+             (False, reason) for an invalid record
+    """
+    if other_id.strip(ASCII_WHITESPACE):
+        return False, 'other_id'
+
+    cmte_id = cmte_id.strip(ASCII_WHITESPACE)
+    if len(cmte_id) != 9 or (not cmte_id.isalnum()):
+        return False, 'cmte_id'
+
+    name = name.strip(ASCII_WHITESPACE)
+    if len(name) > 200 or not name:
+        return False, 'name'
+
+    zip_code = zip_code.strip(ASCII_WHITESPACE)
+    if not (len(zip_code) == 5 or len(zip_code) == 9) or not zip_code.isdigit():
+        return False, 'zip_code'
+
+    transaction_dt = transaction_dt.strip(ASCII_WHITESPACE)
+    if (len(transaction_dt) != 8 or (not transaction_dt.isdigit()) or
+            not (b'01' <= transaction_dt[0:2] <= b'12') or not (b'01' <= transaction_dt[2:4] <= b'31')):
+        return False, 'transaction_dt'
+
+    transaction_amt = parse_dollar_amount_cents_bytes(transaction_amt.strip(ASCII_WHITESPACE))
+    if transaction_amt is None:
+        return False, 'transaction_amt'
+
+    return True, (cmte_id.decode('ascii'), name.decode('ascii'), zip_code[0:5].decode('ascii'),
+                  int(transaction_dt[4:]), transaction_amt)
+
+
+def extract_required_fields_bytes(record):
+    """
+        Extracts the required fields from a raw bytes record. Only the first 16 delimiters are scanned since
+        OTHER_ID (index 15) is the last required field.
+    :param record: raw record for a donation according to FEC description, as a bytes string
+    :return: a tuple including required fields:
+             (CMTE_ID, NAME, ZIP_CODE, TRANSACTION_DT, TRANSACTION_AMT, OTHER_ID)
+    """
+    all_fields = record.split(b'|', 16)
+    return all_fields[0], all_fields[7], all_fields[10], all_fields[13], all_fields[14], all_fields[15]
+
+
+def split_universal_newlines(line):
+    """
+        Splits a raw line that contains a carriage return the same way a file opened in text mode would (universal
+        newlines), so b'\\r' and b'\\r\\n' both end a line.
+    :param line: a bytes string ending with at most one b'\\n'
+    :return: a list of bytes lines, each ending with b'\\n' except possibly the last one
+    """
+    normalized = line.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    lines = [part + b'\n' for part in normalized.split(b'\n')]
+    if normalized.endswith(b'\n'):
+        lines.pop()
+    else:
+        lines[-1] = lines[-1][:-1]
+    return lines
+
+
+def iter_lines(raw_lines):
+    """
+        Yields the lines of raw_lines applying universal newlines to any line holding a carriage return.
+    :param raw_lines: an iterable of bytes lines split on b'\\n' only
+    :return: a generator of bytes lines
+    """
+    for line in raw_lines:
+        if b'\r' in line:
+            yield from split_universal_newlines(line)
+        else:
+            yield line
+
+
+def check_line(line, encoding):
+    """
+        Validates and cleans one raw bytes line. A pure ASCII line goes through the bytes fast path, any other line gets
+        decoded and checked by the text functions of analyze_repeat_donations so the result is exactly the same as
+        reading the file in text mode. A line with fewer fields than OTHER_ID is rejected with the reason 'columns',
+        it happens on a live stream when a line is cut, e.g. by a client disconnecting in the middle of it.
+    :param line: a bytes line without carriage returns
+    :param encoding: the encoding used to decode a non-ASCII line
+    :return: a tuple in this form (validity, (cmte_id, name, zip_code, transaction_year, transaction_amt)), or
+             (False, reason) for an invalid record
+    """
+    try:
+        if line.isascii():
+            return check_field_validity_cleanup_bytes(*extract_required_fields_bytes(line))
+        required_fields = tuple(analyzer.extract_required_fields(line.decode(encoding)))
+    except IndexError:
+        return False, 'columns'
+    return analyzer.check_field_validity_cleanup(*required_fields)
+
+
+def iter_valid_records_from_lines(lines, encoding=None):
+    """
+        Validates and cleans raw bytes lines and yields the valid records (see check_line).
+    :param lines: an iterable of bytes lines split on b'\\n' only
+    :param encoding: encoding of the input, defaults to the one open() uses for text files
+    :return: a generator of tuples (cmte_id, name, zip_code, transaction_year, transaction_amt)
+    """
+    if encoding is None:
+        encoding = locale.getpreferredencoding(False)
+
+    for line in iter_lines(lines):
+        (validity, fields) = check_line(line, encoding)
+        if validity:
+            yield fields
+
+
+def iter_mapped_lines(input_handle):
+    """
+        Memory-maps the input file and yields its lines split on b'\\n'.
+    :param input_handle: handle of the input file opened in binary mode
+    :return: a generator of bytes lines
+    """
+    try:
+        mapped = mmap.mmap(input_handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:   # an empty file can not be mapped
+        return
+    try:
+        yield from iter(mapped.readline, b'')
+    finally:
+        mapped.close()
+
+
+def iter_valid_records_mmap(input_handle, encoding=None):
+    """
+        Memory-maps the input file and yields the valid records in file order.
+    :param input_handle: handle of the input file opened in binary mode
+    :param encoding: encoding of the input, defaults to the one open() uses for text files
+    :return: a generator of tuples (cmte_id, name, zip_code, transaction_year, transaction_amt)
+    """
+    return iter_valid_records_from_lines(iter_mapped_lines(input_handle), encoding)
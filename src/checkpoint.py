@@ -0,0 +1,180 @@
+import array
+import mmap
+import os
+import struct
+import sys
+
+from donor_index import CompactDonorIndex
+from order_statistics import BlockedSortedList
+
+
+MAGIC = b'ARDCKPT1'
+VERSION = 1
+# header: magic, version, byte order (0 little, 1 big), donor kind (0 dict, 1 CompactDonorIndex)
+HEADER = struct.Struct('<8sHBB')
+# CompactDonorIndex header: hash bits, verify, number of donors
+COMPACT_DONORS_HEADER = struct.Struct('<HBQ')
+LENGTH = struct.Struct('<Q')
+
+DICT_DONORS = 0
+COMPACT_DONORS = 1
+# zip codes are always the first five characters of ZIP_CODE, this lets keys be stored as name + zip_code
+ZIP_CODE_LENGTH = 5
+
+
+def _write_blob(handle, data):
+    """
+        Writes a length prefixed blob padded to a multiple of 8 bytes, so every column of the file is aligned and can
+        be used in place through a memoryview.
+    """
+    handle.write(LENGTH.pack(len(data)))
+    handle.write(data)
+    handle.write(b'\x00' * (-len(data) % 8))
+
+
+def _read_blob(view, offset):
+    """
+        Reads a blob written by _write_blob.
+    :param view: a memoryview of the whole checkpoint file
+    :param offset: offset of the length prefix of the blob
+    :return: a tuple (memoryview of the blob, offset after the blob)
+    """
+    (length,) = LENGTH.unpack_from(view, offset)
+    start = offset + LENGTH.size
+    return view[start:start + length], start + length + (-length % 8)
+
+
+def _join_keys(keys):
+    """
+        Joins (text, zip_code) keys in one utf-8 blob, one key per line. Keys can not hold a new line since they come
+        from the fields of a line of the input.
+    """
+    return '\n'.join(text + zip_code for text, zip_code in keys).encode('utf-8')
+
+
+def _split_keys(blob, count):
+    """
+        The reverse of _join_keys.
+    """
+    if count == 0:
+        return []
+    return [(key[:-ZIP_CODE_LENGTH], key[-ZIP_CODE_LENGTH:]) for key in bytes(blob).decode('utf-8').split('\n')]
+
+
+def save_checkpoint(checkpoint_file, donor_dict, repeat_donation_dict):
+    """
+        Saves donor_dict and repeat_donation_dict to checkpoint_file. The file is first written next to
+        checkpoint_file and then renamed, so an interrupted run never leaves a broken checkpoint behind.
+
+        File layout (all integers in the byte order of the machine, all columns aligned to 8 bytes):
+            header, then the donors, either
+                - dict: number of donors, keys as utf-8 lines of name + zip_code, uint16 earliest years
+                - CompactDonorIndex: hash bits, verify flag, number of donors, then its hash, high hash and uint16
+                  year columns and for verify the uint64 offsets and the blob of the keys of each slot
+            then the repeat donations: number of keys, keys as utf-8 lines of cmte_id + zip_code, uint16 years, int64
+            totals in cents, uint64 number of donations of each key and all the donations in cents, sorted, key after
+            key.
+    :param checkpoint_file: a string containing the location of the checkpoint file
+    :param donor_dict: dictionary of donors or a CompactDonorIndex
+    :param repeat_donation_dict: dictionary of repeat donations (see add_to_repeat_donation_dict). Buckets that
+                                 switched to a quantile sketch can not be saved.
+    """
+    if not all(getattr(bucket, 'is_exact', True) for bucket, total in repeat_donation_dict.values()):
+        raise ValueError('Buckets summarized by a quantile sketch can not be saved to a checkpoint.')
+    temporary_file = checkpoint_file + '.tmp'
+    with open(temporary_file, 'wb') as handle:
+        compact = isinstance(donor_dict, CompactDonorIndex)
+        handle.write(HEADER.pack(MAGIC, VERSION, 0 if sys.byteorder == 'little' else 1,
+                                 COMPACT_DONORS if compact else DICT_DONORS))
+
+        if compact:
+            (hashes, hashes_high, years, keys) = donor_dict.columns()
+            handle.write(COMPACT_DONORS_HEADER.pack(donor_dict.hash_bits, donor_dict.verify, len(donor_dict)))
+            _write_blob(handle, hashes.tobytes())
+            _write_blob(handle, hashes_high.tobytes() if hashes_high is not None else b'')
+            _write_blob(handle, years.tobytes())
+            if keys is not None:
+                offsets = array.array('Q', [0])
+                for key in keys:
+                    offsets.append(offsets[-1] + (len(key) if key is not None else 0))
+                _write_blob(handle, offsets.tobytes())
+                _write_blob(handle, b''.join(key for key in keys if key is not None))
+        else:
+            handle.write(LENGTH.pack(len(donor_dict)))
+            _write_blob(handle, _join_keys(donor_dict.keys()))
+            _write_blob(handle, array.array('H', donor_dict.values()).tobytes())
+
+        handle.write(LENGTH.pack(len(repeat_donation_dict)))
+        _write_blob(handle, _join_keys((cmte_id, zip_code) for (cmte_id, zip_code, year) in repeat_donation_dict))
+        _write_blob(handle, array.array('H', (year for (cmte_id, zip_code, year) in repeat_donation_dict)).tobytes())
+        _write_blob(handle, array.array('q', (total for bucket, total in repeat_donation_dict.values())).tobytes())
+        _write_blob(handle, array.array('Q', (len(bucket) for bucket, total in repeat_donation_dict.values()))
+                    .tobytes())
+        donations = array.array('q')
+        for bucket, total in repeat_donation_dict.values():
+            donations.extend(bucket)
+        _write_blob(handle, donations.tobytes())
+
+    os.replace(temporary_file, checkpoint_file)
+
+
+def load_checkpoint(checkpoint_file, bucket_factory=BlockedSortedList):
+    """
+        Loads donor_dict and repeat_donation_dict from a file written by save_checkpoint. The file is memory-mapped.
+        The columns of a CompactDonorIndex are used in place through copy-on-write memoryviews, so loading it takes
+        about the time needed to map the file, changes made by the resumed run never go back to the file.
+    :param checkpoint_file: a string containing the location of the checkpoint file
+    :param bucket_factory: a callable building the ordered container of a bucket from its sorted donations
+    :return: a tuple (donor_dict, repeat_donation_dict)
+    """
+    with open(checkpoint_file, 'rb') as handle:
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_COPY)
+    view = memoryview(mapped)
+
+    (magic, version, byte_order, donor_kind) = HEADER.unpack_from(view, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('{} is not a checkpoint of this version.'.format(checkpoint_file))
+    if byte_order != (0 if sys.byteorder == 'little' else 1):
+        raise ValueError('{} was written on a machine with a different byte order.'.format(checkpoint_file))
+    offset = HEADER.size
+
+    if donor_kind == COMPACT_DONORS:
+        (hash_bits, verify, length) = COMPACT_DONORS_HEADER.unpack_from(view, offset)
+        offset += COMPACT_DONORS_HEADER.size
+        hashes, offset = _read_blob(view, offset)
+        hashes_high, offset = _read_blob(view, offset)
+        years, offset = _read_blob(view, offset)
+        keys = None
+        if verify:
+            offsets, offset = _read_blob(view, offset)
+            key_blob, offset = _read_blob(view, offset)
+            offsets = offsets.cast('Q')
+            key_blob = bytes(key_blob)
+            keys = [key_blob[start:end] if end > start else None for start, end in zip(offsets, offsets[1:])]
+        donor_dict = CompactDonorIndex.from_columns(hash_bits, bool(verify), length, hashes.cast('Q'),
+                                                    hashes_high.cast('Q') if hash_bits == 128 else None,
+                                                    years.cast('H'), keys)
+    else:
+        (count,) = LENGTH.unpack_from(view, offset)
+        offset += LENGTH.size
+        keys, offset = _read_blob(view, offset)
+        years, offset = _read_blob(view, offset)
+        donor_dict = dict(zip(_split_keys(keys, count), years.cast('H')))
+
+    (count,) = LENGTH.unpack_from(view, offset)
+    offset += LENGTH.size
+    keys, offset = _read_blob(view, offset)
+    years, offset = _read_blob(view, offset)
+    totals, offset = _read_blob(view, offset)
+    sizes, offset = _read_blob(view, offset)
+    donations, offset = _read_blob(view, offset)
+    donations = donations.cast('q')
+
+    repeat_donation_dict = {}
+    start = 0
+    for (cmte_id, zip_code), year, total, size in zip(_split_keys(keys, count), years.cast('H'), totals.cast('q'),
+                                                      sizes.cast('Q')):
+        repeat_donation_dict[(cmte_id, zip_code, year)] = [bucket_factory(donations[start:start + size]), total]
+        start += size
+
+    return donor_dict, repeat_donation_dict
@@ -0,0 +1,140 @@
+import bz2
+import gzip
+import lzma
+import os
+import queue
+import threading
+import zipfile
+
+
+# size of the decompressed blocks handed from the decompression thread to the parser
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+# number of decompressed blocks the decompression thread can get ahead of the parser
+DEFAULT_QUEUE_SIZE = 8
+# first bytes of each supported format, zstd is recognized only to give a clear error
+MAGIC_NUMBERS = [(b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'xz'), (b'PK\x03\x04', 'zip'),
+                 (b'\x28\xb5\x2f\xfd', 'zstd')]
+COMPRESSIONS = ('gzip', 'bz2', 'xz', 'zip')
+# name of the records file inside FEC bulk data zip archives
+FEC_MEMBER_NAME = 'itcont.txt'
+
+
+def detect_compression(input_file):
+    """
+        Detects the compression of a file from its first bytes.
+    :param input_file: a string containing the location of the file
+    :return: 'gzip', 'bz2', 'xz' or 'zip', or None for an uncompressed file
+    """
+    with open(input_file, 'rb') as handle:
+        head = handle.read(6)
+    for magic, compression in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            if compression not in COMPRESSIONS:
+                raise ValueError('{} is {} compressed which is not supported, decompress it first or use gzip, bz2, '
+                                 'xz or zip.'.format(input_file, compression))
+            return compression
+    return None
+
+
+def open_decompressed(input_file, compression):
+    """
+        Opens a compressed file for reading its decompressed bytes. A zip archive should hold a single file or an
+        itcont.txt file like the FEC bulk data archives.
+    :param input_file: a string containing the location of the file
+    :param compression: 'gzip', 'bz2', 'xz' or 'zip'
+    :return: a binary file object
+    """
+    if compression == 'gzip':
+        return gzip.open(input_file, 'rb')
+    if compression == 'bz2':
+        return bz2.open(input_file, 'rb')
+    if compression == 'xz':
+        return lzma.open(input_file, 'rb')
+    if compression == 'zip':
+        # the member keeps the archive file open after the archive is closed
+        with zipfile.ZipFile(input_file) as archive:
+            members = [member for member in archive.infolist() if not member.is_dir()]
+            if len(members) != 1:
+                members = [member for member in members if os.path.basename(member.filename) == FEC_MEMBER_NAME]
+            if len(members) != 1:
+                raise ValueError('{} should hold a single file or a single {}.'.format(input_file, FEC_MEMBER_NAME))
+            return archive.open(members[0])
+    raise ValueError('Compression should be one of: {}.'.format(', '.join(COMPRESSIONS)))
+
+
+def iter_decompressed_blocks(input_file, compression, block_size=DEFAULT_BLOCK_SIZE, queue_size=DEFAULT_QUEUE_SIZE):
+    """
+        Decompresses a file in a background thread and yields its decompressed bytes in blocks of about block_size
+        bytes. zlib, bz2 and lzma release the GIL while they decompress, so decompression runs at the same time as the
+        processing of the previous blocks. At most queue_size blocks wait in the queue, so memory stays bounded when
+        the processing is slower than the decompression. An error of the decompression is raised in the consumer.
+    :param input_file: a string containing the location of the file
+    :param compression: 'gzip', 'bz2', 'xz' or 'zip'
+    :param block_size: size of the blocks read from the decompressor
+    :param queue_size: largest number of blocks waiting to be processed
+    :return: a generator of bytes strings
+    """
+    blocks = queue.Queue(queue_size)
+    stop = threading.Event()
+
+    def put(item):
+        # give up when the consumer is gone instead of waiting forever on a full queue
+        while not stop.is_set():
+            try:
+                blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def decompress():
+        try:
+            with open_decompressed(input_file, compression) as handle:
+                while not stop.is_set():
+                    block = handle.read(block_size)
+                    if not block:
+                        break
+                    put(block)
+            put(None)   # end of the file
+        except Exception as error:
+            put(error)
+
+    thread = threading.Thread(target=decompress, name='decompress', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = blocks.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def iter_block_lines(blocks):
+    """
+        Reassembles the lines of a stream of byte blocks. A line is split on b'\\n' and b'\\r' as bytes.splitlines
+        does, the functions of bytes_ingest apply universal newlines to the lines holding a carriage return.
+    :param blocks: an iterable of bytes strings
+    :return: a generator of bytes lines, each keeping its line ending
+    """
+    partial = b''
+    for block in blocks:
+        end = block.rfind(b'\n') + 1
+        if end == 0:
+            partial += block
+            continue
+        yield from (partial + block[:end]).splitlines(True)
+        partial = block[end:]
+    if partial:
+        yield from partial.splitlines(True)
+
+
+def iter_decompressed_lines(input_file, compression, block_size=DEFAULT_BLOCK_SIZE, queue_size=DEFAULT_QUEUE_SIZE):
+    """
+        Yields the lines of a compressed file decompressed in a background thread (see iter_decompressed_blocks).
+    :return: a generator of bytes lines
+    """
+    return iter_block_lines(iter_decompressed_blocks(input_file, compression, block_size, queue_size))
@@ -0,0 +1,202 @@
+import array
+import hashlib
+
+
+# the table is grown to twice its size when more than this fraction of its slots is used
+MAX_LOAD_FACTOR = 0.7
+# largest year the uint16 year column can hold
+MAX_YEAR = 0xFFFF
+
+
+def donor_key_bytes(donor):
+    """
+        Returns the normalized byte representation of a donor used for hashing.
+    :param donor: a tuple (name, zip_code) with name already stripped and zip_code holding the first five digits
+    :return: a bytes string
+    """
+    name, zip_code = donor
+    return name.encode('utf-8') + b'\x1f' + zip_code.encode('utf-8')
+
+
+class CompactDonorIndex(object):
+    """
+        A drop-in replacement of donor_dict which keeps the earliest year of each donor in a few flat arrays instead of
+        a dictionary of (name, zip_code) tuples.
+
+        Each donor is identified by a 64 or 128 bit blake2b hash of its normalized (name, zip_code). The hashes and the
+        years live in an open-addressing table with linear probing made of array('Q') columns for the hash and an
+        array('H') (uint16) column for the year, about 10 bytes per slot for 64 bit hashes instead of a few hundred
+        bytes per entry of a dictionary of tuples of strings.
+
+        Two different donors sharing the same hash would be merged. With 64 bit hashes the chance of any collision
+        among n donors is about n^2 / 2^65 (around 1e-4 for 50M donors), with 128 bit hashes it is negligible. With
+        verify=True the normalized key of every donor is also kept, so colliding donors are told apart at the cost of
+        the memory of the keys.
+
+        It supports `donor in index`, `index[donor]`, `index[donor] = year`, get() and len() like a dictionary.
+    """
+
+    def __init__(self, capacity=1024, hash_bits=64, verify=False):
+        """
+        :param capacity: number of donors the table can hold before it needs to grow
+        :param hash_bits: 64 or 128, the size of the hash identifying a donor
+        :param verify: if True, keep the normalized key of each donor and compare it on every hash match
+        """
+        if hash_bits not in (64, 128):
+            raise ValueError('Donor hash should have 64 or 128 bits.')
+        self.hash_bits = hash_bits
+        self.verify = verify
+        self._digest_size = hash_bits // 8
+        size = 8
+        while size * MAX_LOAD_FACTOR < capacity:
+            size *= 2
+        self._allocate(size)
+        self._len = 0
+        self._last_lookup = None
+
+    def _allocate(self, size):
+        """
+            Creates an empty table with size slots, size should be a power of two.
+        """
+        self._mask = size - 1
+        self._max_len = int(size * MAX_LOAD_FACTOR)
+        self._hashes = array.array('Q', bytes(8 * size))   # 0 marks an empty slot
+        self._hashes_high = array.array('Q', bytes(8 * size)) if self.hash_bits == 128 else None
+        self._years = array.array('H', bytes(2 * size))
+        self._keys = [None] * size if self.verify else None
+
+    def _hash(self, key):
+        """
+            Returns the hash of a normalized key split in a low and a high 64 bit part. The low part is never 0.
+        """
+        digest = hashlib.blake2b(key, digest_size=self._digest_size).digest()
+        low = int.from_bytes(digest[:8], 'little') or 1
+        high = int.from_bytes(digest[8:], 'little') if self.hash_bits == 128 else 0
+        return low, high
+
+    def _lookup(self, donor):
+        """
+            Finds the slot of donor, or the empty slot where it should be inserted. The result of the last lookup is
+            cached since the same donor is usually looked up and then updated right after.
+        :return: a tuple (slot, found, key, low, high)
+        """
+        last_lookup = self._last_lookup
+        if last_lookup is not None and last_lookup[0] == donor:
+            return last_lookup[1]
+
+        key = donor_key_bytes(donor)
+        low, high = self._hash(key)
+        hashes, hashes_high, keys = self._hashes, self._hashes_high, self._keys
+        mask = self._mask
+        slot = low & mask
+        while True:
+            slot_hash = hashes[slot]
+            if slot_hash == 0:
+                found = False
+                break
+            if (slot_hash == low and (hashes_high is None or hashes_high[slot] == high) and
+                    (keys is None or keys[slot] == key)):
+                found = True
+                break
+            slot = (slot + 1) & mask
+
+        result = (slot, found, key, low, high)
+        self._last_lookup = (donor, result)
+        return result
+
+    def _grow(self):
+        """
+            Doubles the size of the table and re-inserts all the donors. Only the stored hashes are needed for that.
+        """
+        old_hashes, old_hashes_high, old_years, old_keys = self._hashes, self._hashes_high, self._years, self._keys
+        self._allocate(2 * (self._mask + 1))
+        hashes, hashes_high, years, keys = self._hashes, self._hashes_high, self._years, self._keys
+        mask = self._mask
+        for old_slot, low in enumerate(old_hashes):
+            if low == 0:
+                continue
+            slot = low & mask
+            while hashes[slot] != 0:
+                slot = (slot + 1) & mask
+            hashes[slot] = low
+            years[slot] = old_years[old_slot]
+            if hashes_high is not None:
+                hashes_high[slot] = old_hashes_high[old_slot]
+            if keys is not None:
+                keys[slot] = old_keys[old_slot]
+        self._last_lookup = None
+
+    def __contains__(self, donor):
+        return self._lookup(donor)[1]
+
+    def __getitem__(self, donor):
+        (slot, found, key, low, high) = self._lookup(donor)
+        if not found:
+            raise KeyError(donor)
+        return self._years[slot]
+
+    def get(self, donor, default=None):
+        (slot, found, key, low, high) = self._lookup(donor)
+        return self._years[slot] if found else default
+
+    def __setitem__(self, donor, year):
+        if year < 0 or year > MAX_YEAR:
+            raise ValueError('Year should be between 0 and {}.'.format(MAX_YEAR))
+        (slot, found, key, low, high) = self._lookup(donor)
+        self._years[slot] = year
+        if found:
+            return
+
+        self._hashes[slot] = low
+        if self._hashes_high is not None:
+            self._hashes_high[slot] = high
+        if self._keys is not None:
+            self._keys[slot] = key
+        self._len += 1
+        self._last_lookup = (donor, (slot, True, key, low, high))
+        if self._len > self._max_len:
+            self._grow()
+
+    def __len__(self):
+        return self._len
+
+    def columns(self):
+        """
+            Returns the table columns, used to save the index to a checkpoint.
+        :return: a tuple (hashes, hashes_high, years, keys). hashes_high is None for 64 bit hashes and keys is None
+                 unless verify is True.
+        """
+        return self._hashes, self._hashes_high, self._years, self._keys
+
+    @classmethod
+    def from_columns(cls, hash_bits, verify, length, hashes, hashes_high, years, keys):
+        """
+            Builds an index on top of existing table columns, e.g. memoryviews of a memory-mapped checkpoint, without
+            copying them.
+        :param hash_bits: 64 or 128, the size of the hash identifying a donor
+        :param verify: True if keys holds the normalized key of each slot
+        :param length: number of donors in the table
+        :param hashes: sequence of unsigned 64 bit integers, its length is the number of slots, a power of two
+        :param hashes_high: same as hashes for the high part of 128 bit hashes, otherwise None
+        :param years: sequence of unsigned 16 bit integers
+        :param keys: a list of bytes or None for each slot if verify is True, otherwise None
+        :return: a CompactDonorIndex
+        """
+        index = cls(capacity=1, hash_bits=hash_bits, verify=verify)
+        size = len(hashes)
+        if size & (size - 1) or len(years) != size:
+            raise ValueError('Donor index columns should have the same power of two length.')
+        index._mask = size - 1
+        index._max_len = int(size * MAX_LOAD_FACTOR)
+        index._hashes, index._hashes_high, index._years, index._keys = hashes, hashes_high, years, keys
+        index._len = length
+        return index
+
+    def memory_size(self):
+        """
+            Returns the number of bytes used by the table columns, not counting the verification keys.
+        """
+        size = self._hashes.itemsize * len(self._hashes) + self._years.itemsize * len(self._years)
+        if self._hashes_high is not None:
+            size += self._hashes_high.itemsize * len(self._hashes_high)
+        return size
@@ -0,0 +1,363 @@
+import asyncio
+import bisect
+import contextlib
+import math
+import os
+import stat
+import sys
+import time
+
+import analyze_repeat_donations as analyzer
+import bytes_ingest
+import checkpoint
+import quantile_sketch
+import query_server
+from order_statistics import BlockedSortedList
+
+
+DEFAULT_POLL_INTERVAL = 0.05      # seconds between two checks of a file that has no new data
+DEFAULT_MAX_BATCH = 4096          # lines processed and written together
+DEFAULT_MAX_LATENCY = 0.1         # seconds a line may wait for its batch to fill up
+READ_BLOCK_SIZE = 1024 * 1024
+# number of (lines, arrival_time) blocks the readers can get ahead of the processing
+QUEUE_SIZE = 64
+
+
+class LatencyStats(object):
+    """
+        Collects the end-to-end latency of records, from the time their line was read to the time their output was
+        flushed, in a histogram with 20 logarithmic bins per decade from 1 microsecond to 1000 seconds. The memory
+        it needs stays the same however long the stream is, percentiles are accurate to about 12%.
+    """
+    BINS_PER_DECADE = 20
+    MIN_LATENCY = 1e-6
+
+    def __init__(self):
+        number_of_bins = 9 * self.BINS_PER_DECADE + 2
+        self._upper_bounds = [self.MIN_LATENCY * 10 ** (i / self.BINS_PER_DECADE) for i in range(number_of_bins - 1)]
+        self._counts = [0] * number_of_bins
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, latency, count=1):
+        """
+            Adds count records that had the same latency.
+        :param latency: latency in seconds
+        :param count: number of records
+        """
+        self._counts[bisect.bisect_left(self._upper_bounds, latency)] += count
+        self.count += count
+        self.total += latency * count
+        self.max = max(self.max, latency)
+
+    def percentile(self, p):
+        """
+            Returns the upper bound of the histogram bin holding the pth percentile (nearest-rank) of the latencies,
+            never more than the largest latency.
+        :param p: a value between 0 and 100
+        :return: latency in seconds, 0.0 if no record was added
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max(math.ceil(p / 100 * self.count), 1)
+        seen = 0
+        for i, bin_count in enumerate(self._counts):
+            seen += bin_count
+            if seen >= rank:
+                return min(self._upper_bounds[i], self.max) if i < len(self._upper_bounds) else self.max
+        return self.max
+
+    def summary(self):
+        """
+            Returns a one line summary of the latencies in milliseconds.
+        """
+        mean = self.total / self.count if self.count else 0.0
+        return ('records: {} latency ms: mean {:.3f} p50 {:.3f} p99 {:.3f} max {:.3f}'
+                .format(self.count, mean * 1000, self.percentile(50) * 1000, self.percentile(99) * 1000,
+                        self.max * 1000))
+
+
+def split_complete_lines(partial, data):
+    """
+        Splits the data read after partial into complete lines.
+    :param partial: the incomplete last line of the previous read
+    :param data: newly read bytes
+    :return: a tuple (list of complete lines ending with b'\\n', incomplete last line)
+    """
+    lines = (partial + data).split(b'\n')
+    partial = lines.pop()
+    return [line + b'\n' for line in lines], partial
+
+
+async def follow_file(path, queue, poll_interval=DEFAULT_POLL_INTERVAL, stop_at_end=None):
+    """
+        Reads a file as it grows, like `tail -f`, and puts its complete lines on queue as (lines, arrival_time).
+        If the file gets truncated it is read again from its beginning.
+    :param path: location of the file
+    :param queue: an asyncio.Queue
+    :param poll_interval: seconds to wait before checking again a file that has no new data
+    :param stop_at_end: an optional callable, when it returns True at the end of the file the function puts the
+                        incomplete last line (if any) on queue and returns
+    """
+    with open(path, 'rb') as handle:
+        partial = b''
+        while True:
+            data = handle.read(READ_BLOCK_SIZE)
+            if data:
+                (lines, partial) = split_complete_lines(partial, data)
+                if lines:
+                    await queue.put((lines, time.monotonic()))
+                continue
+            if stop_at_end is not None and stop_at_end():
+                if partial:
+                    await queue.put(([partial], time.monotonic()))
+                return
+            if os.stat(path).st_size < handle.tell():
+                handle.seek(0)
+                partial = b''
+            await asyncio.sleep(poll_interval)
+
+
+async def follow_directory(path, queue, poll_interval=DEFAULT_POLL_INTERVAL):
+    """
+        Reads the files arriving in a directory in the order of their names. A file is followed as it grows until a
+        file with a later name shows up, then the next file is read.
+    :param path: location of the directory
+    :param queue: an asyncio.Queue
+    :param poll_interval: seconds to wait before checking again for new data or new files
+    """
+    last_name = None
+
+    def next_names():
+        return sorted(name for name in os.listdir(path) if (last_name is None or name > last_name) and
+                      os.path.isfile(os.path.join(path, name)))
+
+    while True:
+        names = next_names()
+        if not names:
+            await asyncio.sleep(poll_interval)
+            continue
+        last_name = names[0]
+        await follow_file(os.path.join(path, last_name), queue, poll_interval, stop_at_end=lambda: bool(next_names()))
+
+
+async def read_unix_socket(path, queue):
+    """
+        Listens on a local Unix socket and puts the complete lines sent by any client on queue. Each connection is
+        read on its own, so lines of different clients are never mixed up.
+    :param path: location of the socket, a stale socket left there by an earlier run is replaced, any other existing
+                 file raises FileExistsError. The socket is removed when the function returns.
+    :param queue: an asyncio.Queue
+    """
+    async def handle_connection(reader, writer):
+        partial = b''
+        try:
+            while True:
+                data = await reader.read(READ_BLOCK_SIZE)
+                if not data:
+                    break
+                (lines, partial) = split_complete_lines(partial, data)
+                if lines:
+                    await queue.put((lines, time.monotonic()))
+            if partial:
+                await queue.put(([partial], time.monotonic()))
+        finally:
+            writer.close()
+
+    if is_socket(path):
+        os.remove(path)
+    elif os.path.lexists(path):
+        raise FileExistsError('{} exists and is not a socket.'.format(path))
+    server = await asyncio.start_unix_server(handle_connection, path=path)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if is_socket(path):
+            os.remove(path)
+
+
+def is_socket(path):
+    """
+        Returns True if path is a Unix socket, without following symbolic links.
+    """
+    try:
+        return stat.S_ISSOCK(os.lstat(path).st_mode)
+    except FileNotFoundError:
+        return False
+
+
+async def process_batches(queue, percentile, output_handle, donor_dict, repeat_donation_dict,
+                          max_batch=DEFAULT_MAX_BATCH, max_latency=DEFAULT_MAX_LATENCY, latency_stats=None,
+                          idle_timeout=None, bucket_factory=BlockedSortedList, lock=None):
+    """
+        Takes the lines put on queue by a reader, validates and processes them in batches and writes and flushes the
+        output of each batch. A batch is processed as soon as it has max_batch lines or its oldest line has waited
+        max_latency seconds, so bursts are processed in large batches while a slow stream still gets its output
+        within max_latency.
+    :param queue: an asyncio.Queue of (lines, arrival_time), None marks the end of the stream
+    :param percentile: the percentile value between 1 and 100, or a tuple of them
+    :param output_handle: handle of the output file opened in text mode
+    :param donor_dict: dictionary of donors or a CompactDonorIndex
+    :param repeat_donation_dict: dictionary of repeat donations
+    :param max_batch: largest number of lines in a batch
+    :param max_latency: longest time in seconds a line waits for its batch
+    :param latency_stats: an optional LatencyStats, the latency of every line is added to it
+    :param idle_timeout: if given, return after no line arrived for idle_timeout seconds
+    :param bucket_factory: the type of the buckets of repeat_donation_dict
+    :param lock: if given, a lock held while a batch updates the state, e.g. the one of a RepeatDonationAnalyzer
+                 answering queries in another thread
+    """
+    if lock is None:
+        lock = contextlib.nullcontext()
+    # output prefixes of the keys, kept between batches (see analyze_repeat_donations.process_records)
+    output_prefixes = {}
+    loop = asyncio.get_running_loop()
+    finished = False
+    while not finished:
+        batch = []
+        batch_lines = 0
+        deadline = None
+        while batch_lines < max_batch:
+            if deadline is None:
+                timeout = idle_timeout
+            else:
+                timeout = max(deadline - loop.time(), 0)
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                if deadline is None:   # idle for idle_timeout seconds
+                    finished = True
+                break
+            if item is None:
+                finished = True
+                break
+            if deadline is None:
+                deadline = loop.time() + max_latency
+            batch.append(item)
+            batch_lines += len(item[0])
+
+        if not batch:
+            continue
+
+        output_records = []
+        with lock:
+            for (lines, arrival_time) in batch:
+                analyzer.process_records(bytes_ingest.iter_valid_records_from_lines(lines), output_records.append,
+                                         donor_dict, repeat_donation_dict, percentile, bucket_factory,
+                                         output_prefixes)
+        output_handle.write(''.join(output_records))
+        output_handle.flush()
+
+        if latency_stats is not None:
+            now = time.monotonic()
+            for (lines, arrival_time) in batch:
+                latency_stats.add(now - arrival_time, len(lines))
+
+
+async def report_latency(latency_stats, interval, report_handle=sys.stderr):
+    """
+        Writes a latency summary line every interval seconds.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        report_handle.write(latency_stats.summary() + '\n')
+        report_handle.flush()
+
+
+async def follow_data_stream(source, path, percentile, output_handle, donor_dict, repeat_donation_dict,
+                             max_batch=DEFAULT_MAX_BATCH, max_latency=DEFAULT_MAX_LATENCY, latency_stats=None,
+                             report_interval=None, poll_interval=DEFAULT_POLL_INTERVAL, idle_timeout=None,
+                             bucket_factory=BlockedSortedList, lock=None):
+    """
+        Runs a reader for source and the batch processing until the stream ends, no line arrives for idle_timeout
+        seconds or the task gets cancelled.
+    :param source: 'file' to follow a growing file, 'directory' to read the files arriving in a directory or
+                   'socket' to receive lines on a local Unix socket
+    :param path: location of the file, directory or socket
+    :param report_interval: if given with latency_stats, print a latency summary every report_interval seconds
+    see process_batches for the other parameters
+    """
+    readers = {'file': lambda queue: follow_file(path, queue, poll_interval),
+               'directory': lambda queue: follow_directory(path, queue, poll_interval),
+               'socket': lambda queue: read_unix_socket(path, queue)}
+    if source not in readers:
+        raise ValueError('Source should be one of: {}.'.format(', '.join(sorted(readers))))
+
+    queue = asyncio.Queue(QUEUE_SIZE)
+    reader = asyncio.ensure_future(readers[source](queue))
+    processing = asyncio.ensure_future(process_batches(queue, percentile, output_handle, donor_dict,
+                                                       repeat_donation_dict, max_batch, max_latency, latency_stats,
+                                                       idle_timeout, bucket_factory, lock))
+    tasks = [reader, processing]
+    if report_interval is not None and latency_stats is not None:
+        tasks.append(asyncio.ensure_future(report_latency(latency_stats, report_interval)))
+    try:
+        await asyncio.wait([reader, processing], return_when=asyncio.FIRST_COMPLETED)
+        if not processing.done():
+            # the readers only return by failing, e.g. on a missing input file
+            reader.result()
+        processing.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def run_follow(source, input_path, percentile_file, output_file, max_batch=DEFAULT_MAX_BATCH,
+               max_latency=DEFAULT_MAX_LATENCY, report_latency_every=None, idle_timeout=None, compact_donors=False,
+               verify_donors=False, resume_from=None, checkpoint_to=None, percentiles=None, sketch_threshold=None,
+               sketch_k=quantile_sketch.DEFAULT_K, query_port=None):
+    """
+        The long-running counterpart of analyze_repeat_donations.process_data_stream. It keeps processing records as
+        they arrive until the stream is idle for idle_timeout seconds or the process gets interrupted (Ctrl+C), then
+        it prints the latency summary and saves a checkpoint if checkpoint_to is given. No checkpoint is saved when
+        the run stops on an error.
+    :param source: 'file', 'directory' or 'socket', see follow_data_stream
+    :param input_path: location of the file, directory or socket
+    :param percentile_file: a string containing the location of percentile file
+    :param output_file: a string containing the location of output_file, appended to when resuming
+    :param report_latency_every: if given, print a latency summary every report_latency_every seconds
+    :param percentiles: if given, the percentile or tuple of percentiles to use instead of reading percentile_file
+    :param sketch_threshold: if given, approximate the percentiles of keys with more donations with a quantile sketch
+    :param sketch_k: accuracy parameter of the sketches
+    :param query_port: if given, serve queries on the live state on this port of localhost (see query_server)
+    see process_batches and process_data_stream for the other parameters
+    """
+    (output_handle,) = analyzer.open_files([(output_file, 'w' if resume_from is None else 'a')])
+    percentile = percentiles if percentiles is not None else analyzer.read_percentile_file(percentile_file)
+    bucket_factory = analyzer.make_bucket_factory(sketch_threshold, sketch_k)
+    server = None
+    if query_port is None:
+        lock = None
+        (donor_dict, repeat_donation_dict) = analyzer.create_state(compact_donors, verify_donors, resume_from,
+                                                                   bucket_factory)
+    else:
+        # imported here as repeat_donation_analyzer imports analyze_repeat_donations, which imports this module
+        from repeat_donation_analyzer import RepeatDonationAnalyzer
+        analysis = RepeatDonationAnalyzer(percentile, compact_donors, verify_donors, resume_from, bucket_factory)
+        (donor_dict, repeat_donation_dict, lock) = (analysis.donor_dict, analysis.repeat_donation_dict, analysis.lock)
+        server = query_server.start_query_server(analysis, query_port)
+        sys.stderr.write('serving queries on http://{}:{}/\n'.format(*server.server_address))
+    latency_stats = LatencyStats()
+    # the checkpoint is only saved on a clean stop, after an error the state may hold records whose output was not
+    # written and a run resumed from it would lose them
+    stopped = False
+    try:
+        asyncio.run(follow_data_stream(source, input_path, percentile, output_handle, donor_dict,
+                                       repeat_donation_dict, max_batch, max_latency, latency_stats,
+                                       report_latency_every, idle_timeout=idle_timeout,
+                                       bucket_factory=bucket_factory, lock=lock))
+        stopped = True
+    except KeyboardInterrupt:
+        stopped = True
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        analyzer.close_files([output_handle])
+        if report_latency_every is not None:
+            sys.stderr.write(latency_stats.summary() + '\n')
+        if checkpoint_to is not None and stopped:
+            checkpoint.save_checkpoint(checkpoint_to, donor_dict, repeat_donation_dict)
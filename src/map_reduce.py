@@ -0,0 +1,261 @@
+import glob
+import itertools
+import locale
+import multiprocessing
+import os
+import pickle
+import tempfile
+import zlib
+
+import analyze_repeat_donations as analyzer
+import batch_validation
+import bytes_ingest
+import compressed_input
+import output_writer
+import parallel_ingest
+from donor_index import donor_key_bytes
+
+
+# number of donor partitions per worker process, more partitions than workers keeps the reducers busy when the
+# partitions are uneven and bounds the memory of each reducer
+DEFAULT_PARTITIONS_PER_WORKER = 4
+# number of lines a mapper validates and shuffles at a time
+MAP_BATCH_LINES = 65536
+
+
+def donor_partition(name, zip_code, partitions):
+    """
+        Returns the partition of a donor. crc32 is used instead of hash() so every process agrees on it.
+    :param name: a string containing name of donor
+    :param zip_code: a string containing the first five digits of zip code of donor
+    :param partitions: number of partitions
+    :return: an integer between 0 and partitions - 1
+    """
+    return zlib.crc32(donor_key_bytes((name, zip_code))) % partitions
+
+
+def list_input_files(input_path):
+    """
+        Returns the input files of a run: the files of input_path if it is a directory, otherwise the files matching
+        input_path as a glob pattern (a plain path matches itself), in the order of their names.
+    :param input_path: a string containing a file, a directory or a glob pattern
+    :return: a list of locations of files
+    """
+    if os.path.isdir(input_path):
+        paths = [os.path.join(input_path, name) for name in os.listdir(input_path)]
+    else:
+        paths = glob.glob(input_path)
+    paths = sorted(path for path in paths if os.path.isfile(path))
+    if not paths:
+        raise ValueError('No input file found at {}.'.format(input_path))
+    return paths
+
+
+def plan_map_tasks(input_files, chunk_size=None):
+    """
+        Splits the input files into map tasks. An uncompressed file is split into byte ranges ending at line
+        boundaries (see parallel_ingest.find_chunk_boundaries). A compressed file can not be read from the middle, so
+        it is a single task.
+    :param input_files: a list of locations of files
+    :param chunk_size: approximate size of each range in bytes, defaults to parallel_ingest.DEFAULT_CHUNK_SIZE
+    :return: a list of tuples (input_file, start, end, compression), start and end are None for a whole file
+    """
+    if chunk_size is None:
+        chunk_size = parallel_ingest.DEFAULT_CHUNK_SIZE
+    tasks = []
+    for input_file in input_files:
+        compression = compressed_input.detect_compression(input_file)
+        if compression is not None:
+            tasks.append((input_file, None, None, compression))
+            continue
+        with open(input_file, 'rb') as input_handle:
+            for (start, end) in parallel_ingest.find_chunk_boundaries(input_handle, chunk_size):
+                tasks.append((input_file, start, end, None))
+    return tasks
+
+
+def iter_task_line_batches(input_file, start, end, compression):
+    """
+        Yields the lines of a map task in lists of at most MAP_BATCH_LINES lines ready for
+        batch_validation.validate_cleanup_batch.
+    """
+    if compression is not None:
+        with compressed_input.open_decompressed(input_file, compression) as handle:
+            blocks = iter(lambda: handle.read(compressed_input.DEFAULT_BLOCK_SIZE), b'')
+            lines = bytes_ingest.iter_lines(compressed_input.iter_block_lines(blocks))
+            while True:
+                batch = list(itertools.islice(lines, MAP_BATCH_LINES))
+                if not batch:
+                    return
+                yield batch
+    with open(input_file, 'rb') as input_handle:
+        input_handle.seek(start)
+        data = input_handle.read(end - start)
+    lines = list(bytes_ingest.iter_lines(data.splitlines(True)))
+    for batch_start in range(0, len(lines), MAP_BATCH_LINES):
+        yield lines[batch_start:batch_start + MAP_BATCH_LINES]
+
+
+def shuffle_path(shuffle_dir, task_number, partition):
+    return os.path.join(shuffle_dir, 'map-{}-partition-{}.pickle'.format(task_number, partition))
+
+
+def map_task(task_number, task, partitions, shuffle_dir, encoding):
+    """
+        Validates the records of a map task and writes the valid ones to one shuffle file per donor partition. It runs
+        in a worker process. A shuffle file holds one pickled list of records per batch of lines.
+    :param task_number: number of the task, used to name its shuffle files
+    :param task: a tuple (input_file, start, end, compression), see plan_map_tasks
+    :param partitions: number of donor partitions
+    :param shuffle_dir: directory of the shuffle files
+    :param encoding: encoding of the input
+    :return: the number of valid records of the task
+    """
+    handles = [open(shuffle_path(shuffle_dir, task_number, partition), 'wb') for partition in range(partitions)]
+    valid_records = 0
+    try:
+        for lines in iter_task_line_batches(*task):
+            (mask, columns) = batch_validation.validate_cleanup_batch(lines, encoding)
+            shards = [[] for _ in range(partitions)]
+            for record in zip(*columns):
+                shards[donor_partition(record[1], record[2], partitions)].append(record)
+            for handle, shard in zip(handles, shards):
+                if shard:
+                    pickle.dump(shard, handle, pickle.HIGHEST_PROTOCOL)
+            valid_records += len(columns[0])
+    finally:
+        for handle in handles:
+            handle.close()
+    return valid_records
+
+
+def iter_shuffled_records(shuffle_dir, number_of_tasks, partition):
+    """
+        Yields the records the map tasks wrote for a partition.
+    """
+    for task_number in range(number_of_tasks):
+        with open(shuffle_path(shuffle_dir, task_number, partition), 'rb') as handle:
+            while True:
+                try:
+                    yield from pickle.load(handle)
+                except EOFError:
+                    break
+
+
+def reduce_partition(partition, shuffle_dir, number_of_tasks):
+    """
+        Aggregates the repeat donations of the donors of a partition. It runs in a worker process. Every record of a
+        donor is in the partition of the donor, so a first pass over the records finds the true earliest year of each
+        donor whatever the order of the input, and a second pass adds each donation made in a later year to the bucket
+        of its (cmte_id, zip_code, transaction_year) key.
+    :param partition: number of the partition
+    :param shuffle_dir: directory of the shuffle files
+    :param number_of_tasks: number of map tasks
+    :return: a dictionary with the key (cmte_id, zip_code, transaction_year) and the value [sorted list of donations,
+             total] for the keys with repeat donations of the partition, amounts are integer cents
+    """
+    records = list(iter_shuffled_records(shuffle_dir, number_of_tasks, partition))
+    earliest_years = {}
+    for (cmte_id, name, zip_code, transaction_year, transaction_amt) in records:
+        donor = (name, zip_code)
+        if earliest_years.get(donor, transaction_year) >= transaction_year:
+            earliest_years[donor] = transaction_year
+
+    buckets = {}
+    for (cmte_id, name, zip_code, transaction_year, transaction_amt) in records:
+        if earliest_years[(name, zip_code)] < transaction_year:
+            key = (cmte_id, zip_code, transaction_year)
+            if key not in buckets:
+                buckets[key] = [[], 0]
+            bucket = buckets[key]
+            bucket[0].append(transaction_amt)
+            bucket[1] += transaction_amt
+    for bucket in buckets.values():
+        bucket[0].sort()
+    return buckets
+
+
+def _reduce_partition_star(arguments):
+    return reduce_partition(*arguments)
+
+
+def merge_buckets(merged, buckets):
+    """
+        Adds the buckets of a partition to the buckets merged so far. The donations of a key found in several
+        partitions are left as consecutive sorted runs, they are sorted when the output is written.
+    :param merged: a dictionary of buckets, updated in place
+    :param buckets: a dictionary of buckets returned by reduce_partition
+    """
+    for key, (donations, total) in buckets.items():
+        if key in merged:
+            merged[key][0].extend(donations)
+            merged[key][1] += total
+        else:
+            merged[key] = [donations, total]
+
+
+def run_map_reduce(input_path, percentile_file, output_file, workers=None, partitions=None, percentiles=None,
+                   chunk_size=None, encoding=None,
+                   output_batch=output_writer.DEFAULT_BATCH_RECORDS):
+    """
+        Order independent counterpart of analyze_repeat_donations.process_data_stream over any number of input files.
+        A donation is from a repeat donor if the donor has donated in an earlier year anywhere in the input, not only
+        in the records before it. The output holds the final state of every key with repeat donations, in the order
+        of the keys, in the format of the output file, so the same input in any order or split in any files gives the
+        same output.
+
+        Map: the input files are split into tasks (see plan_map_tasks) validated by a pool of workers, which write
+        the valid records to shuffle files partitioned by a hash of the donor. Reduce: each partition is aggregated
+        by a worker (see reduce_partition). Merge: the main process merges the buckets of the partitions, which only
+        overlap on keys shared by donors of different partitions. The shuffle files are kept in a temporary
+        directory next to output_file, they take about the size of the valid records.
+    :param input_path: a file, a directory of files or a glob pattern, files may be compressed (see compressed_input)
+    :param percentile_file: a string containing the location of percentile file
+    :param output_file: a string containing the location of output_file
+    :param workers: number of worker processes, defaults to the number of CPUs, 1 runs everything in this process
+    :param partitions: number of donor partitions, defaults to DEFAULT_PARTITIONS_PER_WORKER per worker
+    :param percentiles: if given, the percentile or tuple of percentiles to use instead of reading percentile_file
+    :param chunk_size: approximate size in bytes of the map tasks of uncompressed files, defaults to
+                       parallel_ingest.DEFAULT_CHUNK_SIZE
+    :param encoding: encoding of the input, defaults to the one open() uses for text files
+    :param output_batch: number of output records written together
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError('Number of workers should be a positive integer.')
+    if partitions is None:
+        partitions = DEFAULT_PARTITIONS_PER_WORKER * workers
+    if partitions < 1:
+        raise ValueError('Number of partitions should be a positive integer.')
+    if encoding is None:
+        encoding = locale.getpreferredencoding(False)
+    percentile = percentiles if percentiles is not None else analyzer.read_percentile_file(percentile_file)
+
+    tasks = plan_map_tasks(list_input_files(input_path), chunk_size)
+    merged = {}
+    with tempfile.TemporaryDirectory(prefix='shuffle-', dir=os.path.dirname(os.path.abspath(output_file))) \
+            as shuffle_dir:
+        map_arguments = [(task_number, task, partitions, shuffle_dir, encoding)
+                         for task_number, task in enumerate(tasks)]
+        reduce_arguments = [(partition, shuffle_dir, len(tasks)) for partition in range(partitions)]
+        if workers == 1:
+            for arguments in map_arguments:
+                map_task(*arguments)
+            for arguments in reduce_arguments:
+                merge_buckets(merged, reduce_partition(*arguments))
+        else:
+            with multiprocessing.Pool(workers) as pool:
+                pool.starmap(map_task, map_arguments)
+                for buckets in pool.imap_unordered(_reduce_partition_star, reduce_arguments):
+                    merge_buckets(merged, buckets)
+
+    with open(output_file, 'w') as output_handle:
+        writer = output_writer.BatchedWriter(output_handle, output_batch)
+        for key in sorted(merged):
+            (donations, total) = merged[key]
+            # donations of a key found in several partitions are sorted runs, which sort() merges in linear time
+            donations.sort()
+            writer.write(analyzer.format_output(key, analyzer.compute_percentile(donations, percentile), total,
+                                                len(donations)))
+        writer.flush()
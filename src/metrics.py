@@ -0,0 +1,368 @@
+import collections
+import cProfile
+import functools
+import io
+import json
+import pstats
+import sys
+import time
+
+import analyze_repeat_donations as analyzer
+from order_statistics import BlockedSortedList
+
+
+# stages of the processing of a record, in the order they run
+STAGES = ('extract_required_fields', 'check_field_validity_cleanup', 'donor_lookup', 'add_to_repeat_donation_dict',
+          'compute_percentile', 'format_output', 'output_write')
+# one record in DEFAULT_SAMPLE_EVERY gets its stages timed
+DEFAULT_SAMPLE_EVERY = 1000
+
+
+class Instrumentation(object):
+    """
+        Opt-in metrics of a run: counters of read, valid, rejected (by reason) and repeat records, gauges of the size
+        of the state, and stage timers.
+
+        Timing every stage of every record would cost more than some of the stages themselves, so only one record in
+        sample_every is timed and the time of each stage over the whole run is estimated from the samples. The other
+        records go through the regular code path. The output writer is different: it only writes to the output file
+        when it flushes its batch, which is rare, so every flush is timed and added to the output_write stage.
+
+        A hook can be added to any stage. It gets called instead of the stage function for the sampled records, with
+        the function and its arguments, and has to return the result of the function, e.g. to profile the stage with
+        cProfile (see ProfileHook).
+    """
+
+    def __init__(self, sample_every=DEFAULT_SAMPLE_EVERY, progress_interval=None, progress_handle=sys.stderr):
+        """
+        :param sample_every: one record in sample_every gets its stages timed
+        :param progress_interval: if given, a progress line is written about every progress_interval seconds
+        :param progress_handle: where the progress lines are written
+        """
+        if sample_every < 1:
+            raise ValueError('Sampling interval should be a positive integer.')
+        self.sample_every = sample_every
+        self.progress_interval = progress_interval
+        self.progress_handle = progress_handle
+        self.records_read = 0
+        self.records_valid = 0
+        self.records_repeat = 0
+        self.rejected = collections.Counter()
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.stage_calls = dict.fromkeys(STAGES, 0)
+        self.flush_seconds = 0.0
+        self.flush_calls = 0
+        self.hooks = {}
+        self.start_time = time.perf_counter()
+        self._next_progress = None if progress_interval is None else self.start_time + progress_interval
+
+    def add_hook(self, stage, hook):
+        """
+            Wraps a stage of the sampled records with hook.
+        :param stage: one of STAGES
+        :param hook: a callable hook(function, *args) returning function(*args)
+        """
+        if stage not in STAGES:
+            raise ValueError('Stage should be one of: {}.'.format(', '.join(STAGES)))
+        self.hooks[stage] = hook
+
+    def run_stage(self, stage, function, *args):
+        """
+            Runs and times one stage of a sampled record.
+        :return: the result of function(*args)
+        """
+        hook = self.hooks.get(stage)
+        flush_seconds = self.flush_seconds
+        start_time = time.perf_counter()
+        result = function(*args) if hook is None else hook(function, *args)
+        # a flush run by the stage is already timed by run_flush
+        self.stage_seconds[stage] += time.perf_counter() - start_time - (self.flush_seconds - flush_seconds)
+        self.stage_calls[stage] += 1
+        return result
+
+    def run_flush(self, flush):
+        """
+            Runs and times a flush of the output writer, with the hook of the output_write stage if there is one.
+        :param flush: the flush method of a BatchedWriter
+        """
+        hook = self.hooks.get('output_write')
+        start_time = time.perf_counter()
+        result = flush() if hook is None else hook(flush)
+        self.flush_seconds += time.perf_counter() - start_time
+        self.flush_calls += 1
+        return result
+
+    def gauges(self, donor_dict, repeat_donation_dict):
+        """
+            Returns the current size of the state. Going through all the buckets takes a while for a large state, so
+            it is only done for the progress lines and the final report.
+        """
+        bucket_sizes = [len(donations) for (donations, total) in repeat_donation_dict.values()]
+        return collections.OrderedDict([('donors', len(donor_dict)), ('repeat_keys', len(repeat_donation_dict)),
+                                        ('repeat_donations', sum(bucket_sizes)),
+                                        ('largest_bucket', max(bucket_sizes, default=0))])
+
+    def maybe_write_progress(self, donor_dict, repeat_donation_dict):
+        """
+            Writes a progress line if progress_interval seconds passed since the last one. Called on sampled records
+            only, so the clock is read once every sample_every records.
+        """
+        if self._next_progress is None:
+            return
+        now = time.perf_counter()
+        if now < self._next_progress:
+            return
+        self._next_progress = now + self.progress_interval
+        elapsed = now - self.start_time
+        gauges = self.gauges(donor_dict, repeat_donation_dict)
+        self.progress_handle.write(
+            '[{:.1f} s] records {:,} valid {:,} rejected {:,} repeat {:,} | {:,.0f} records/sec | donors {:,} '
+            'repeat keys {:,} largest bucket {:,}\n'.format(
+                elapsed, self.records_read, self.records_valid, sum(self.rejected.values()), self.records_repeat,
+                self.records_read / elapsed if elapsed else 0.0, gauges['donors'], gauges['repeat_keys'],
+                gauges['largest_bucket']))
+        self.progress_handle.flush()
+
+    def report(self, donor_dict, repeat_donation_dict):
+        """
+            Returns all the metrics of the run as a dictionary that can be saved as JSON.
+        """
+        wall_seconds = time.perf_counter() - self.start_time
+        stages = collections.OrderedDict()
+        for stage in STAGES:
+            calls = self.stage_calls[stage]
+            mean_seconds = self.stage_seconds[stage] / calls if calls else 0.0
+            stages[stage] = collections.OrderedDict([
+                ('sampled_calls', calls), ('sampled_seconds', self.stage_seconds[stage]),
+                ('mean_microseconds', mean_seconds * 1e6),
+                ('estimated_seconds', mean_seconds * calls * self.sample_every)])
+        # the flushes are not sampled, all of them are timed
+        stages['output_write']['flush_calls'] = self.flush_calls
+        stages['output_write']['flush_seconds'] = self.flush_seconds
+        stages['output_write']['estimated_seconds'] += self.flush_seconds
+        return collections.OrderedDict([
+            ('wall_seconds', wall_seconds),
+            ('records_per_sec', self.records_read / wall_seconds if wall_seconds else 0.0),
+            ('records', collections.OrderedDict([('read', self.records_read), ('valid', self.records_valid),
+                                                 ('rejected', sum(self.rejected.values())),
+                                                 ('repeat', self.records_repeat)])),
+            ('rejected_by_reason', collections.OrderedDict(self.rejected.most_common())),
+            ('gauges', self.gauges(donor_dict, repeat_donation_dict)),
+            ('sample_every', self.sample_every),
+            ('stages', stages)])
+
+    def save_report(self, stats_file, donor_dict, repeat_donation_dict):
+        """
+            Saves the report as JSON to stats_file.
+        """
+        with open(stats_file, 'w') as handle:
+            json.dump(self.report(donor_dict, repeat_donation_dict), handle, indent=2)
+            handle.write('\n')
+
+
+class ProfileHook(object):
+    """
+        A stage hook collecting a cProfile profile of the calls of the stage.
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def __call__(self, function, *args):
+        self.profile.enable()
+        try:
+            return function(*args)
+        finally:
+            self.profile.disable()
+
+    def summary(self, number_of_lines=25):
+        """
+            Returns the functions taking the most cumulative time as a string.
+        """
+        output = io.StringIO()
+        pstats.Stats(self.profile, stream=output).sort_stats('cumulative').print_stats(number_of_lines)
+        return output.getvalue()
+
+
+def add_to_cached_state(cmte_id, zip_code, transaction_year, transaction_amt, repeat_donation_dict, bucket_factory,
+                        output_prefixes):
+    """
+        The add_to_repeat_donation_dict step of analyze_repeat_donations.process_records: looks the key up in the cache
+        output_prefixes, adding it if it is not there, and adds the donation to its state.
+    :return: the (state, output prefix) entry of the key in output_prefixes
+    """
+    key = (cmte_id, zip_code, transaction_year)
+    entry = output_prefixes.get(key)
+    if entry is None:
+        entry = output_prefixes[key] = (analyzer.get_repeat_donation_state(key, repeat_donation_dict, bucket_factory),
+                                        analyzer.create_output_prefix(cmte_id, zip_code, transaction_year))
+    analyzer.add_donation(entry[0], transaction_amt)
+    return entry
+
+
+def format_cached_output(prefix, nth_percentile, state):
+    """
+        The format_output step of analyze_repeat_donations.process_records: the cached prefix of the key followed by
+        its numbers.
+    """
+    return prefix + analyzer.create_output_numbers(analyzer.round_percentile_to_dollars(nth_percentile),
+                                                   analyzer.round_cents_to_dollars(state[1]), len(state[0]))
+
+
+def iter_unsampled_records(lines, instrumentation, process_sample):
+    """
+        Yields the cleaned up fields of the valid records of lines, except for one line in
+        instrumentation.sample_every which is given to process_sample instead. Records read, valid and rejected are
+        counted in instrumentation.
+    :param process_sample: a callable processing a sampled line and returning True if its record is valid
+    """
+    sample_every = instrumentation.sample_every
+    rejected = instrumentation.rejected
+    records_read = records_valid = 0
+    countdown = sample_every
+    for line in lines:
+        records_read += 1
+        countdown -= 1
+        if countdown:
+            (validity, fields) = analyzer.check_field_validity_cleanup(*analyzer.extract_required_fields(line))
+            if validity:
+                records_valid += 1
+                yield fields
+            else:
+                rejected[fields] += 1
+        else:
+            countdown = sample_every
+            instrumentation.records_read = records_read
+            instrumentation.records_valid = records_valid
+            if process_sample(line):
+                records_valid += 1
+    instrumentation.records_read = records_read
+    instrumentation.records_valid = records_valid
+
+
+def process_records_instrumented(lines, writer, donor_dict, repeat_donation_dict, percentile, instrumentation,
+                                 bucket_factory):
+    """
+        The default mode of process_lines_instrumented. The valid records that are not sampled go through
+        analyze_repeat_donations.process_records like in a regular run, and a sampled record goes through the steps of
+        process_records one stage at a time, with the same cache of keys. Every repeat donation writes an output
+        record, so they are counted as the records given to writer.
+    """
+    run_stage = instrumentation.run_stage
+    output_prefixes = {}
+    records_before = len(writer)
+
+    def process_sample(line):
+        instrumentation.records_repeat = len(writer) - records_before
+        instrumentation.maybe_write_progress(donor_dict, repeat_donation_dict)
+        required_fields = run_stage('extract_required_fields', analyzer.extract_required_fields, line)
+        (validity, fields) = run_stage('check_field_validity_cleanup', analyzer.check_field_validity_cleanup,
+                                       *required_fields)
+        if not validity:
+            instrumentation.rejected[fields] += 1
+            return False
+        (cmte_id, name, zip_code, transaction_year, transaction_amt) = fields
+        if run_stage('donor_lookup', analyzer.update_donor, name, zip_code, transaction_year, donor_dict):
+            (state, prefix) = run_stage('add_to_repeat_donation_dict', add_to_cached_state, cmte_id, zip_code,
+                                        transaction_year, transaction_amt, repeat_donation_dict, bucket_factory,
+                                        output_prefixes)
+            nth_percentile = run_stage('compute_percentile', analyzer.compute_percentile, state[0], percentile)
+            output_record = run_stage('format_output', format_cached_output, prefix, nth_percentile, state)
+            run_stage('output_write', writer.write, output_record)
+        return True
+
+    analyzer.process_records(iter_unsampled_records(lines, instrumentation, process_sample), writer.write, donor_dict,
+                             repeat_donation_dict, percentile, bucket_factory, output_prefixes)
+    instrumentation.records_repeat = len(writer) - records_before
+
+
+def summarize_lines_instrumented(lines, writer, donor_dict, repeat_donation_dict, percentile, instrumentation,
+                                 summary_every, bucket_factory):
+    """
+        The summary mode of process_lines_instrumented, the counterpart of the update_state loop of
+        analyze_repeat_donations.process_data_stream.
+    """
+    sample_every = instrumentation.sample_every
+    rejected = instrumentation.rejected
+    run_stage = instrumentation.run_stage
+    updated_keys = {}
+    records_read = records_valid = records_repeat = 0
+    countdown = sample_every
+
+    for line in lines:
+        records_read += 1
+        countdown -= 1
+        if countdown:
+            (validity, fields) = analyzer.check_field_validity_cleanup(*analyzer.extract_required_fields(line))
+            if not validity:
+                rejected[fields] += 1
+                continue
+            records_valid += 1
+            (cmte_id, name, zip_code, transaction_year, transaction_amt) = fields
+            key = analyzer.update_state(cmte_id, name, zip_code, transaction_year, transaction_amt, donor_dict,
+                                        repeat_donation_dict, bucket_factory)
+            if key is not None:
+                records_repeat += 1
+                updated_keys[key] = None
+        else:
+            # a sampled record, the same steps one stage at a time
+            countdown = sample_every
+            instrumentation.records_read = records_read
+            instrumentation.records_valid = records_valid
+            instrumentation.records_repeat = records_repeat
+            instrumentation.maybe_write_progress(donor_dict, repeat_donation_dict)
+
+            required_fields = run_stage('extract_required_fields', analyzer.extract_required_fields, line)
+            (validity, fields) = run_stage('check_field_validity_cleanup', analyzer.check_field_validity_cleanup,
+                                           *required_fields)
+            if not validity:
+                rejected[fields] += 1
+                continue
+            records_valid += 1
+            (cmte_id, name, zip_code, transaction_year, transaction_amt) = fields
+            if run_stage('donor_lookup', analyzer.update_donor, name, zip_code, transaction_year, donor_dict):
+                records_repeat += 1
+                run_stage('add_to_repeat_donation_dict', analyzer.add_to_repeat_donation_dict, cmte_id, zip_code,
+                          transaction_year, transaction_amt, repeat_donation_dict, bucket_factory)
+                updated_keys[(cmte_id, zip_code, transaction_year)] = None
+
+        # only valid records get here, as in the regular loop summaries are written every summary_every of them
+        if summary_every is not None and records_valid % summary_every == 0:
+            analyzer.write_summary(writer, updated_keys, repeat_donation_dict, percentile)
+            updated_keys.clear()
+
+    instrumentation.records_read = records_read
+    instrumentation.records_valid = records_valid
+    instrumentation.records_repeat = records_repeat
+    analyzer.write_summary(writer, updated_keys if summary_every is not None else repeat_donation_dict,
+                           repeat_donation_dict, percentile)
+
+
+def process_lines_instrumented(lines, writer, donor_dict, repeat_donation_dict, percentile, instrumentation,
+                               summary=False, summary_every=None, bucket_factory=BlockedSortedList):
+    """
+        The instrumented counterpart of the processing loop of analyze_repeat_donations.process_data_stream for lines
+        read in text mode. Every record is counted, rejected records are counted by reason and one record in
+        instrumentation.sample_every goes through its stages one by one with instrumentation.run_stage. The other
+        records go through the loop of a regular run: process_records, or update_state with summary. The stages are
+        the steps of that loop, and the output is the same. The flushes of writer are timed as part of the
+        output_write stage, writer is flushed at the end.
+    :param lines: an iterable of text lines
+    :param writer: a BatchedWriter
+    :param instrumentation: an Instrumentation
+    :param bucket_factory: the type of the buckets of repeat_donation_dict
+    see process_data_stream for the other parameters
+    """
+    flush = writer.flush
+    # the records are written to the output file by the flushes, including the ones run by writer.write
+    writer.flush = functools.partial(instrumentation.run_flush, flush)
+    try:
+        if summary:
+            summarize_lines_instrumented(lines, writer, donor_dict, repeat_donation_dict, percentile, instrumentation,
+                                         summary_every, bucket_factory)
+        else:
+            process_records_instrumented(lines, writer, donor_dict, repeat_donation_dict, percentile, instrumentation,
+                                         bucket_factory)
+        writer.flush()
+    finally:
+        writer.flush = flush
@@ -0,0 +1,152 @@
+import bisect
+
+
+# number of values a block holds before it gets split in two
+DEFAULT_LOAD = 512
+
+
+class InsortList(list):
+    """
+        A plain python list kept in ascending order with bisect.insort. Every insert shifts all the elements after the
+        insertion point, so adding to a bucket of n donations costs O(n). It is kept as the simplest bucket type and as
+        the baseline for benchmarks.
+    """
+
+    def add(self, value):
+        """
+            Inserts value into the list keeping the ascending order.
+        :param value: a number to be added
+        """
+        bisect.insort(self, value)
+
+
+class BlockedSortedList(object):
+    """
+        An ascending ordered container of numbers with O(log n) insert and O(log n) lookup by rank.
+
+        Values are kept in a list of sorted blocks, each holding at most 2 * load values, so an insert only shifts
+        elements inside one small block. The block a value goes to is found by bisecting the list of block maximums.
+        The length of the blocks is kept in a Fenwick tree (binary indexed tree) which makes finding the block and
+        offset of the value with a given rank a O(log n) walk instead of a scan over all blocks. The tree is rebuilt
+        only when a block gets split which happens once every load inserts at most.
+
+        It supports len(), indexing (including negative indexes), iteration and comparison with any sequence, so it
+        can be used anywhere a sorted list of donations was used before.
+    """
+
+    def __init__(self, iterable=(), load=DEFAULT_LOAD):
+        """
+        :param iterable: optional initial values, they do not need to be sorted
+        :param load: half of the maximum number of values kept in one block
+        """
+        if load < 1:
+            raise ValueError('Block load should be a positive integer.')
+        self._load = load
+        self._blocks = []   # list of sorted lists
+        self._maxes = []    # largest value of each block
+        self._tree = [0]    # 1-indexed Fenwick tree over the length of the blocks
+        self._len = 0
+
+        values = sorted(iterable)
+        if values:
+            self._blocks = [values[i:i + load] for i in range(0, len(values), load)]
+            self._maxes = [block[-1] for block in self._blocks]
+            self._len = len(values)
+            self._rebuild_tree()
+
+    def _rebuild_tree(self):
+        """
+            Builds the Fenwick tree over the length of the blocks in O(number of blocks).
+        """
+        tree = [0] + [len(block) for block in self._blocks]
+        size = len(tree)
+        for i in range(1, size):
+            parent = i + (i & -i)
+            if parent < size:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _locate(self, index):
+        """
+            Finds the block holding the value with the given rank.
+        :param index: a zero-based rank between 0 and len(self) - 1
+        :return: a tuple (block_index, offset_in_block)
+        """
+        tree = self._tree
+        size = len(tree) - 1
+        position = 0
+        step = 1 << (size.bit_length() - 1)
+        while step:
+            next_position = position + step
+            if next_position <= size and tree[next_position] <= index:
+                position = next_position
+                index -= tree[next_position]
+            step >>= 1
+        return position, index
+
+    def add(self, value):
+        """
+            Inserts value keeping the ascending order.
+        :param value: a number to be added
+        """
+        blocks = self._blocks
+        if not blocks:
+            self._blocks = [[value]]
+            self._maxes = [value]
+            self._tree = [0, 1]
+            self._len = 1
+            return
+
+        i = bisect.bisect_right(self._maxes, value)
+        if i == len(blocks):
+            # larger than or equal to everything seen till now, goes to the end of the last block
+            i -= 1
+            blocks[i].append(value)
+            self._maxes[i] = value
+        else:
+            bisect.insort(blocks[i], value)
+        self._len += 1
+
+        block = blocks[i]
+        if len(block) > 2 * self._load:
+            blocks.insert(i + 1, block[self._load:])
+            del block[self._load:]
+            self._maxes.insert(i, block[-1])
+            self._rebuild_tree()
+        else:
+            tree = self._tree
+            size = len(tree)
+            position = i + 1
+            while position < size:
+                tree[position] += 1
+                position += position & -position
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self._len
+        if index < 0 or index >= self._len:
+            raise IndexError('BlockedSortedList index out of range')
+        block_index, offset = self._locate(index)
+        return self._blocks[block_index][offset]
+
+    def __iter__(self):
+        for block in self._blocks:
+            yield from block
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, list(self))
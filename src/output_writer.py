@@ -0,0 +1,45 @@
+# number of output records joined and written together
+DEFAULT_BATCH_RECORDS = 8192
+
+
+class BatchedWriter(object):
+    """
+        Collects output records and writes them to the output file in chunks of batch_records records joined into one
+        string, instead of calling write once per record. Nothing is lost as long as flush() is called at the end.
+    """
+
+    def __init__(self, output_handle, batch_records=DEFAULT_BATCH_RECORDS):
+        """
+        :param output_handle: handle of the output file opened in text mode
+        :param batch_records: number of records written together, 1 writes every record right away
+        """
+        if batch_records < 1:
+            raise ValueError('Number of records in a batch should be a positive integer.')
+        self.output_handle = output_handle
+        self.batch_records = batch_records
+        self._records = []
+        self._written = 0
+
+    def write(self, record):
+        """
+            Adds a record, the records are written when batch_records of them are collected.
+        :param record: a string ending with a new line
+        """
+        self._records.append(record)
+        if len(self._records) >= self.batch_records:
+            self.flush()
+
+    def __len__(self):
+        """
+            Returns the number of records given to the writer, written or not.
+        """
+        return self._written + len(self._records)
+
+    def flush(self):
+        """
+            Writes the records collected till now.
+        """
+        if self._records:
+            self.output_handle.write(''.join(self._records))
+            self._written += len(self._records)
+            self._records.clear()
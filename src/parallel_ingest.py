@@ -0,0 +1,86 @@
+import collections
+import locale
+import multiprocessing
+import os
+
+import batch_validation
+import bytes_ingest
+
+
+# size of the byte ranges of the input file each worker parses and validates at a time
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def find_chunk_boundaries(input_handle, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+        Splits the input file into byte ranges of about chunk_size bytes. Each range ends right after a b'\\n' (or at
+        the end of the file) so no line is split between two ranges.
+    :param input_handle: handle of the input file opened in binary mode
+    :param chunk_size: approximate size of each range in bytes
+    :return: a list of (start, end) tuples covering the whole file in order
+    """
+    if chunk_size < 1:
+        raise ValueError('Chunk size should be a positive integer.')
+    file_size = os.fstat(input_handle.fileno()).st_size
+    boundaries = []
+    start = 0
+    while start < file_size:
+        if start + chunk_size >= file_size:
+            end = file_size
+        else:
+            input_handle.seek(start + chunk_size)
+            input_handle.readline()   # move to the beginning of the next line
+            end = input_handle.tell()
+        boundaries.append((start, end))
+        start = end
+    return boundaries
+
+
+def validate_chunk(input_file, start, end, encoding):
+    """
+        Reads the byte range [start, end) of input_file and validates its records. It runs in a worker process.
+    :param input_file: a string containing the location of input file
+    :param start: offset of the first byte of the range, at the beginning of a line
+    :param end: offset after the last byte of the range, at the end of a line
+    :param encoding: encoding of the input
+    :return: the cleaned fields of the valid records of the range as columns, see
+             batch_validation.validate_cleanup_batch
+    """
+    with open(input_file, 'rb') as input_handle:
+        input_handle.seek(start)
+        data = input_handle.read(end - start)
+    lines = list(bytes_ingest.iter_lines(data.splitlines(True)))
+    (mask, columns) = batch_validation.validate_cleanup_batch(lines, encoding)
+    return columns
+
+
+def iter_valid_records_parallel(input_file, input_handle, workers, chunk_size=DEFAULT_CHUNK_SIZE, encoding=None):
+    """
+        Parses and validates the input file in a pool of worker processes and yields the valid records in the order of
+        the input file. At most 2 * workers chunks are in flight at any time, so memory stays bounded even when the
+        consumer of the records is slower than the workers.
+    :param input_file: a string containing the location of input file
+    :param input_handle: handle of the input file opened in binary mode, used to find the chunk boundaries
+    :param workers: number of worker processes
+    :param chunk_size: approximate size in bytes of the range of the file parsed by a worker at a time
+    :param encoding: encoding of the input, defaults to the one open() uses for text files
+    :return: a generator of tuples (cmte_id, name, zip_code, transaction_year, transaction_amt)
+    """
+    if workers < 1:
+        raise ValueError('Number of workers should be a positive integer.')
+    if encoding is None:
+        encoding = locale.getpreferredencoding(False)
+
+    chunks = iter(find_chunk_boundaries(input_handle, chunk_size))
+    with multiprocessing.Pool(workers) as pool:
+        pending = collections.deque()
+        for (start, end) in chunks:
+            pending.append(pool.apply_async(validate_chunk, (input_file, start, end, encoding)))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            columns = pending.popleft().get()
+            for (start, end) in chunks:
+                pending.append(pool.apply_async(validate_chunk, (input_file, start, end, encoding)))
+                break
+            yield from zip(*columns)
@@ -0,0 +1,273 @@
+import bisect
+import itertools
+import math
+
+from order_statistics import BlockedSortedList
+
+
+# capacity of the top compactor of a KLLSketch, it sets the accuracy (see KLLSketch)
+DEFAULT_K = 200
+# number of donations a bucket keeps exactly before it switches to a sketch
+DEFAULT_THRESHOLD = 1024
+# each compactor below the top one holds CAPACITY_DECAY times the capacity of the one above it
+CAPACITY_DECAY = 2 / 3
+MIN_CAPACITY = 2
+
+
+class KLLSketch(object):
+    """
+        A mergeable quantile sketch (Karnin, Lang and Liberty, "Optimal Quantile Approximation in Streams", 2016).
+
+        Values go to a stack of compactors. The compactor at level h holds values standing for 2^h values each. When
+        the sketch is full the lowest full compactor is sorted and either its even or its odd positions (chosen at
+        random) are promoted to the next level, halving the number of values it stands for while keeping the total
+        weight equal to the number of values added. The top compactor holds up to k values and each level below holds
+        2/3 of the level above it, so the sketch keeps about 3k values plus a couple per level, however long the
+        stream is.
+
+        Queries read one sorted view of the values of all the levels with their cumulative weights. It is sorted by
+        the first query, then add and compactions update it in place, so a rank or the value at a rank is one bisect.
+
+        Error bound: the value returned for a rank r has an exact rank within eps * n of r, where n is the number of
+        values added. eps is O(1/k) with high probability. For k = 200 it is about 1.65% at 99% confidence. That is the
+        bound published for the DataSketches KLL sketch with the same k, and it matches what the unit tests measure
+        (under 1% on 100k values). The randomness comes from a xorshift generator seeded by seed, so a run is
+        reproducible.
+    """
+
+    def __init__(self, iterable=(), k=DEFAULT_K, seed=0):
+        """
+        :param iterable: optional initial values
+        :param k: capacity of the top compactor, the accuracy grows and the memory grows linearly with it
+        :param seed: seed of the random choices of the compactions
+        """
+        if k < MIN_CAPACITY:
+            raise ValueError('Sketch capacity should be at least {}.'.format(MIN_CAPACITY))
+        self.k = k
+        self._levels = [[]]   # values of level h stand for 2^h values
+        self._len = 0
+        self._size = 0
+        self._max_size = self._capacity(0)
+        self._random_state = (seed * 0x9E3779B97F4A7C15 + 0x2545F4914F6CDD1D) & 0xFFFFFFFFFFFFFFFF or 1
+        # sorted values of all the levels, their weights and cumulative weights, built by the first query and kept
+        # up to date after it, only the first _valid_weights cumulative weights are up to date
+        self._view = None
+        self._valid_weights = 0
+        for value in iterable:
+            self.add(value)
+
+    def _capacity(self, level):
+        depth = len(self._levels) - level - 1
+        return max(int(math.ceil(self.k * CAPACITY_DECAY ** depth)), MIN_CAPACITY)
+
+    def _coin(self):
+        """
+            Returns 0 or 1 from a xorshift64 generator.
+        """
+        state = self._random_state
+        state ^= (state << 13) & 0xFFFFFFFFFFFFFFFF
+        state ^= state >> 7
+        state ^= (state << 17) & 0xFFFFFFFFFFFFFFFF
+        self._random_state = state
+        return state & 1
+
+    def add(self, value):
+        """
+            Adds a value to the sketch.
+        :param value: a number
+        """
+        self._levels[0].append(value)
+        if self._view is not None:
+            (values, weights, cumulative_weights) = self._view
+            index = bisect.bisect_right(values, value)
+            values.insert(index, value)
+            weights.insert(index, 1)
+            cumulative_weights.insert(index, 0)
+            self._valid_weights = min(self._valid_weights, index)
+        self._len += 1
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def _compress(self):
+        """
+            Compacts the lowest compactors that are full until the sketch fits its capacity again.
+        """
+        level = -1
+        while level + 1 < len(self._levels):
+            level += 1
+            items = self._levels[level]
+            if len(items) < self._capacity(level):
+                continue
+            if level + 1 == len(self._levels):
+                self._levels.append([])
+            items.sort()
+            # an odd value out stays at this level so the total weight is unchanged
+            kept = [items.pop()] if len(items) % 2 else []
+            coin = self._coin()
+            promoted = items[coin::2]
+            self._levels[level + 1].extend(promoted)
+            if self._view is not None:
+                self._compact_view(items[1 - coin::2], promoted, 1 << level)
+            items[:] = kept
+            self._size = sum(len(level_items) for level_items in self._levels)
+            self._max_size = sum(self._capacity(h) for h in range(len(self._levels)))
+            if self._size < self._max_size:
+                break
+
+    def merge(self, other):
+        """
+            Adds all the values summarized by other to this sketch. The error bound of the result is the one of a
+            sketch that got the values of both.
+        :param other: a KLLSketch
+        """
+        while len(self._levels) < len(other._levels):
+            self._levels.append([])
+        for level, items in enumerate(other._levels):
+            self._levels[level].extend(items)
+        self._len += other._len
+        self._size = sum(len(items) for items in self._levels)
+        self._max_size = sum(self._capacity(h) for h in range(len(self._levels)))
+        self._view = None
+        while self._size >= self._max_size:
+            self._compress()
+
+    def __len__(self):
+        return self._len
+
+    def _view_index(self, value, weight):
+        """
+            Returns the position in the view of a stored value with the given weight.
+        """
+        values = self._view[0]
+        weights = self._view[1]
+        index = bisect.bisect_left(values, value)
+        while weights[index] != weight:   # equal values of other levels
+            index += 1
+        return index
+
+    def _compact_view(self, dropped, promoted, weight):
+        """
+            Applies a compaction to the view instead of sorting it again: the dropped values of the compacted level
+            leave it and the promoted ones get twice their weight.
+        """
+        (values, weights, cumulative_weights) = self._view
+        first_change = len(values)
+        for value in dropped:
+            index = self._view_index(value, weight)
+            del values[index]
+            del weights[index]
+            del cumulative_weights[index]
+            first_change = min(first_change, index)
+        for value in promoted:
+            index = self._view_index(value, weight)
+            weights[index] = 2 * weight
+            first_change = min(first_change, index)
+        self._valid_weights = min(self._valid_weights, first_change)
+
+    def _sorted_view(self, index=None):
+        """
+            Returns (sorted values, cumulative weights) of all the stored values. The view is sorted once, then add
+            inserts its value in it and a compaction updates the entries of its level, a merge sorts it again. The
+            cumulative weights are summed again from the first change, and only if needed to find the value at rank
+            index when it is given.
+        """
+        if self._view is None:
+            pairs = sorted((value, 1 << level) for level, items in enumerate(self._levels) for value in items)
+            weights = [weight for value, weight in pairs]
+            self._view = ([value for value, weight in pairs], weights, list(itertools.accumulate(weights)))
+            self._valid_weights = len(weights)
+        (values, weights, cumulative_weights) = self._view
+        valid = self._valid_weights
+        if valid < len(weights) and (index is None or valid == 0 or cumulative_weights[valid - 1] <= index):
+            tail = weights[valid:]
+            if valid:
+                tail[0] += cumulative_weights[valid - 1]
+            cumulative_weights[valid:] = itertools.accumulate(tail)
+            self._valid_weights = len(weights)
+        return values, cumulative_weights
+
+    def rank(self, value):
+        """
+            Returns the approximate number of values added that are smaller than or equal to value.
+        """
+        (values, cumulative_weights) = self._sorted_view()
+        index = bisect.bisect_right(values, value)
+        return cumulative_weights[index - 1] if index else 0
+
+    def __getitem__(self, index):
+        """
+            Returns the approximate value at a zero-based rank, like indexing a sorted list of all the values added:
+            the smallest stored value whose rank is more than index, found with one bisect over the cumulative
+            weights.
+        """
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('sketch index out of range')
+        (values, cumulative_weights) = self._sorted_view(index)
+        return values[bisect.bisect_right(cumulative_weights, index, 0, self._valid_weights)]
+
+    def stored_values(self):
+        """
+            Returns the number of values held by the sketch, a measure of its memory.
+        """
+        return self._size
+
+
+class ApproximateBucket(object):
+    """
+        A bucket of donations that stays an exact BlockedSortedList while it holds at most threshold donations and
+        switches to a KLLSketch after that, so percentiles of small buckets are exact and the memory of a large bucket
+        stays bounded (see KLLSketch for the error bound).
+        It has the add(), len() and indexing by rank the percentile computation needs.
+    """
+
+    def __init__(self, iterable=(), threshold=DEFAULT_THRESHOLD, k=DEFAULT_K):
+        """
+        :param iterable: optional initial donations
+        :param threshold: largest number of donations kept exactly
+        :param k: capacity of the sketch (see KLLSketch)
+        """
+        if threshold < 1:
+            raise ValueError('Sketch threshold should be a positive integer.')
+        self.threshold = threshold
+        self.k = k
+        self._exact = BlockedSortedList(iterable)
+        self._sketch = None
+        if len(self._exact) > threshold:
+            self._switch_to_sketch()
+
+    def _switch_to_sketch(self):
+        self._sketch = KLLSketch(self._exact, self.k)
+        self._exact = None
+
+    @property
+    def is_exact(self):
+        """
+            True while the bucket keeps all its donations.
+        """
+        return self._sketch is None
+
+    def add(self, value):
+        """
+            Adds a donation to the bucket.
+        :param value: a number to be added
+        """
+        if self._sketch is not None:
+            self._sketch.add(value)
+            return
+        self._exact.add(value)
+        if len(self._exact) > self.threshold:
+            self._switch_to_sketch()
+
+    def __len__(self):
+        return len(self._exact) if self._sketch is None else len(self._sketch)
+
+    def __getitem__(self, index):
+        return self._exact[index] if self._sketch is None else self._sketch[index]
+
+    def __iter__(self):
+        if self._sketch is not None:
+            raise TypeError('The donations of a bucket summarized by a sketch can not be listed.')
+        return iter(self._exact)
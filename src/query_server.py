@@ -0,0 +1,84 @@
+import http.server
+import json
+import threading
+import urllib.parse
+
+import analyze_repeat_donations as analyzer
+
+
+DEFAULT_HOST = '127.0.0.1'
+
+
+class QueryHandler(http.server.BaseHTTPRequestHandler):
+    """
+        Answers GET requests on the state of the RepeatDonationAnalyzer of its server with JSON:
+            /state/CMTE_ID/ZIP_CODE/YEAR   percentile, total and count of a key
+            /committee/CMTE_ID             states of all the keys of a recipient
+            /zip_code/ZIP_CODE             states of all the keys of a zip code
+            /year/YEAR                     states of all the keys of a year
+            /stats                         size of the state
+        The state requests take an optional ?percentile=P[,P...] that overrides the percentile of the analyzer.
+        Amounts are whole dollars like in the output file. An unknown key or path gets a 404, a bad request a 400.
+    """
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        parts = [urllib.parse.unquote(part) for part in url.path.strip('/').split('/')]
+        query = urllib.parse.parse_qs(url.query)
+        analysis = self.server.analysis
+        try:
+            percentile = None
+            if 'percentile' in query:
+                percentile = analyzer.parse_percentiles(query['percentile'][-1])
+            if parts[0] == 'state' and len(parts) == 4:
+                body = analysis.get_state((parts[1], parts[2], int(parts[3])), percentile)
+            elif parts[0] in ('committee', 'zip_code', 'year') and len(parts) == 2:
+                if parts[0] == 'committee':
+                    keys = analysis.keys_for_committee(parts[1])
+                elif parts[0] == 'zip_code':
+                    keys = analysis.keys_for_zip_code(parts[1])
+                else:
+                    keys = analysis.keys_for_year(int(parts[1]))
+                body = dict(states=[analysis.get_state(key, percentile) for key in keys])
+            elif parts == ['stats']:
+                body = analysis.stats()
+            else:
+                self.send_json(404, dict(error='unknown path {}'.format(url.path)))
+                return
+        except KeyError:
+            self.send_json(404, dict(error='no repeat donations for {}'.format(url.path)))
+            return
+        except ValueError as error:
+            self.send_json(400, dict(error=str(error)))
+            return
+        self.send_json(200, body)
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # keep stderr for the latency reports of the analyzer
+        pass
+
+
+def start_query_server(analysis, port=0, host=DEFAULT_HOST):
+    """
+        Starts an HTTP server answering queries on the state of analysis in a background thread. Every request is
+        handled in its own thread and takes the lock of analysis, so queries see a consistent state while ingestion
+        continues. The server listens on localhost only by default.
+    :param analysis: a RepeatDonationAnalyzer
+    :param port: port to listen on, 0 picks a free port (see server.server_address)
+    :param host: address to listen on
+    :return: the http.server.ThreadingHTTPServer, call its shutdown() and server_close() to stop it
+    """
+    server = http.server.ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.analysis = analysis
+    thread = threading.Thread(target=server.serve_forever, name='query-server', daemon=True)
+    thread.start()
+    return server
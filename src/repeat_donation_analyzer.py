@@ -0,0 +1,182 @@
+import threading
+
+import analyze_repeat_donations as analyzer
+from order_statistics import BlockedSortedList
+
+
+class IndexedRepeatDonations(dict):
+    """
+        A drop-in replacement of repeat_donation_dict which also keeps the keys of each committee, zip code and year,
+        so the keys of any of them are found without scanning the whole dictionary.
+
+        The secondary indexes are lists of keys in the order the keys were added. A key is only added once and never
+        removed, so adding a key costs three appends and a query costs a dictionary lookup and a copy of its result.
+    """
+
+    def __init__(self, items=()):
+        """
+        :param items: an optional dictionary or iterable of (key, [bucket, total]) pairs, e.g. a loaded checkpoint
+        """
+        super(IndexedRepeatDonations, self).__init__()
+        self.keys_by_committee = {}
+        self.keys_by_zip_code = {}
+        self.keys_by_year = {}
+        self.update(items)
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            (cmte_id, zip_code, transaction_year) = key
+            self.keys_by_committee.setdefault(cmte_id, []).append(key)
+            self.keys_by_zip_code.setdefault(zip_code, []).append(key)
+            self.keys_by_year.setdefault(transaction_year, []).append(key)
+        super(IndexedRepeatDonations, self).__setitem__(key, value)
+
+    def update(self, items=()):
+        for key, value in (items.items() if isinstance(items, dict) else items):
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+
+class RepeatDonationAnalyzer(object):
+    """
+        Owns the state of an analysis, donor_dict and repeat_donation_dict, and can be fed records incrementally and
+        queried at any time. Feeding gives the same output records as process_data_stream.
+
+        Queries use the indexes of IndexedRepeatDonations and the order statistics of the buckets: the percentile of a
+        key is O(log n) in its number of donations, its total and count are O(1), and the keys of a committee, zip
+        code or year are listed without a scan. Amounts are returned in whole dollars rounded like the output file.
+
+        Feeding and querying take the lock, so a query server thread can read the state while another thread feeds
+        it. Code that updates donor_dict and repeat_donation_dict directly (e.g. follow_stream.process_batches) should
+        hold the lock while it does.
+    """
+
+    def __init__(self, percentile, compact_donors=False, verify_donors=False, resume_from=None,
+                 bucket_factory=BlockedSortedList):
+        """
+        :param percentile: the percentile value between 1 and 100, or a tuple of them, used by the output records and
+                           by default by the queries
+        :param compact_donors: keep the donors in a CompactDonorIndex instead of a dictionary
+        :param verify_donors: with compact_donors, also keep the donor keys so hash collisions are told apart
+        :param resume_from: if given, a checkpoint file to load the state from
+        :param bucket_factory: the type of the buckets of repeat_donation_dict (see analyze_repeat_donations)
+        """
+        self.percentile = percentile
+        self.bucket_factory = bucket_factory
+        (self.donor_dict, repeat_donation_dict) = analyzer.create_state(compact_donors, verify_donors, resume_from,
+                                                                        bucket_factory)
+        self.repeat_donation_dict = IndexedRepeatDonations(repeat_donation_dict)
+        self.lock = threading.RLock()
+
+    def add_record(self, cmte_id, name, zip_code, transaction_year, transaction_amt):
+        """
+            Updates the state with one valid and cleaned up record (see analyze_repeat_donations.update_state).
+        :return: the key (cmte_id, zip_code, transaction_year) the record was added to if it is from a repeat donor,
+                 otherwise None
+        """
+        with self.lock:
+            return analyzer.update_state(cmte_id, name, zip_code, transaction_year, transaction_amt, self.donor_dict,
+                                         self.repeat_donation_dict, self.bucket_factory)
+
+    def process_record(self, cmte_id, name, zip_code, transaction_year, transaction_amt):
+        """
+            Updates the state with one valid and cleaned up record.
+        :return: the output record as a string if the record is from a repeat donor, otherwise None
+        """
+        with self.lock:
+            key = self.add_record(cmte_id, name, zip_code, transaction_year, transaction_amt)
+            if key is None:
+                return None
+            return analyzer.format_state(key, self.repeat_donation_dict, self.percentile)
+
+    def process_lines(self, lines):
+        """
+            Validates and processes lines of the input format.
+        :param lines: an iterable of text lines, e.g. a handle of an input file opened in text mode
+        :return: a generator of the output records of the lines from repeat donors
+        """
+        for (cmte_id, name, zip_code, transaction_year, transaction_amt) in analyzer.iter_valid_records(lines):
+            output_record = self.process_record(cmte_id, name, zip_code, transaction_year, transaction_amt)
+            if output_record is not None:
+                yield output_record
+
+    def _bucket(self, key):
+        """
+            Returns the (donations, total) of a key, raises KeyError for a key without repeat donations.
+        """
+        return self.repeat_donation_dict[tuple(key)]
+
+    def get_percentile(self, key, percentile=None):
+        """
+        :param key: a tuple (cmte_id, zip_code, transaction_year)
+        :param percentile: a percentile between 1 and 100 or a tuple of them, defaults to the one of the analyzer
+        :return: the percentile of the donations of key in dollars, or a list of them for a tuple of percentiles
+        """
+        with self.lock:
+            nth_percentile = analyzer.compute_percentile(self._bucket(key)[0], percentile or self.percentile)
+        return analyzer.round_percentile_to_dollars(nth_percentile)
+
+    def get_total(self, key):
+        """
+        :return: the total amount of the repeat donations of key in dollars
+        """
+        with self.lock:
+            return analyzer.round_cents_to_dollars(self._bucket(key)[1])
+
+    def get_count(self, key):
+        """
+        :return: the number of repeat donations of key
+        """
+        with self.lock:
+            return len(self._bucket(key)[0])
+
+    def get_state(self, key, percentile=None):
+        """
+            Returns the percentile, total and count of a key in one locked lookup, i.e. the last output record of key.
+        :param key: a tuple (cmte_id, zip_code, transaction_year)
+        :param percentile: a percentile between 1 and 100 or a tuple of them, defaults to the one of the analyzer
+        :return: a dictionary with the keys cmte_id, zip_code, transaction_year, percentile, total and count
+        """
+        with self.lock:
+            (donations, total) = self._bucket(key)
+            nth_percentile = analyzer.compute_percentile(donations, percentile or self.percentile)
+            count = len(donations)
+        (cmte_id, zip_code, transaction_year) = key
+        return dict(cmte_id=cmte_id, zip_code=zip_code, transaction_year=transaction_year,
+                    percentile=analyzer.round_percentile_to_dollars(nth_percentile),
+                    total=analyzer.round_cents_to_dollars(total), count=count)
+
+    def keys_for_committee(self, cmte_id):
+        """
+        :return: the keys of the recipient cmte_id in the order they got their first repeat donation
+        """
+        with self.lock:
+            return list(self.repeat_donation_dict.keys_by_committee.get(cmte_id, ()))
+
+    def keys_for_zip_code(self, zip_code):
+        """
+        :return: the keys of the zip code in the order they got their first repeat donation
+        """
+        with self.lock:
+            return list(self.repeat_donation_dict.keys_by_zip_code.get(zip_code, ()))
+
+    def keys_for_year(self, transaction_year):
+        """
+        :return: the keys of the year in the order they got their first repeat donation
+        """
+        with self.lock:
+            return list(self.repeat_donation_dict.keys_by_year.get(transaction_year, ()))
+
+    def stats(self):
+        """
+            Returns the size of the state as a dictionary.
+        """
+        with self.lock:
+            return dict(donors=len(self.donor_dict), repeat_keys=len(self.repeat_donation_dict),
+                        committees=len(self.repeat_donation_dict.keys_by_committee),
+                        zip_codes=len(self.repeat_donation_dict.keys_by_zip_code),
+                        years=len(self.repeat_donation_dict.keys_by_year))
@@ -1,14 +1,23 @@
+import io
+import os
+import random
+import tempfile
 import unittest
 import analyze_repeat_donations as analyzer
+from donor_index import CompactDonorIndex
+from testing_helpers import TEST_SUITE_PATH, read_expected_output, synthetic_lines
 
 
 class TestAnalyzeRepeatDonations(unittest.TestCase):
 
-    def test_round_dollar_amount(self):
-        self.assertEqual(analyzer.round_dollar_amount(0.40), 0)
-        self.assertEqual(analyzer.round_dollar_amount(0.0), 0)
-        self.assertEqual(analyzer.round_dollar_amount(1.50), 2)
-        self.assertEqual(analyzer.round_dollar_amount(100.78), 101)
+    def test_round_cents_to_dollars(self):
+        self.assertEqual(analyzer.round_cents_to_dollars(40), 0)
+        self.assertEqual(analyzer.round_cents_to_dollars(0), 0)
+        self.assertEqual(analyzer.round_cents_to_dollars(49), 0)
+        self.assertEqual(analyzer.round_cents_to_dollars(50), 1)
+        self.assertEqual(analyzer.round_cents_to_dollars(150), 2)
+        self.assertEqual(analyzer.round_cents_to_dollars(10078), 101)
+        self.assertEqual(analyzer.round_cents_to_dollars(1234567890123450), 12345678901235)
 
     def test_compute_percentile(self):
         self.assertEqual(analyzer.compute_percentile([15, 20, 35, 40, 50], 5), 15)
@@ -20,6 +29,21 @@ class TestAnalyzeRepeatDonations(unittest.TestCase):
             analyzer.compute_percentile([15, 20, 35, 40, 50], -1)
             analyzer.compute_percentile([15, 20, 35, 40, 50], 200)
 
+    def test_compute_multiple_percentiles(self):
+        self.assertListEqual(analyzer.compute_percentile([15, 20, 35, 40, 50], (5, 30, 40, 100)), [15, 20, 20, 50])
+        self.assertListEqual(analyzer.compute_percentile([15], (99, 1)), [15, 15])
+        with self.assertRaises(ValueError):
+            analyzer.compute_percentile([15, 20, 35, 40, 50], (50, 0))
+
+    def test_parse_percentiles(self):
+        self.assertEqual(analyzer.parse_percentiles('30\n'), 30)
+        self.assertTupleEqual(analyzer.parse_percentiles('50,90,99'), (50, 90, 99))
+        self.assertTupleEqual(analyzer.parse_percentiles(' 99, 50 90 '), (99, 50, 90))
+        self.assertEqual(analyzer.read_percentile(io.StringIO('50,90\n10\n')), (50, 90))
+        for string_percentiles in ['', '50,0', '101', '50,x']:
+            with self.assertRaises(ValueError):
+                analyzer.parse_percentiles(string_percentiles)
+
     def test_is_valid_dollar_amount(self):
         self.assertEqual(analyzer.is_valid_dollar_amount('1425.48'), True)
         self.assertEqual(analyzer.is_valid_dollar_amount('1425.4'), True)
@@ -35,6 +59,20 @@ class TestAnalyzeRepeatDonations(unittest.TestCase):
         self.assertEqual(analyzer.is_valid_dollar_amount('123456789012.48'), True)
         self.assertEqual(analyzer.is_valid_dollar_amount('1234567890123.48'), False)
         self.assertEqual(analyzer.is_valid_dollar_amount('.'), False)
+        self.assertEqual(analyzer.is_valid_dollar_amount(''), False)
+
+    def test_parse_dollar_amount_cents(self):
+        self.assertEqual(analyzer.parse_dollar_amount_cents('1425.48'), 142548)
+        self.assertEqual(analyzer.parse_dollar_amount_cents('1425.4'), 142540)
+        self.assertEqual(analyzer.parse_dollar_amount_cents('1425.'), 142500)
+        self.assertEqual(analyzer.parse_dollar_amount_cents('1425'), 142500)
+        self.assertEqual(analyzer.parse_dollar_amount_cents('.48'), 48)
+        self.assertEqual(analyzer.parse_dollar_amount_cents('0.0'), 0)
+        self.assertEqual(analyzer.parse_dollar_amount_cents('12345678901234'), 1234567890123400)
+        self.assertIsNone(analyzer.parse_dollar_amount_cents('123456789012345'))
+        self.assertIsNone(analyzer.parse_dollar_amount_cents('1425.483'))
+        self.assertIsNone(analyzer.parse_dollar_amount_cents('-1425.48'))
+        self.assertIsNone(analyzer.parse_dollar_amount_cents('.'))
 
     def test_check_field_validity_cleanup(self):
         cmte_id, name, zip_code, transaction_dt, transaction_amt, other_id = (
@@ -46,13 +84,13 @@ class TestAnalyzeRepeatDonations(unittest.TestCase):
             'C00177436', 'DEEHAN, WILLIAM N', '30004', '01312017', '384.', '')
         chk = analyzer.check_field_validity_cleanup(cmte_id, name, zip_code, transaction_dt, transaction_amt, other_id)
         self.assertTrue(chk[0])
-        self.assertTupleEqual(chk[1], ('C00177436', 'DEEHAN, WILLIAM N', '30004', 2017, 384))
+        self.assertTupleEqual(chk[1], ('C00177436', 'DEEHAN, WILLIAM N', '30004', 2017, 38400))
 
         cmte_id, name, zip_code, transaction_dt, transaction_amt, other_id = (
             'C00177436 ', ' DEEHAN, WILLIAM N', '300045436', '01312017', '384.50', '')
         chk = analyzer.check_field_validity_cleanup(cmte_id, name, zip_code, transaction_dt, transaction_amt, other_id)
         self.assertTrue(chk[0])
-        self.assertTupleEqual(chk[1], ('C00177436', 'DEEHAN, WILLIAM N', '30004', 2017, 384.5))
+        self.assertTupleEqual(chk[1], ('C00177436', 'DEEHAN, WILLIAM N', '30004', 2017, 38450))
 
         cmte_id, name, zip_code, transaction_dt, transaction_amt, other_id = (
             'C00384818', 'ABBOTT, JOSEPH', '028956146', '13132017', '250', '')
@@ -94,9 +132,57 @@ class TestAnalyzeRepeatDonations(unittest.TestCase):
         self.assertEqual(analyzer.create_record_for_output(cmte_id, zip_code, year, nth_percentile, total_amount,
                                                            num_contrib), 'C00177436|30004|2017|200|384|2\n')
 
-        cmte_id, zip_code, year, total_amount, nth_percentile, num_contrib = ('C00177436', '30004', 2019, 580, 70.50, 5)
+        cmte_id, zip_code, year, total_amount, nth_percentile, num_contrib = ('C00177436', '30004', 2019, 580, 71, 5)
         self.assertEqual(analyzer.create_record_for_output(cmte_id, zip_code, year, nth_percentile, total_amount,
                                                            num_contrib), 'C00177436|30004|2019|71|580|5\n')
+        self.assertEqual(analyzer.create_record_for_output(cmte_id, zip_code, year, [71, 90, 300], total_amount,
+                                                           num_contrib), 'C00177436|30004|2019|71|90|300|580|5\n')
+
+    def test_multiple_percentiles_in_one_pass(self):
+        test_path = os.path.join(TEST_SUITE_PATH, 'test_1', 'input')
+        with tempfile.TemporaryDirectory() as directory:
+            outputs = {}
+            for percentiles in [30, 70, 100, (70, 30, 100)]:
+                output_path = os.path.join(directory, 'repeat_donors.txt')
+                analyzer.process_data_stream(os.path.join(test_path, 'itcont.txt'), None, output_path,
+                                             percentiles=percentiles)
+                with open(output_path) as handle:
+                    outputs[percentiles] = [line.split('|') for line in handle.read().splitlines()]
+        self.assertTrue(outputs[30])
+        for single_30, single_70, single_100, multiple in zip(outputs[30], outputs[70], outputs[100],
+                                                              outputs[(70, 30, 100)]):
+            self.assertListEqual(multiple, single_70[:4] + [single_30[3], single_100[3]] + single_70[4:])
+
+    def test_summary(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for test_name in sorted(os.listdir(TEST_SUITE_PATH)):
+                test_path = os.path.join(TEST_SUITE_PATH, test_name)
+                input_file = os.path.join(test_path, 'input', 'itcont.txt')
+                percentile_file = os.path.join(test_path, 'input', 'percentile.txt')
+                # final state of each key in the order the keys first show up
+                expected = {}
+                for line in read_expected_output(test_name).splitlines():
+                    expected[tuple(line.split('|')[:3])] = line
+                for summary_every in [None, 1, 3]:
+                    output_path = os.path.join(directory, 'summary.txt')
+                    analyzer.process_data_stream(input_file, percentile_file, output_path, summary=True,
+                                                 summary_every=summary_every, output_batch=2)
+                    with open(output_path) as handle:
+                        actual = handle.read().splitlines()
+                    if summary_every is None:
+                        self.assertListEqual(actual, list(expected.values()), test_name)
+                    else:
+                        last_states = {}
+                        for line in actual:
+                            last_states[tuple(line.split('|')[:3])] = line
+                        self.assertDictEqual(last_states, expected, test_name)
+
+    def test_summary_arguments(self):
+        arguments = analyzer.parse_arguments(['in', 'percentile', 'out', '--summary', '--summary-every', '10'])
+        self.assertTrue(arguments.summary)
+        self.assertEqual(arguments.summary_every, 10)
+        with self.assertRaises(SystemExit):
+            analyzer.parse_arguments(['in', 'percentile', 'out', '--summary-every', '10'])
 
     def test_extract_required_fields(self):
         record_string = 'C00544767|A|12S|P|201705179053996351|10|IND|MUELLER, BARBARA|MUNCIE|IN|473045926|RETIRED|' \
@@ -113,26 +199,49 @@ class TestAnalyzeRepeatDonations(unittest.TestCase):
 
     def test_add_to_repeat_donation_dict(self):
         repeat_donation_dict = {}
-        cmte_id, zip_code, transaction_year, transaction_amt = 'C00384516', '02895', 2017, 150.45
+        cmte_id, zip_code, transaction_year, transaction_amt = 'C00384516', '02895', 2017, 15045
         repeat_donation_dict = analyzer.add_to_repeat_donation_dict(cmte_id, zip_code, transaction_year,
                                                                     transaction_amt, repeat_donation_dict)
-        self.assertDictEqual(repeat_donation_dict, {('C00384516', '02895', 2017): [[150.45], 150.45]})
+        self.assertDictEqual(repeat_donation_dict, {('C00384516', '02895', 2017): [[15045], 15045]})
 
-        cmte_id, zip_code, transaction_year, transaction_amt = 'C00384516', '02895', 2017, 34.0
+        cmte_id, zip_code, transaction_year, transaction_amt = 'C00384516', '02895', 2017, 3400
         repeat_donation_dict = analyzer.add_to_repeat_donation_dict(cmte_id, zip_code, transaction_year,
                                                                     transaction_amt, repeat_donation_dict)
-        self.assertDictEqual(repeat_donation_dict, {('C00384516', '02895', 2017): [[34.0, 150.45], 184.45]})
+        self.assertDictEqual(repeat_donation_dict, {('C00384516', '02895', 2017): [[3400, 15045], 18445]})
 
-        cmte_id, zip_code, transaction_year, transaction_amt = 'C00384516', '02895', 2017, 100.24
+        cmte_id, zip_code, transaction_year, transaction_amt = 'C00384516', '02895', 2017, 10024
         repeat_donation_dict = analyzer.add_to_repeat_donation_dict(cmte_id, zip_code, transaction_year,
                                                                     transaction_amt, repeat_donation_dict)
-        self.assertDictEqual(repeat_donation_dict, {('C00384516', '02895', 2017): [[34.0, 100.24, 150.45], 284.69]})
+        self.assertDictEqual(repeat_donation_dict, {('C00384516', '02895', 2017): [[3400, 10024, 15045], 28469]})
 
-        cmte_id, zip_code, transaction_year, transaction_amt = 'C02244516', '02615', 2015, 12
+        cmte_id, zip_code, transaction_year, transaction_amt = 'C02244516', '02615', 2015, 1200
         repeat_donation_dict = analyzer.add_to_repeat_donation_dict(cmte_id, zip_code, transaction_year,
                                                                     transaction_amt, repeat_donation_dict)
-        self.assertDictEqual(repeat_donation_dict, {('C00384516', '02895', 2017): [[34.0, 100.24, 150.45], 284.69],
-                                                    ('C02244516', '02615', 2015): [[12], 12]})
+        self.assertDictEqual(repeat_donation_dict, {('C00384516', '02895', 2017): [[3400, 10024, 15045], 28469],
+                                                    ('C02244516', '02615', 2015): [[1200], 1200]})
+
+    def test_process_records(self):
+        rng = random.Random(17)
+        lines = synthetic_lines(rng, 2000)
+        records = list(analyzer.iter_valid_records(lines))
+        for percentile in [30, (10, 50, 100)]:
+            for donor_dict in [{}, CompactDonorIndex()]:
+                expected_donors = {}
+                expected_repeat_donations = {}
+                expected = [analyzer.process_record(*record, expected_donors, expected_repeat_donations, percentile)
+                            for record in records]
+                repeat_donation_dict = {}
+                output = []
+                # the prefixes are kept between calls like between the batches of follow_stream
+                output_prefixes = analyzer.process_records(records[:700], output.append, donor_dict,
+                                                           repeat_donation_dict, percentile)
+                analyzer.process_records(records[700:], output.append, donor_dict, repeat_donation_dict,
+                                         percentile, output_prefixes=output_prefixes)
+                self.assertListEqual(output, [record for record in expected if record is not None])
+                self.assertDictEqual(repeat_donation_dict, expected_repeat_donations)
+                for donor, year in expected_donors.items():
+                    self.assertEqual(donor_dict[donor], year)
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
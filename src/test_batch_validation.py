@@ -0,0 +1,59 @@
+import io
+import os
+import random
+import tempfile
+import unittest
+import analyze_repeat_donations as analyzer
+import batch_validation
+from testing_helpers import RECORDS, TEST_SUITE_PATH, random_record, read_expected_output
+
+
+class TestBatchValidation(unittest.TestCase):
+
+    def assert_same_as_text_path(self, lines, batch_size):
+        text = ''.join(lines)
+        with io.StringIO(text, newline=None) as handle:
+            expected = list(analyzer.iter_valid_records(handle))
+        actual = list(batch_validation.iter_valid_records_batched(io.BytesIO(text.encode('utf-8')), batch_size,
+                                                                  'utf-8'))
+        self.assertListEqual(actual, expected)
+
+    def test_known_records(self):
+        for batch_size in [1, 3, 100]:
+            self.assert_same_as_text_path(RECORDS, batch_size)
+
+    def test_random_records(self):
+        rng = random.Random(13)
+        lines = [random_record(rng) for _ in range(3000)]
+        self.assert_same_as_text_path(lines, 256)
+
+    def test_mask_and_columns(self):
+        lines = [record.encode('utf-8') for record in RECORDS[:3]]
+        (mask, columns) = batch_validation.validate_cleanup_batch(lines, 'utf-8')
+        self.assertListEqual(mask, [False, True, True])
+        self.assertTupleEqual(columns, (['C00177436', 'C00177436'], ['DEEHAN, WILLIAM N', 'DEEHAN, WILLIAM N'],
+                                        ['30004', '30004'], [2017, 2018], [38400, 38450]))
+
+    def test_missing_columns(self):
+        (mask, columns) = batch_validation.validate_cleanup_batch([b'C00384516|N|M2\n', RECORDS[1].encode()])
+        self.assertListEqual(mask, [False, True])
+        self.assertListEqual(columns[0], ['C00177436'])
+
+    def test_invalid_batch_size(self):
+        with self.assertRaises(ValueError):
+            list(batch_validation.iter_valid_records_batched(io.BytesIO(b''), 0))
+
+    def test_process_data_stream_batched(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for test_name in sorted(os.listdir(TEST_SUITE_PATH)):
+                test_path = os.path.join(TEST_SUITE_PATH, test_name)
+                output_path = os.path.join(directory, test_name + '.txt')
+                analyzer.process_data_stream(os.path.join(test_path, 'input', 'itcont.txt'),
+                                             os.path.join(test_path, 'input', 'percentile.txt'), output_path,
+                                             use_mmap=True, batch_size=4)
+                with open(output_path) as actual:
+                    self.assertEqual(actual.read(), read_expected_output(test_name), test_name)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+import analyze_repeat_donations as analyzer
+import bytes_ingest
+from testing_helpers import RECORDS, TEST_SUITE_PATH, read_expected_output
+
+
+class TestBytesIngest(unittest.TestCase):
+
+    def test_parse_dollar_amount_cents_bytes(self):
+        for amount in ['1425.48', '1425.4', '1425.', '1425', '0.48', '.48', '0.0', '-1425.48', '14.25.48', '1425.483',
+                       '1,425.48', '123456789012.48', '1234567890123.48', '.', '', '1..', '..1', '12345678901234',
+                       '123456789012345', '+5', ' 5']:
+            self.assertEqual(bytes_ingest.parse_dollar_amount_cents_bytes(amount.encode()),
+                             analyzer.parse_dollar_amount_cents(amount), amount)
+
+    def test_extract_required_fields_bytes(self):
+        record = RECORDS[1].encode()
+        self.assertTupleEqual(bytes_ingest.extract_required_fields_bytes(record),
+                              (b'C00177436', b'DEEHAN, WILLIAM N', b'300047357', b'01312017', b'384', b''))
+
+    def test_check_line_short_line(self):
+        for line in [b'C00384516|N|M2|P|1|15|IND|SAB', 'C00384516|N|M2|P|1|15|IND|SÉB\n'.encode(), b'']:
+            self.assertTupleEqual(bytes_ingest.check_line(line, 'utf-8'), (False, 'columns'))
+
+    def test_same_records_as_text_path(self):
+        text = ''.join(RECORDS)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'itcont.txt')
+            with open(path, 'w', newline='', encoding='utf-8') as handle:
+                handle.write(text)
+            with open(path, 'r', encoding='utf-8') as handle:
+                expected = list(analyzer.iter_valid_records(handle))
+            with open(path, 'rb') as handle:
+                actual = list(bytes_ingest.iter_valid_records_mmap(handle, 'utf-8'))
+        self.assertEqual(len(expected), 8)
+        self.assertListEqual(actual, expected)
+
+    def test_empty_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'itcont.txt')
+            open(path, 'w').close()
+            with open(path, 'rb') as handle:
+                self.assertListEqual(list(bytes_ingest.iter_valid_records_mmap(handle)), [])
+
+    def test_process_data_stream_mmap(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for test_name in sorted(os.listdir(TEST_SUITE_PATH)):
+                test_path = os.path.join(TEST_SUITE_PATH, test_name)
+                output_path = os.path.join(directory, test_name + '.txt')
+                analyzer.process_data_stream(os.path.join(test_path, 'input', 'itcont.txt'),
+                                             os.path.join(test_path, 'input', 'percentile.txt'), output_path,
+                                             use_mmap=True)
+                with open(output_path) as actual:
+                    self.assertEqual(actual.read(), read_expected_output(test_name), test_name)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
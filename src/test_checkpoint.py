@@ -0,0 +1,87 @@
+import os
+import random
+import tempfile
+import unittest
+import analyze_repeat_donations as analyzer
+import checkpoint
+from donor_index import CompactDonorIndex
+from order_statistics import InsortList
+from testing_helpers import synthetic_lines
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = lambda name: os.path.join(self.directory.name, name)
+        with open(self.path('percentile.txt'), 'w') as handle:
+            handle.write('30\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_load_dict(self):
+        donor_dict = {('SABOURIN, JAMES', '02895'): 2017, ('DEEHAN, WILLIAM N', '30004'): 2018}
+        repeat_donation_dict = {('C00384516', '02895', 2018): [InsortList([5000, 11000, 12550]), 28550],
+                                ('C00177436', '30004', 2019): [InsortList([38400]), 38400]}
+        checkpoint.save_checkpoint(self.path('state'), donor_dict, repeat_donation_dict)
+        (loaded_donors, loaded_repeat_donations) = checkpoint.load_checkpoint(self.path('state'))
+        self.assertDictEqual(loaded_donors, donor_dict)
+        self.assertDictEqual(loaded_repeat_donations, repeat_donation_dict)
+
+    def test_save_load_empty(self):
+        checkpoint.save_checkpoint(self.path('state'), {}, {})
+        self.assertTupleEqual(checkpoint.load_checkpoint(self.path('state')), ({}, {}))
+
+    def test_save_load_compact_donors(self):
+        for hash_bits, verify in [(64, False), (128, True)]:
+            donor_dict = CompactDonorIndex(capacity=2, hash_bits=hash_bits, verify=verify)
+            for i in range(100):
+                donor_dict[('DONOR, NUMBER {}'.format(i), '02895')] = 2000 + i
+            checkpoint.save_checkpoint(self.path('state'), donor_dict, {})
+            (loaded_donors, loaded_repeat_donations) = checkpoint.load_checkpoint(self.path('state'))
+            self.assertIsInstance(loaded_donors, CompactDonorIndex)
+            self.assertEqual(len(loaded_donors), 100)
+            for i in range(100):
+                self.assertEqual(loaded_donors[('DONOR, NUMBER {}'.format(i), '02895')], 2000 + i)
+            self.assertNotIn(('DONOR, NUMBER 100', '02895'), loaded_donors)
+            # the loaded index keeps working and growing without changing the checkpoint file
+            for i in range(100, 300):
+                loaded_donors[('DONOR, NUMBER {}'.format(i), '02895')] = 2000
+            self.assertEqual(len(loaded_donors), 300)
+            self.assertEqual(len(checkpoint.load_checkpoint(self.path('state'))[0]), 100)
+
+    def test_not_a_checkpoint(self):
+        with open(self.path('state'), 'wb') as handle:
+            handle.write(b'C00384516|N|M2|P|1|15|IND|A|L|GA|02895|U|S|01312017|1|\n')
+        with self.assertRaises(ValueError):
+            checkpoint.load_checkpoint(self.path('state'))
+
+    def test_resume_same_as_concatenated_input(self):
+        rng = random.Random(3)
+        parts = [synthetic_lines(rng, 400) for _ in range(3)]
+        with open(self.path('all.txt'), 'w') as handle:
+            handle.writelines(line for part in parts for line in part)
+        for i, part in enumerate(parts):
+            with open(self.path('part{}.txt'.format(i)), 'w') as handle:
+                handle.writelines(part)
+
+        for compact_donors in [False, True]:
+            analyzer.process_data_stream(self.path('all.txt'), self.path('percentile.txt'), self.path('expected.txt'),
+                                         compact_donors=compact_donors)
+            analyzer.process_data_stream(self.path('part0.txt'), self.path('percentile.txt'),
+                                         self.path('actual.txt'), compact_donors=compact_donors,
+                                         checkpoint_to=self.path('state'))
+            analyzer.process_data_stream(self.path('part1.txt'), self.path('percentile.txt'),
+                                         self.path('actual.txt'), resume_from=self.path('state'),
+                                         checkpoint_to=self.path('state'))
+            analyzer.process_data_stream(self.path('part2.txt'), self.path('percentile.txt'),
+                                         self.path('actual.txt'), resume_from=self.path('state'))
+            with open(self.path('expected.txt')) as expected, open(self.path('actual.txt')) as actual:
+                expected_lines = expected.read()
+                self.assertGreater(len(expected_lines), 0)
+                self.assertEqual(actual.read(), expected_lines)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
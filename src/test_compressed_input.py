@@ -0,0 +1,103 @@
+import bz2
+import gzip
+import lzma
+import os
+import tempfile
+import unittest
+import zipfile
+import analyze_repeat_donations as analyzer
+import compressed_input
+from testing_helpers import RECORDS, TEST_SUITE_PATH, read_expected_output
+
+
+def write_compressed(path, data, compression, member_names=('itcont.txt',)):
+    """
+        Writes data to path compressed with compression, a zip archive gets a member of each name holding data.
+    """
+    if compression == 'zip':
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for member_name in member_names:
+                archive.writestr(member_name, data)
+        return
+    compress = {'gzip': gzip.compress, 'bz2': bz2.compress, 'xz': lzma.compress}[compression]
+    with open(path, 'wb') as handle:
+        handle.write(compress(data))
+
+
+class TestCompressedInput(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.data = ''.join(RECORDS).encode('utf-8')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_detect_compression(self):
+        path = os.path.join(self.directory.name, 'itcont')
+        for compression in compressed_input.COMPRESSIONS:
+            write_compressed(path, self.data, compression)
+            self.assertEqual(compressed_input.detect_compression(path), compression)
+        with open(path, 'wb') as handle:
+            handle.write(self.data)
+        self.assertIsNone(compressed_input.detect_compression(path))
+        with open(path, 'wb') as handle:
+            handle.write(b'\x28\xb5\x2f\xfd' + self.data)
+        with self.assertRaises(ValueError):
+            compressed_input.detect_compression(path)
+
+    def test_decompressed_lines(self):
+        path = os.path.join(self.directory.name, 'itcont')
+        for compression in compressed_input.COMPRESSIONS:
+            write_compressed(path, self.data, compression)
+            for block_size in [1, 7, 1000]:
+                blocks = list(compressed_input.iter_decompressed_blocks(path, compression, block_size, queue_size=1))
+                self.assertEqual(b''.join(blocks), self.data)
+                lines = list(compressed_input.iter_decompressed_lines(path, compression, block_size, queue_size=1))
+                self.assertListEqual(lines, self.data.splitlines(True), (compression, block_size))
+
+    def test_block_lines(self):
+        blocks = [b'ab', b'c\r', b'\nd\re', b'', b'f\n\n', b'g']
+        self.assertListEqual(list(compressed_input.iter_block_lines(blocks)), [b'abc\r\n', b'd\r', b'ef\n', b'\n',
+                                                                               b'g'])
+        self.assertListEqual(list(compressed_input.iter_block_lines([])), [])
+
+    def test_errors_and_early_stop(self):
+        path = os.path.join(self.directory.name, 'itcont.gz')
+        with open(path, 'wb') as handle:
+            handle.write(gzip.compress(self.data * 10)[:-20])
+        with self.assertRaises(EOFError):
+            list(compressed_input.iter_decompressed_blocks(path, 'gzip', block_size=100))
+
+        blocks = compressed_input.iter_decompressed_blocks(path, 'gzip', block_size=10, queue_size=1)
+        self.assertEqual(len(next(blocks)), 10)
+        blocks.close()   # the decompression thread stops instead of waiting on the full queue
+
+        write_compressed(path, self.data, 'zip', member_names=('a.txt', 'b.txt'))
+        with self.assertRaises(ValueError):
+            compressed_input.open_decompressed(path, 'zip')
+        write_compressed(path, self.data, 'zip', member_names=('README', 'by_date/itcont.txt'))
+        with compressed_input.open_decompressed(path, 'zip') as handle:
+            self.assertEqual(handle.read(), self.data)
+
+    def test_process_data_stream(self):
+        for test_name in sorted(os.listdir(TEST_SUITE_PATH)):
+            test_path = os.path.join(TEST_SUITE_PATH, test_name)
+            with open(os.path.join(test_path, 'input', 'itcont.txt'), 'rb') as handle:
+                data = handle.read()
+            expected = read_expected_output(test_name)
+            for compression in compressed_input.COMPRESSIONS:
+                input_path = os.path.join(self.directory.name, 'itcont.' + compression)
+                output_path = os.path.join(self.directory.name, 'repeat_donors.txt')
+                write_compressed(input_path, data, compression)
+                for batch_size in [None, 2]:
+                    analyzer.process_data_stream(input_path, os.path.join(test_path, 'input', 'percentile.txt'),
+                                                 output_path, batch_size=batch_size)
+                    with open(output_path) as handle:
+                        self.assertEqual(handle.read(), expected, (test_name, compression, batch_size))
+                with self.assertRaises(ValueError):
+                    analyzer.process_data_stream(input_path, None, output_path, workers=2, percentiles=30)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,89 @@
+import os
+import random
+import tempfile
+import unittest
+import analyze_repeat_donations as analyzer
+import donor_index
+from testing_helpers import TEST_SUITE_PATH, read_expected_output
+
+
+class CollidingDonorIndex(donor_index.CompactDonorIndex):
+    """
+        Gives the same hash to every donor.
+    """
+    def _hash(self, key):
+        return 42, 7
+
+
+class TestCompactDonorIndex(unittest.TestCase):
+
+    def check_against_dict(self, index):
+        rng = random.Random(5)
+        reference = {}
+        for _ in range(20000):
+            donor = ('DONOR, NUMBER {}'.format(rng.randrange(5000)), '{:05d}'.format(rng.randrange(30)))
+            year = rng.randint(2010, 2020)
+            self.assertEqual(donor in index, donor in reference)
+            if donor in reference:
+                self.assertEqual(index[donor], reference[donor])
+                if year < reference[donor]:
+                    reference[donor] = index[donor] = year
+            else:
+                reference[donor] = index[donor] = year
+        self.assertEqual(len(index), len(reference))
+        for donor, year in reference.items():
+            self.assertEqual(index.get(donor), year)
+
+    def test_same_as_dict(self):
+        self.check_against_dict(donor_index.CompactDonorIndex(capacity=4))
+
+    def test_same_as_dict_128_bits_verified(self):
+        self.check_against_dict(donor_index.CompactDonorIndex(capacity=4, hash_bits=128, verify=True))
+
+    def test_missing_donor(self):
+        index = donor_index.CompactDonorIndex()
+        self.assertNotIn(('SABOURIN, JAMES', '02895'), index)
+        self.assertIsNone(index.get(('SABOURIN, JAMES', '02895')))
+        with self.assertRaises(KeyError):
+            index[('SABOURIN, JAMES', '02895')]
+
+    def test_collisions(self):
+        merged = CollidingDonorIndex()
+        merged[('A', '02895')] = 2017
+        merged[('B', '02895')] = 2018
+        self.assertEqual(len(merged), 1)
+        self.assertEqual(merged[('A', '02895')], 2018)
+
+        verified = CollidingDonorIndex(verify=True)
+        verified[('A', '02895')] = 2017
+        verified[('B', '02895')] = 2018
+        self.assertEqual(len(verified), 2)
+        self.assertEqual(verified[('A', '02895')], 2017)
+        self.assertEqual(verified[('B', '02895')], 2018)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            donor_index.CompactDonorIndex(hash_bits=32)
+        with self.assertRaises(ValueError):
+            donor_index.CompactDonorIndex()[('A', '02895')] = 70000
+
+    def test_arguments(self):
+        arguments = analyzer.parse_arguments(['in', 'percentile', 'out', '--compact-donors', '--verify-donors'])
+        self.assertTrue(arguments.verify_donors)
+        with self.assertRaises(SystemExit):
+            analyzer.parse_arguments(['in', 'percentile', 'out', '--verify-donors'])
+
+    def test_process_data_stream_compact_donors(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for test_name in sorted(os.listdir(TEST_SUITE_PATH)):
+                test_path = os.path.join(TEST_SUITE_PATH, test_name)
+                output_path = os.path.join(directory, test_name + '.txt')
+                analyzer.process_data_stream(os.path.join(test_path, 'input', 'itcont.txt'),
+                                             os.path.join(test_path, 'input', 'percentile.txt'), output_path,
+                                             compact_donors=True)
+                with open(output_path) as actual:
+                    self.assertEqual(actual.read(), read_expected_output(test_name), test_name)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
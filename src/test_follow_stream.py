@@ -0,0 +1,169 @@
+import asyncio
+import io
+import os
+import socket
+import tempfile
+import unittest
+import analyze_repeat_donations as analyzer
+import follow_stream
+from testing_helpers import TEST_SUITE_PATH, read_expected_output
+
+
+def read_test_case(test_name):
+    test_path = os.path.join(TEST_SUITE_PATH, test_name)
+    with open(os.path.join(test_path, 'input', 'itcont.txt'), 'rb') as handle:
+        lines = handle.read().splitlines(True)
+    with open(os.path.join(test_path, 'input', 'percentile.txt')) as handle:
+        percentile = analyzer.read_percentile(handle)
+    return lines, percentile, read_expected_output(test_name)
+
+
+class TestLatencyStats(unittest.TestCase):
+
+    def test_percentiles(self):
+        latency_stats = follow_stream.LatencyStats()
+        self.assertEqual(latency_stats.percentile(50), 0.0)
+        latency_stats.add(0.001, 98)
+        latency_stats.add(0.5, 2)
+        self.assertEqual(latency_stats.count, 100)
+        self.assertAlmostEqual(latency_stats.percentile(50), 0.001, delta=0.0002)
+        self.assertAlmostEqual(latency_stats.percentile(99), 0.5, delta=0.07)
+        self.assertEqual(latency_stats.max, 0.5)
+        self.assertIn('records: 100', latency_stats.summary())
+
+
+class TestFollowStream(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.lines, self.percentile, self.expected = read_test_case('test_1')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_follow(self, source, path, feed, **kwargs):
+        """
+            Runs follow_data_stream on source while the coroutine feed writes the input, returns the output.
+        """
+        output_handle = io.StringIO()
+        latency_stats = follow_stream.LatencyStats()
+
+        async def run():
+            feeder = asyncio.ensure_future(feed())
+            await follow_stream.follow_data_stream(source, path, self.percentile, output_handle, {}, {},
+                                                   latency_stats=latency_stats, poll_interval=0.01,
+                                                   idle_timeout=0.5, **kwargs)
+            await feeder
+
+        asyncio.run(run())
+        self.assertEqual(latency_stats.count, len(self.lines))
+        return output_handle.getvalue()
+
+    def test_split_complete_lines(self):
+        self.assertTupleEqual(follow_stream.split_complete_lines(b'ab', b'c\nde\nf'), ([b'abc\n', b'de\n'], b'f'))
+        self.assertTupleEqual(follow_stream.split_complete_lines(b'', b'f'), ([], b'f'))
+
+    def test_follow_growing_file(self):
+        path = os.path.join(self.directory.name, 'itcont.txt')
+        with open(path, 'wb') as handle:
+            handle.writelines(self.lines[:3])
+
+        async def feed():
+            for line in self.lines[3:]:
+                await asyncio.sleep(0.02)
+                with open(path, 'ab') as handle:
+                    handle.write(line[:10])
+                    handle.flush()
+                    handle.write(line[10:])
+
+        self.assertEqual(self.run_follow('file', path, feed, max_batch=2, max_latency=0.01), self.expected)
+
+    def test_follow_directory(self):
+        async def feed():
+            for i, line in enumerate(self.lines):
+                with open(os.path.join(self.directory.name, 'itcont_{:03d}.txt'.format(i)), 'wb') as handle:
+                    handle.write(line)
+                await asyncio.sleep(0.02)
+
+        self.assertEqual(self.run_follow('directory', self.directory.name, feed), self.expected)
+
+    def test_unix_socket(self):
+        path = os.path.join(self.directory.name, 'itcont.sock')
+        # a socket file left behind by an earlier run is replaced
+        stale = socket.socket(socket.AF_UNIX)
+        stale.bind(path)
+        stale.close()
+
+        async def feed():
+            while True:
+                try:
+                    (reader, writer) = await asyncio.open_unix_connection(path)
+                    break
+                except (ConnectionRefusedError, FileNotFoundError):   # not listening yet
+                    await asyncio.sleep(0.01)
+            for line in self.lines:
+                writer.write(line)
+                await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+
+        self.assertEqual(self.run_follow('socket', path, feed), self.expected)
+        self.assertFalse(os.path.lexists(path))
+
+    def test_unix_socket_keeps_other_files(self):
+        path = os.path.join(self.directory.name, 'itcont.txt')
+        with open(path, 'wb') as handle:
+            handle.writelines(self.lines)
+        with self.assertRaises(FileExistsError):
+            asyncio.run(follow_stream.follow_data_stream('socket', path, 30, io.StringIO(), {}, {}, idle_timeout=5))
+        with open(path, 'rb') as handle:
+            self.assertListEqual(handle.read().splitlines(True), self.lines)
+
+    def test_unknown_source(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(follow_stream.follow_data_stream('pipe', 'x', 30, io.StringIO(), {}, {}))
+
+    def test_arguments(self):
+        arguments = analyzer.parse_arguments(['in', 'percentile', 'out', '--follow', 'file', '--max-batch', '10'])
+        self.assertEqual(arguments.follow, 'file')
+        self.assertEqual(arguments.max_batch, 10)
+        for extra in (['--mmap'], ['--batch-size', '10'], ['--workers', '2'], ['--compression', 'gzip'],
+                      ['--summary']):
+            with self.assertRaises(SystemExit):
+                analyzer.parse_arguments(['in', 'percentile', 'out', '--follow', 'file'] + extra)
+
+    def test_process_batches(self):
+        for max_batch in [1, 3, 1000]:
+            output_handle = io.StringIO()
+
+            async def run():
+                queue = asyncio.Queue()
+                for line in self.lines:
+                    # each line comes with a cut line, like the last line of a client disconnecting in its middle
+                    await queue.put(([line, b'C00384516|N|M2|P|1|15|IND|SAB'], 0.0))
+                await queue.put(None)
+                await follow_stream.process_batches(queue, self.percentile, output_handle, {}, {}, max_batch=max_batch)
+
+            asyncio.run(run())
+            self.assertEqual(output_handle.getvalue(), self.expected)
+
+
+    def test_checkpoint_only_on_clean_stop(self):
+        input_path = os.path.join(self.directory.name, 'itcont.txt')
+        output_path = os.path.join(self.directory.name, 'repeat_donors.txt')
+        checkpoint_path = os.path.join(self.directory.name, 'state')
+        with self.assertRaises(FileNotFoundError):
+            follow_stream.run_follow('file', input_path, None, output_path, idle_timeout=5,
+                                     checkpoint_to=checkpoint_path, percentiles=self.percentile)
+        self.assertFalse(os.path.exists(checkpoint_path))
+        with open(input_path, 'wb') as handle:
+            handle.writelines(self.lines)
+        follow_stream.run_follow('file', input_path, None, output_path, idle_timeout=0.2,
+                                 checkpoint_to=checkpoint_path, percentiles=self.percentile)
+        self.assertTrue(os.path.exists(checkpoint_path))
+        with open(output_path) as handle:
+            self.assertEqual(handle.read(), self.expected)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
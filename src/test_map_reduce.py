@@ -0,0 +1,123 @@
+import gzip
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+import analyze_repeat_donations as analyzer
+import map_reduce
+from testing_helpers import RECORDS, synthetic_lines
+
+SRC_PATH = os.path.dirname(os.path.abspath(__file__))
+SPAWN_SCRIPT = """
+import multiprocessing
+import sys
+if __name__ == '__main__':
+    # imported under the guard so the spawned workers first import the module of the function they run
+    import map_reduce
+    multiprocessing.set_start_method('spawn')
+    map_reduce.run_map_reduce(sys.argv[1], None, sys.argv[2], workers=2, percentiles=30)
+"""
+
+
+def reference_output(lines, percentile):
+    """
+        Computes the order independent output directly from its definition.
+    """
+    records = list(analyzer.iter_valid_records(lines))
+    earliest_years = {}
+    for (cmte_id, name, zip_code, transaction_year, transaction_amt) in records:
+        donor = (name, zip_code)
+        earliest_years[donor] = min(earliest_years.get(donor, transaction_year), transaction_year)
+    donations = {}
+    for (cmte_id, name, zip_code, transaction_year, transaction_amt) in records:
+        if earliest_years[(name, zip_code)] < transaction_year:
+            donations.setdefault((cmte_id, zip_code, transaction_year), []).append(transaction_amt)
+    return [analyzer.format_output(key, analyzer.compute_percentile(sorted(donations[key]), percentile),
+                                   sum(donations[key]), len(donations[key])) for key in sorted(donations)]
+
+
+class TestMapReduce(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = lambda *names: os.path.join(self.directory.name, *names)
+        self.lines = synthetic_lines(random.Random(16), 3000) + RECORDS
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, lines):
+        with open(self.path(name), 'w') as handle:
+            handle.writelines(lines)
+        return self.path(name)
+
+    def run_map_reduce(self, input_path, **kwargs):
+        output_path = self.path('repeat_donors.txt')
+        map_reduce.run_map_reduce(input_path, None, output_path, percentiles=30, **kwargs)
+        with open(output_path) as handle:
+            return handle.read().splitlines(True)
+
+    def test_same_output_as_reference(self):
+        expected = reference_output(self.lines, 30)
+        self.assertTrue(expected)
+        input_path = self.write('itcont.txt', self.lines)
+        for (workers, partitions, chunk_size) in [(1, 1, 1 << 20), (1, 3, 4096), (2, None, 10000)]:
+            self.assertListEqual(self.run_map_reduce(input_path, workers=workers, partitions=partitions,
+                                                     chunk_size=chunk_size), expected)
+
+    def test_order_and_files_do_not_matter(self):
+        expected = reference_output(self.lines, 30)
+        shuffled = list(self.lines)
+        random.Random(1).shuffle(shuffled)
+        os.mkdir(self.path('years'))
+        self.write(os.path.join('years', 'itcont_a.txt'), shuffled[:1000])
+        self.write(os.path.join('years', 'itcont_b.txt'), shuffled[1000:2000])
+        with gzip.open(self.path('years', 'itcont_c.txt.gz'), 'wt') as handle:
+            handle.writelines(shuffled[2000:])
+        self.assertListEqual(self.run_map_reduce(self.path('years'), workers=1), expected)
+        self.assertListEqual(self.run_map_reduce(self.path('years', 'itcont_*'), workers=2), expected)
+
+    def test_chronological_input_matches_summary(self):
+        def year(line):
+            (validity, fields) = analyzer.check_field_validity_cleanup(*analyzer.extract_required_fields(line))
+            return fields[3] if validity else 0
+
+        lines = sorted(self.lines, key=year)
+        input_path = self.write('itcont.txt', lines)
+        analyzer.process_data_stream(input_path, None, self.path('summary.txt'), percentiles=30, summary=True)
+        with open(self.path('summary.txt')) as handle:
+            summary = handle.read().splitlines(True)
+        self.assertListEqual(self.run_map_reduce(input_path, workers=1), sorted(summary))
+
+    def test_spawn_workers(self):
+        input_path = self.write('itcont.txt', self.lines)
+        script_path = self.write('spawn_map_reduce.py', [SPAWN_SCRIPT])
+        output_path = self.path('repeat_donors.txt')
+        subprocess.run([sys.executable, script_path, input_path, output_path],
+                       env=dict(os.environ, PYTHONPATH=SRC_PATH), check=True, timeout=120)
+        with open(output_path) as handle:
+            self.assertListEqual(handle.read().splitlines(True), reference_output(self.lines, 30))
+
+    def test_list_input_files(self):
+        with self.assertRaises(ValueError):
+            map_reduce.list_input_files(self.path('missing*'))
+        input_path = self.write('itcont.txt', RECORDS)
+        self.assertListEqual(map_reduce.list_input_files(input_path), [input_path])
+        self.assertListEqual(map_reduce.list_input_files(self.directory.name), [input_path])
+
+    def test_arguments(self):
+        arguments = analyzer.parse_arguments(['in*', 'percentile', 'out', '--map-reduce', '--workers', '2',
+                                              '--partitions', '16'])
+        self.assertTrue(arguments.map_reduce)
+        self.assertEqual(arguments.partitions, 16)
+        for extra in (['--summary'], ['--checkpoint', 'state'], ['--follow', 'file'], ['--sketch-threshold', '10']):
+            with self.assertRaises(SystemExit):
+                analyzer.parse_arguments(['in', 'percentile', 'out', '--map-reduce'] + extra)
+        with self.assertRaises(SystemExit):
+            analyzer.parse_arguments(['in', 'percentile', 'out', '--partitions', '4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
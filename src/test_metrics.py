@@ -0,0 +1,124 @@
+import io
+import os
+import tempfile
+import unittest
+import analyze_repeat_donations as analyzer
+import bytes_ingest
+import metrics
+from testing_helpers import RECORDS, TEST_SUITE_PATH
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_rejection_reasons(self):
+        valid = ['C00384516', 'SABOURIN, JAMES', '028956146', '01312017', '230', '']
+        changes = [(0, 'C0038451', 'cmte_id'), (1, ' ', 'name'), (2, '02895O146', 'zip_code'),
+                   (3, '13312017', 'transaction_dt'), (4, '1.2.3', 'transaction_amt'), (5, 'H6CA34245', 'other_id')]
+        for index, value, reason in changes:
+            fields = list(valid)
+            fields[index] = value
+            self.assertTupleEqual(analyzer.check_field_validity_cleanup(*fields), (False, reason))
+            bytes_fields = [field.encode() for field in fields]
+            self.assertTupleEqual(bytes_ingest.check_field_validity_cleanup_bytes(*bytes_fields), (False, reason))
+
+    def test_same_output_as_regular_loop(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for test_name in sorted(os.listdir(TEST_SUITE_PATH)):
+                test_path = os.path.join(TEST_SUITE_PATH, test_name)
+                input_file = os.path.join(test_path, 'input', 'itcont.txt')
+                percentile_file = os.path.join(test_path, 'input', 'percentile.txt')
+                with open(input_file) as handle:
+                    number_of_lines = len(handle.readlines())
+                for options in [dict(), dict(summary=True), dict(summary=True, summary_every=2)]:
+                    expected_path = os.path.join(directory, 'expected.txt')
+                    actual_path = os.path.join(directory, 'actual.txt')
+                    stats_path = os.path.join(directory, 'stats.json')
+                    analyzer.process_data_stream(input_file, percentile_file, expected_path, **options)
+                    instrumentation = metrics.Instrumentation(sample_every=2)
+                    analyzer.process_data_stream(input_file, percentile_file, actual_path,
+                                                 instrumentation=instrumentation, stats_file=stats_path, **options)
+                    with open(expected_path) as expected, open(actual_path) as actual:
+                        self.assertEqual(actual.read(), expected.read(), test_name)
+                    self.assertTrue(os.path.exists(stats_path))
+                    self.assertEqual(instrumentation.records_read, number_of_lines)
+                    self.assertEqual(instrumentation.records_valid + sum(instrumentation.rejected.values()),
+                                     number_of_lines)
+
+    def test_counters_gauges_and_stages(self):
+        lines = [record for record in RECORDS if '\r' not in record]
+        output_handle = io.StringIO()
+        (donor_dict, repeat_donation_dict) = ({}, {})
+        instrumentation = metrics.Instrumentation(sample_every=1)
+        metrics.process_lines_instrumented(lines, analyzer.output_writer.BatchedWriter(output_handle), donor_dict,
+                                           repeat_donation_dict, 30, instrumentation)
+        report = instrumentation.report(donor_dict, repeat_donation_dict)
+        self.assertDictEqual(dict(report['records']), {'read': 10, 'valid': 5, 'rejected': 5, 'repeat': 1})
+        self.assertDictEqual(dict(report['rejected_by_reason']), {'transaction_amt': 2, 'other_id': 1,
+                                                                   'transaction_dt': 1, 'zip_code': 1})
+        self.assertDictEqual(dict(report['gauges']), {'donors': 3, 'repeat_keys': 1, 'repeat_donations': 1,
+                                                      'largest_bucket': 1})
+        self.assertEqual(report['stages']['extract_required_fields']['sampled_calls'], 10)
+        self.assertEqual(report['stages']['donor_lookup']['sampled_calls'], 5)
+        self.assertEqual(report['stages']['output_write']['sampled_calls'], 1)
+
+    def test_hooks_and_progress(self):
+        calls = []
+
+        def hook(function, *args):
+            calls.append(args)
+            return function(*args)
+
+        progress_handle = io.StringIO()
+        instrumentation = metrics.Instrumentation(sample_every=3, progress_interval=0,
+                                                  progress_handle=progress_handle)
+        instrumentation.add_hook('extract_required_fields', hook)
+        with self.assertRaises(ValueError):
+            instrumentation.add_hook('no_stage', hook)
+        metrics.process_lines_instrumented(RECORDS[:7], analyzer.output_writer.BatchedWriter(io.StringIO()), {}, {},
+                                           30, instrumentation)
+        self.assertListEqual(calls, [(RECORDS[2],), (RECORDS[5],)])
+        self.assertEqual(progress_handle.getvalue().count('\n'), 2)
+
+        profile_hook = metrics.ProfileHook()
+        self.assertEqual(profile_hook(sorted, [2, 1]), [1, 2])
+        self.assertIn('function calls', profile_hook.summary())
+
+    def test_flushes_are_timed(self):
+        # the same donor every year gives a repeat donation and an output record from the second line on
+        lines = ['C00384516|N|M2|P|1|15|IND|SABOURIN, JAMES|L|GA|02895|UNUM|SVP|0131{}|{}||a|b||c|d\n'.format(
+            2010 + number, 100 + number) for number in range(7)]
+        flushed = []
+
+        def hook(function, *args):
+            if not args:
+                flushed.append(function)
+            return function(*args)
+
+        output_handle = io.StringIO()
+        writer = analyzer.output_writer.BatchedWriter(output_handle, 2)
+        instrumentation = metrics.Instrumentation(sample_every=1000)
+        instrumentation.add_hook('output_write', hook)
+        metrics.process_lines_instrumented(lines, writer, {}, {}, 30, instrumentation)
+        self.assertEqual(output_handle.getvalue().count('\n'), 6)
+        report = instrumentation.report({}, {})
+        # no record is sampled, all of them went through process_records
+        self.assertDictEqual(dict(report['records']), {'read': 7, 'valid': 7, 'rejected': 0, 'repeat': 6})
+        output_write = report['stages']['output_write']
+        # three full batches, then the flush at the end with nothing left to write
+        self.assertEqual(output_write['flush_calls'], 4)
+        self.assertEqual(len(flushed), 4)
+        self.assertEqual(output_write['sampled_calls'], 0)
+        self.assertGreater(output_write['estimated_seconds'], 0)
+        self.assertEqual(output_write['estimated_seconds'], output_write['flush_seconds'])
+        self.assertEqual(writer.flush.__func__, analyzer.output_writer.BatchedWriter.flush)
+
+    def test_fast_paths_are_rejected(self):
+        with self.assertRaises(SystemExit):
+            analyzer.parse_arguments(['in', 'percentile', 'out', '--mmap', '--stats-json', 'stats.json'])
+        with self.assertRaises(ValueError):
+            analyzer.process_data_stream('in', 'percentile', 'out', use_mmap=True,
+                                         instrumentation=metrics.Instrumentation())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,58 @@
+import random
+import unittest
+import order_statistics
+
+
+class TestBlockedSortedList(unittest.TestCase):
+
+    def test_add_keeps_order(self):
+        rng = random.Random(7)
+        values = [rng.randint(0, 1000) for _ in range(5000)]
+        blocked = order_statistics.BlockedSortedList(load=8)
+        for value in values:
+            blocked.add(value)
+        self.assertEqual(len(blocked), len(values))
+        self.assertListEqual(list(blocked), sorted(values))
+
+    def test_getitem_by_rank(self):
+        rng = random.Random(11)
+        blocked = order_statistics.BlockedSortedList(load=4)
+        reference = []
+        for _ in range(500):
+            value = rng.random() * 100
+            blocked.add(value)
+            reference.append(value)
+            reference.sort()
+            index = rng.randrange(len(reference))
+            self.assertEqual(blocked[index], reference[index])
+        self.assertEqual(blocked[-1], reference[-1])
+        self.assertEqual(blocked[0], reference[0])
+        with self.assertRaises(IndexError):
+            blocked[len(reference)]
+        with self.assertRaises(IndexError):
+            blocked[-len(reference) - 1]
+
+    def test_initial_values_and_equality(self):
+        blocked = order_statistics.BlockedSortedList([300, 50, 125, 110], load=2)
+        self.assertEqual(blocked, [50, 110, 125, 300])
+        self.assertNotEqual(blocked, [50, 110, 125])
+        self.assertEqual(blocked[1:3], [110, 125])
+        blocked.add(10)
+        self.assertEqual(blocked, [10, 50, 110, 125, 300])
+
+    def test_invalid_load(self):
+        with self.assertRaises(ValueError):
+            order_statistics.BlockedSortedList(load=0)
+
+
+class TestInsortList(unittest.TestCase):
+
+    def test_add_keeps_order(self):
+        insort_list = order_statistics.InsortList()
+        for value in [150.45, 34.0, 100.24]:
+            insort_list.add(value)
+        self.assertListEqual(insort_list, [34.0, 100.24, 150.45])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
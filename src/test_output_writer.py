@@ -0,0 +1,32 @@
+import io
+import unittest
+import output_writer
+
+
+class TestBatchedWriter(unittest.TestCase):
+
+    def test_batches(self):
+        output_handle = io.StringIO()
+        writer = output_writer.BatchedWriter(output_handle, 3)
+        for i in range(5):
+            writer.write('{}\n'.format(i))
+            self.assertEqual(output_handle.getvalue(), '0\n1\n2\n' if i >= 2 else '')
+            self.assertEqual(len(writer), i + 1)
+        writer.flush()
+        writer.flush()
+        self.assertEqual(len(writer), 5)
+        self.assertEqual(output_handle.getvalue(), '0\n1\n2\n3\n4\n')
+
+    def test_single_record_batches(self):
+        output_handle = io.StringIO()
+        writer = output_writer.BatchedWriter(output_handle, 1)
+        writer.write('a\n')
+        self.assertEqual(output_handle.getvalue(), 'a\n')
+
+    def test_invalid_batch(self):
+        with self.assertRaises(ValueError):
+            output_writer.BatchedWriter(io.StringIO(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
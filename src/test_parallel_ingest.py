@@ -0,0 +1,95 @@
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+import analyze_repeat_donations as analyzer
+import parallel_ingest
+from testing_helpers import RECORDS, TEST_SUITE_PATH, random_record, read_expected_output
+
+SRC_PATH = os.path.dirname(os.path.abspath(__file__))
+# runs process_data_stream with --workers in worker processes started with spawn, the default on macOS and Windows,
+# where every worker imports the modules again from scratch
+SPAWN_SCRIPT = """
+import multiprocessing
+import sys
+if __name__ == '__main__':
+    # imported under the guard so the spawned workers first import the module of the function they run
+    import analyze_repeat_donations as analyzer
+    multiprocessing.set_start_method('spawn')
+    analyzer.process_data_stream(sys.argv[1], sys.argv[2], sys.argv[3], workers=2)
+"""
+
+
+class TestParallelIngest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.directory.name, 'itcont.txt')
+        rng = random.Random(17)
+        self.text = ''.join(RECORDS[:-1] + [random_record(rng) for _ in range(2000)] + RECORDS[-1:])
+        with open(self.input_path, 'w', newline='', encoding='utf-8') as handle:
+            handle.write(self.text)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_find_chunk_boundaries(self):
+        with open(self.input_path, 'rb') as handle:
+            data = handle.read()
+            boundaries = parallel_ingest.find_chunk_boundaries(handle, 1000)
+        self.assertGreater(len(boundaries), 10)
+        self.assertEqual(boundaries[0][0], 0)
+        self.assertEqual(boundaries[-1][1], len(data))
+        for (start, end), (next_start, next_end) in zip(boundaries, boundaries[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(data[end - 1:end], b'\n')
+
+    def test_find_chunk_boundaries_empty_file(self):
+        with tempfile.TemporaryFile() as handle:
+            self.assertListEqual(parallel_ingest.find_chunk_boundaries(handle, 10), [])
+
+    def test_same_records_as_text_path(self):
+        with io.StringIO(self.text, newline=None) as handle:
+            expected = list(analyzer.iter_valid_records(handle))
+        with open(self.input_path, 'rb') as handle:
+            actual = list(parallel_ingest.iter_valid_records_parallel(self.input_path, handle, 2, chunk_size=500,
+                                                                      encoding='utf-8'))
+        self.assertListEqual(actual, expected)
+
+    def test_invalid_number_of_workers(self):
+        with open(self.input_path, 'rb') as handle:
+            with self.assertRaises(ValueError):
+                list(parallel_ingest.iter_valid_records_parallel(self.input_path, handle, 0))
+
+    def test_process_data_stream_workers(self):
+        for test_name in sorted(os.listdir(TEST_SUITE_PATH)):
+            test_path = os.path.join(TEST_SUITE_PATH, test_name)
+            output_path = os.path.join(self.directory.name, test_name + '.txt')
+            analyzer.process_data_stream(os.path.join(test_path, 'input', 'itcont.txt'),
+                                         os.path.join(test_path, 'input', 'percentile.txt'), output_path, workers=2)
+            with open(output_path) as actual:
+                self.assertEqual(actual.read(), read_expected_output(test_name), test_name)
+
+    def test_import_in_fresh_interpreter(self):
+        subprocess.run([sys.executable, '-c', 'import parallel_ingest'], cwd=SRC_PATH, check=True, timeout=60)
+
+    def test_process_data_stream_workers_spawn(self):
+        script_path = os.path.join(self.directory.name, 'spawn_workers.py')
+        with open(script_path, 'w') as handle:
+            handle.write(SPAWN_SCRIPT)
+        test_path = os.path.join(TEST_SUITE_PATH, 'test_1')
+        output_path = os.path.join(self.directory.name, 'repeat_donors.txt')
+        environment = dict(os.environ, PYTHONPATH=SRC_PATH)
+        # a worker failing to import its modules is started again forever, the timeout turns that hang into an error
+        subprocess.run([sys.executable, script_path, os.path.join(test_path, 'input', 'itcont.txt'),
+                        os.path.join(test_path, 'input', 'percentile.txt'), output_path], env=environment, check=True,
+                       timeout=120)
+        with open(output_path) as actual:
+            self.assertEqual(actual.read(), read_expected_output('test_1'))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,143 @@
+import bisect
+import os
+import random
+import tempfile
+import unittest
+import analyze_repeat_donations as analyzer
+import checkpoint
+import quantile_sketch
+from testing_helpers import TEST_SUITE_PATH, read_expected_output
+
+
+def max_rank_error(sketch, sorted_values):
+    """
+        Returns the largest difference, as a fraction of the number of values, between a rank asked to the sketch and
+        the exact rank of the value it returned.
+    """
+    n = len(sorted_values)
+    error = 0
+    for percent in range(1, 101):
+        rank = analyzer.percentile_rank(percent, n)
+        value = sketch[rank - 1]
+        low = bisect.bisect_left(sorted_values, value)
+        high = bisect.bisect_right(sorted_values, value)
+        # any rank held by value is a right answer
+        if not low < rank <= high:
+            error = max(error, min(abs(rank - low - 1), abs(rank - high)) / n)
+    return error
+
+
+class TestQuantileSketch(unittest.TestCase):
+
+    def test_rank_error(self):
+        rng = random.Random(14)
+        distributions = {'uniform': lambda: rng.randrange(1, 10 ** 6),
+                         'lognormal': lambda: int(rng.lognormvariate(8, 1.5)),
+                         'few values': lambda: rng.choice((500, 1000, 2500, 10000))}
+        for name, draw in distributions.items():
+            values = [draw() for _ in range(100000)]
+            sketch = quantile_sketch.KLLSketch(values)
+            self.assertEqual(len(sketch), len(values))
+            self.assertLess(max_rank_error(sketch, sorted(values)), 0.01, name)
+            self.assertLess(sketch.stored_values(), 4 * quantile_sketch.DEFAULT_K, name)
+
+    def test_memory_is_bounded(self):
+        sketch = quantile_sketch.KLLSketch(k=50)
+        largest = 0
+        for value in range(200000):
+            sketch.add(value)
+            largest = max(largest, sketch.stored_values())
+        self.assertLess(largest, 250)
+        # the extremes are approximate too, within the larger error of k = 50
+        self.assertLess(sketch[0], 10000)
+        self.assertGreater(sketch[-1], 190000)
+
+    def test_merge(self):
+        rng = random.Random(7)
+        values = [rng.randrange(10 ** 6) for _ in range(60000)]
+        sketches = [quantile_sketch.KLLSketch(values[start::3], seed=start) for start in range(3)]
+        for other in sketches[1:]:
+            sketches[0].merge(other)
+        self.assertEqual(len(sketches[0]), len(values))
+        self.assertLess(max_rank_error(sketches[0], sorted(values)), 0.01)
+
+    def test_queries_between_adds(self):
+        # the view updated by adds and compactions answers like one sorted from scratch
+        rng = random.Random(3)
+        values = [rng.randrange(1000) for _ in range(20000)]
+        queried = quantile_sketch.KLLSketch(k=20)
+        for count, value in enumerate(values, 1):
+            queried.add(value)
+            queried[count // 3]
+            if count % 997 == 0:
+                fresh = quantile_sketch.KLLSketch(values[:count], k=20)
+                self.assertListEqual([queried[i] for i in range(0, count, 50)], [fresh[i] for i in range(0, count, 50)])
+                self.assertListEqual([queried.rank(v) for v in range(0, 1000, 10)],
+                                     [fresh.rank(v) for v in range(0, 1000, 10)])
+
+    def test_small_sketch_is_exact(self):
+        values = [30, 10, 20, 50, 40]
+        sketch = quantile_sketch.KLLSketch(values)
+        self.assertListEqual([sketch[i] for i in range(len(values))], sorted(values))
+        with self.assertRaises(IndexError):
+            sketch[5]
+        with self.assertRaises(ValueError):
+            quantile_sketch.KLLSketch(k=1)
+
+    def test_approximate_bucket(self):
+        bucket = quantile_sketch.ApproximateBucket(threshold=3)
+        for value in [300, 100, 200]:
+            bucket.add(value)
+        self.assertTrue(bucket.is_exact)
+        self.assertListEqual(list(bucket), [100, 200, 300])
+        bucket.add(400)
+        self.assertFalse(bucket.is_exact)
+        self.assertEqual(len(bucket), 4)
+        self.assertEqual(bucket[0], 100)
+        self.assertEqual(bucket[-1], 400)
+        with self.assertRaises(TypeError):
+            list(bucket)
+
+    def test_same_output_below_threshold(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for test_name in sorted(os.listdir(TEST_SUITE_PATH)):
+                test_path = os.path.join(TEST_SUITE_PATH, test_name)
+                output_path = os.path.join(directory, 'repeat_donors.txt')
+                analyzer.process_data_stream(os.path.join(test_path, 'input', 'itcont.txt'),
+                                             os.path.join(test_path, 'input', 'percentile.txt'), output_path,
+                                             sketch_threshold=1000)
+                with open(output_path) as handle:
+                    self.assertEqual(handle.read(), read_expected_output(test_name), test_name)
+
+    def test_totals_and_counts_past_threshold(self):
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, 'itcont.txt')
+            rng = random.Random(3)
+            with open(input_path, 'w') as handle:
+                for i in range(3000):
+                    handle.write('C00000001|N|M2|P|1|15|IND|DONOR, NUMBER {}|CITY|GA|30004|E|O|0131{}|{}||a|b||c|d\n'
+                                 .format(i % 1000, 2017 if i < 1000 else 2018, rng.randrange(1, 1000)))
+            outputs = {}
+            for sketch_threshold in [None, 10]:
+                output_path = os.path.join(directory, 'repeat_donors.txt')
+                analyzer.process_data_stream(input_path, None, output_path, percentiles=(10, 50, 90),
+                                             sketch_threshold=sketch_threshold, sketch_k=50)
+                with open(output_path) as handle:
+                    outputs[sketch_threshold] = [line.split('|') for line in handle.read().splitlines()]
+        self.assertEqual(len(outputs[10]), 2000)
+        for exact, approximate in zip(outputs[None], outputs[10]):
+            self.assertListEqual(approximate[:3] + approximate[-2:], exact[:3] + exact[-2:])
+            for exact_value, approximate_value in zip(exact[3:6], approximate[3:6]):
+                self.assertLess(abs(int(exact_value) - int(approximate_value)), 100)
+
+    def test_checkpoint_rejects_sketches(self):
+        bucket = quantile_sketch.ApproximateBucket([100, 200, 300], threshold=2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'state')
+            with self.assertRaises(ValueError):
+                checkpoint.save_checkpoint(path, {}, {('C00000001', '30004', 2018): [bucket, 600]})
+            self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+import checkpoint
+import query_server
+from repeat_donation_analyzer import IndexedRepeatDonations, RepeatDonationAnalyzer
+from testing_helpers import RECORDS, TEST_SUITE_PATH, read_expected_output
+
+SRC_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestRepeatDonationAnalyzer(unittest.TestCase):
+
+    def feed_test_suite(self, test_name):
+        test_path = os.path.join(TEST_SUITE_PATH, test_name)
+        with open(os.path.join(test_path, 'input', 'percentile.txt')) as handle:
+            percentile = int(handle.readline())
+        analysis = RepeatDonationAnalyzer(percentile)
+        with open(os.path.join(test_path, 'input', 'itcont.txt')) as handle:
+            output = list(analysis.process_lines(handle))
+        return analysis, output, read_expected_output(test_name)
+
+    def test_import_in_fresh_interpreter(self):
+        subprocess.run([sys.executable, '-c', 'import repeat_donation_analyzer'], cwd=SRC_PATH, check=True, timeout=60)
+
+    def test_same_output_as_process_data_stream(self):
+        for test_name in sorted(os.listdir(TEST_SUITE_PATH)):
+            (analysis, output, expected) = self.feed_test_suite(test_name)
+            self.assertEqual(''.join(output), expected, test_name)
+
+    def test_queries_match_last_output(self):
+        for test_name in sorted(os.listdir(TEST_SUITE_PATH)):
+            (analysis, output, expected) = self.feed_test_suite(test_name)
+            last_states = {}
+            for line in expected.splitlines():
+                (cmte_id, zip_code, year, percentile, total, count) = line.split('|')
+                last_states[(cmte_id, zip_code, int(year))] = (int(percentile), int(total), int(count))
+            for key, (percentile, total, count) in last_states.items():
+                self.assertEqual(analysis.get_percentile(key), percentile)
+                self.assertEqual(analysis.get_total(key), total)
+                self.assertEqual(analysis.get_count(key), count)
+                self.assertDictEqual(analysis.get_state(key), dict(cmte_id=key[0], zip_code=key[1],
+                                                                   transaction_year=key[2], percentile=percentile,
+                                                                   total=total, count=count))
+                self.assertIn(key, analysis.keys_for_committee(key[0]))
+                self.assertIn(key, analysis.keys_for_zip_code(key[1]))
+                self.assertIn(key, analysis.keys_for_year(key[2]))
+            self.assertEqual(analysis.stats()['repeat_keys'], len(last_states))
+
+    def test_indexes(self):
+        analysis = RepeatDonationAnalyzer((50, 100))
+        output = list(analysis.process_lines(RECORDS))
+        self.assertTrue(output)
+        keys = list(analysis.repeat_donation_dict)
+        for cmte_id in {key[0] for key in keys}:
+            self.assertListEqual(analysis.keys_for_committee(cmte_id), [key for key in keys if key[0] == cmte_id])
+        for year in {key[2] for key in keys}:
+            self.assertListEqual(analysis.keys_for_year(year), [key for key in keys if key[2] == year])
+        self.assertListEqual(analysis.keys_for_committee('C99999999'), [])
+        self.assertIsInstance(analysis.get_percentile(keys[0]), list)
+        self.assertIsInstance(analysis.get_percentile(keys[0], 30), int)
+        with self.assertRaises(KeyError):
+            analysis.get_total(('C99999999', '00000', 2018))
+
+    def test_indexed_dict(self):
+        donations = IndexedRepeatDonations({('C1', '02895', 2018): [[100], 100]})
+        donations[('C1', '30004', 2018)] = [[200], 200]
+        donations[('C1', '30004', 2018)] = [[200, 300], 500]
+        donations.setdefault(('C2', '30004', 2017), [[400], 400])
+        self.assertListEqual(donations.keys_by_committee['C1'], [('C1', '02895', 2018), ('C1', '30004', 2018)])
+        self.assertListEqual(donations.keys_by_zip_code['30004'], [('C1', '30004', 2018), ('C2', '30004', 2017)])
+        self.assertListEqual(sorted(donations.keys_by_year), [2017, 2018])
+
+    def test_resume_indexes_loaded_keys(self):
+        analysis = RepeatDonationAnalyzer(30)
+        list(analysis.process_lines(RECORDS))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'state')
+            checkpoint.save_checkpoint(path, analysis.donor_dict, analysis.repeat_donation_dict)
+            resumed = RepeatDonationAnalyzer(30, resume_from=path)
+        for key in analysis.repeat_donation_dict:
+            self.assertDictEqual(resumed.get_state(key), analysis.get_state(key))
+            self.assertListEqual(resumed.keys_for_committee(key[0]), analysis.keys_for_committee(key[0]))
+
+    def test_query_server(self):
+        analysis = RepeatDonationAnalyzer(30)
+        server = query_server.start_query_server(analysis)
+        url = 'http://{}:{}'.format(*server.server_address)
+
+        def get(path):
+            try:
+                with urllib.request.urlopen(url + path) as response:
+                    return response.status, json.loads(response.read().decode('utf-8'))
+            except urllib.error.HTTPError as error:
+                return error.code, json.loads(error.read().decode('utf-8'))
+
+        try:
+            self.assertEqual(get('/stats'), (200, analysis.stats()))
+            list(analysis.process_lines(RECORDS))
+            (cmte_id, zip_code, year) = key = next(iter(analysis.repeat_donation_dict))
+            (status, body) = get('/state/{}/{}/{}'.format(cmte_id, zip_code, year))
+            self.assertEqual(status, 200)
+            self.assertDictEqual(body, analysis.get_state(key))
+            (status, body) = get('/state/{}/{}/{}?percentile=10,90'.format(cmte_id, zip_code, year))
+            self.assertListEqual(body['percentile'], analysis.get_percentile(key, (10, 90)))
+            (status, body) = get('/committee/{}'.format(cmte_id))
+            self.assertListEqual(body['states'], [analysis.get_state(key)
+                                                  for key in analysis.keys_for_committee(cmte_id)])
+            (status, body) = get('/year/{}'.format(year))
+            self.assertEqual(len(body['states']), len(analysis.keys_for_year(year)))
+            self.assertEqual(get('/state/C99999999/00000/2018')[0], 404)
+            self.assertEqual(get('/unknown')[0], 404)
+            self.assertEqual(get('/state/{}/{}/{}?percentile=101'.format(cmte_id, zip_code, year))[0], 400)
+            self.assertEqual(get('/year/abc')[0], 400)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
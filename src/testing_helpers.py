@@ -0,0 +1,66 @@
+# test helpers, not part of the analyzer: inputs and expected outputs shared by the unittests
+import os
+
+
+TEST_SUITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'insight_testsuite', 'tests')
+
+# raw input lines with edge cases of the validation: padded and control characters, bad dates, zip codes and amounts,
+# non-ASCII fields, carriage returns and a last line without newline
+RECORDS = [
+    'C00629618|N|TER|P|201701230300133512|15C|IND|PEREZ, JOHN A|LOS ANGELES|CA|90017|PRINCIPAL|DOUBLE NICKEL '
+    'ADVISORS|01032017|40|H6CA34245|SA01251735122|1141239|||2012520171368850783\n',
+    'C00177436|N|M2|P|201702039042410894|15|IND|DEEHAN, WILLIAM N|ALPHARETTA|GA|300047357|UNUM|SVP, SALES, CL|'
+    '01312017|384||PR2283873845050|1147350||P/R DEDUCTION ($192.00 BI-WEEKLY)|4020820171370029337\n',
+    ' C00177436 |N|M2|P|1|15|IND| DEEHAN, WILLIAM N\x1c|A|GA| 30004 |UNUM|SVP|\t01312018 | 384.50 | \x0b|a|b||c|d\n',
+    'C00384516|N|M2|P|1|15|IND|SABOURIN, JAMES|L|GA|028956146|UNUM|SVP|13312017|230||a|b||c|d\n',
+    'C00384516|N|M2|P|1|15|IND|SABOURIN, JAMES|L|GA|028956146|UNUM|SVP|01312017|230.000||a|b||c|d\n',
+    'C00384516|N|M2|P|1|15|IND|SABOURIN, JAMES|L|GA|02895O146|UNUM|SVP|01312017|230||a|b||c|d\n',
+    'C00384516|N|M2|P|1|15|IND|SÉBOURIN, JAMES|L|GA|028956146|UNUM|SVP|01312017|.5||a|b||c|d\n',
+    'C0038451É|N|M2|P|1|15|IND|SABOURIN, JAMES|L|GA|028956146|UNUM|SVP|01312017|5.||a|b||c|d\n',
+    'C00384516|N|M2|P|1|15|IND|SABOURIN, JAMES|L|GA|028956146|UNUM|SVP|01312017|12345678901234||a|b||c|d\r\n',
+    'C00384516|N|M2|P|1|15|IND|A|L|GA|02895|U|S|01312017|1|\rC00384516|N|M2|P|1|15|IND|B|L|GA|02895|U|S|01312017|2|\n',
+    'C00384516|N|M2|P|1|15|IND|SABOURIN, JAMES|L|GA|028956146|UNUM|SVP|01312017|1.2.3||a|b||c|d\n',
+    'C00384516|N|M2|P|1|15|IND|SABOURIN, JAMES|L|GA|028956146|UNUM|SVP|01312017|12|',
+]
+
+
+def random_record(rng):
+    """
+        Builds a record where each required field is picked from a mix of valid and malformed values.
+    """
+    fields = ['C00384516', 'N', 'M2', 'P', '1', '15', 'IND', 'SABOURIN, JAMES', 'CITY', 'GA', '028956146', 'UNUM',
+              'SVP', '01312017', '230', '', 'a', 'b', '', 'c', 'd']
+    fields[0] = rng.choice(['C00384516', ' C00384516 ', 'C0038451', 'C00384516X', 'C0038-516', 'c00384516\t'])
+    fields[7] = rng.choice(['SABOURIN, JAMES', '', '   ', ' A ', 'X' * 200, 'X' * 201, '\x1cB\x1f'])
+    fields[10] = rng.choice(['02895', '028956146', '0289', '0289561', ' 02895 ', '02895O146', '0289561469'])
+    fields[13] = rng.choice(['01312017', '00312017', '12312017', '13012017', '01002017', '01322017', '0131201',
+                             ' 01312018', '0a312017'])
+    fields[14] = rng.choice(['230', '230.', '.5', '.', '', '1.2.3', '12.345', '12345678901234', '123456789012345',
+                             '123456789012.34', '1234567890123.4', ' 7 ', '-4'])
+    fields[15] = rng.choice(['', ' ', 'H6CA34245', '\t'])
+    return '|'.join(fields) + '\n'
+
+
+def synthetic_lines(rng, number_of_lines):
+    """
+        Builds valid records of a few recipients, donors and zip codes over three years, so many of them are from
+        repeat donors.
+    """
+    lines = []
+    for _ in range(number_of_lines):
+        lines.append('C00{:06d}|N|M2|P|1|15|IND|DONOR, NUMBER {}|CITY|GA|{:05d}|E|O|0131{}|{}.{:02d}||a|b||c|d\n'
+                     .format(rng.randrange(5), rng.randrange(150), rng.randrange(3), rng.choice((2016, 2017, 2018)),
+                             rng.randrange(1, 500), rng.randrange(100)))
+    return lines
+
+
+def read_expected_output(test_name):
+    """
+        Returns the content of the expected output file of a test of the insight test suite. Some of the files lack the
+        newline at the end of their last line, which the analyzer writes, so it is added.
+    """
+    with open(os.path.join(TEST_SUITE_PATH, test_name, 'output', 'repeat_donors.txt')) as handle:
+        content = handle.read()
+    if content and not content.endswith('\n'):
+        content += '\n'
+    return content